@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+"""
+Input adapters for the results parser.
+
+Each adapter reads one file format and yields rows as dictionaries with the
+same keys as the CSV feed (date, office, district, county, candidate, party
+and votes). Text is UTF-8 encoded str, as the csv module returns it, so
+names with accents work the same everywhere rows go, including the CSV
+writers. The parser doesn't care where rows came from, so every adapter
+feeds the same Race model.
+
+The XML and JSON adapters parse incrementally and throw away what they've
+already processed, so memory stays flat even on very large files.
+
+read_rows picks an adapter based on the file extension.
+
+"""
+from os.path import splitext
+from xml.etree.cElementTree import iterparse
+import csv
+import json
+import re
+
+
+def encode_utf8(value):
+    """Convert unicode text to UTF-8 str, including inside lists and dictionaries.
+
+    Use on anything decoded from JSON or XML so it matches rows read from CSV.
+
+    """
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, dict):
+        return dict((encode_utf8(key), encode_utf8(val)) for key, val in value.items())
+    if isinstance(value, list):
+        return [encode_utf8(item) for item in value]
+    return value
+
+
+def read_csv(path):
+    """Rows from the standard results CSV"""
+    return csv.DictReader(open(path, 'rb'))
+
+
+def read_xml(path):
+    """Rows from an XML results file laid out like:
+
+        <results date="2012-11-06">
+          <race office="President" district="">
+            <candidate name="Smith, Joe" party="GOP">
+              <county name="Some County" votes="10"/>
+            </candidate>
+          </race>
+        </results>
+
+    A date attribute on a race overrides the one on the root element.
+
+    """
+    context = iterparse(path, events=('start', 'end'))
+    date = race = candidate = None
+    # Open elements, outermost first
+    stack = []
+    for event, elem in context:
+        if event == 'start':
+            if not stack:
+                date = elem.get('date', '')
+            elif elem.tag == 'race':
+                race = {
+                    'date': elem.get('date') or date,
+                    'office': elem.get('office', ''),
+                    'district': elem.get('district', ''),
+                }
+            elif elem.tag == 'candidate':
+                candidate = {
+                    'candidate': elem.get('name', ''),
+                    'party': elem.get('party', ''),
+                }
+            stack.append(elem)
+            continue
+
+        stack.pop()
+        if elem.tag == 'county':
+            row = {
+                'county': elem.get('name', ''),
+                'votes': elem.get('votes', '0'),
+            }
+            row.update(race)
+            row.update(candidate)
+            # ElementTree returns unicode for any non-ASCII text
+            yield encode_utf8(row)
+        # Every earlier sibling of this element has already been processed,
+        # so clearing the parent keeps only the open path in memory.
+        if stack:
+            stack[-1].clear()
+
+
+# Whitespace and punctuation separating objects in a JSON array or NDJSON file
+_JSON_SEPARATORS = re.compile(r'[\s,\[\]]*')
+
+
+def read_json(path, chunk_size=64 * 1024):
+    """Rows from a JSON array of row objects, or NDJSON with one row object per line.
+
+    Objects are decoded one at a time from a rolling buffer, so the whole
+    document is never held in memory.
+
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), ''):
+            buf = buf[pos:] + chunk
+            pos = 0
+            while True:
+                pos = _JSON_SEPARATORS.match(buf, pos).end()
+                if pos == len(buf):
+                    break
+                try:
+                    row, end = decoder.raw_decode(buf, pos)
+                except ValueError:
+                    # Object continues in the next chunk
+                    break
+                pos = end
+                yield encode_utf8(row)
+    leftover = buf[pos:].strip()
+    if leftover:
+        raise ValueError("Truncated or invalid JSON near: %r" % leftover[:40])
+
+
+ADAPTERS = {
+    '.csv': read_csv,
+    '.xml': read_xml,
+    '.json': read_json,
+    '.ndjson': read_json,
+}
+
+
+def adapter_for(path):
+    """Adapter registered for the file's extension. Unknown extensions are read as CSV."""
+    return ADAPTERS.get(splitext(path)[1].lower(), read_csv)
+
+
+def read_rows(path):
+    """Rows from path, using the adapter registered for its extension"""
+    return adapter_for(path)(path)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+"""
+Online checks for suspicious county vote updates.
+
+A data-entry slip, like an extra zero on a county total, can flip a winner
+before anyone notices. AnomalyDetector checks every county result before
+Candidate.add_votes applies it, against:
+
+    * the prior snapshot: the same candidate's previous total in that
+      county. Totals that drop, or jump by more than max_growth times,
+      are flagged.
+    * the registration ceiling: a race's votes in a county can't exceed
+      the county's registered voters.
+    * the candidate's share elsewhere: the candidate's votes as a share
+      of registered voters, compared with a running mean and variance
+      (Welford's algorithm) over the candidate's other counties. Shares
+      more than max_zscore standard deviations out are flagged.
+
+Each check is O(1) per update. State is a few numbers per county and per
+candidate. Flagged races are held at their last published results until
+acknowledge() is called for them.
+
+Pass a detector to parser.parse_and_clean as monitor, and keep the same
+detector across polls so it remembers the prior snapshot. After a restart,
+remember() the last results (e.g. from journal.ResultsJournal.recover) so
+the first poll is still checked against them.
+
+"""
+import math
+
+
+class RunningStats(object):
+    """Mean and variance of a set of values that supports removing values"""
+
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def remove(self, value):
+        if self.count <= 1:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        delta = value - self.mean
+        self.mean -= delta / (self.count - 1)
+        self.m2 = max(0.0, self.m2 - delta * (value - self.mean))
+        self.count -= 1
+
+    def stddev(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+
+class AnomalyDetector(object):
+
+    def __init__(self, registered=None, max_growth=5.0, min_change=100, max_zscore=4.0, min_counties=5):
+        """
+        registered: dictionary of county -> registered voters, e.g. from
+            turnout.count_registered. Without it, only the prior snapshot
+            check runs.
+        max_growth: flag totals that grow by more than this factor...
+        min_change: ...and by at least this many votes, so small counties
+            going from 1 vote to 10 aren't flagged.
+        max_zscore: flag shares this many standard deviations from the
+            candidate's mean across counties, once min_counties are known.
+
+        """
+        self.registered = registered or {}
+        self.max_growth = max_growth
+        self.min_change = min_change
+        self.max_zscore = max_zscore
+        self.min_counties = min_counties
+        # Race key -> list of flags awaiting acknowledgement
+        self.flagged = {}
+        # (race key, party, candidate, county) -> last seen votes
+        self.__previous = {}
+        # (race key, county) -> votes across candidates in the current results
+        self.__county_totals = {}
+        # (race key, party, candidate) -> RunningStats of share of registered voters
+        self.__shares = {}
+        # Race key -> last race summary returned by publishable()
+        self.__published = {}
+
+    def check(self, race_key, row):
+        """Check a cleaned-up row before it's added to the results.
+
+        RETURNS:
+
+            List of reasons the update looks suspicious, empty if none.
+
+        """
+        previous, reasons = self.__observe(race_key, row)
+        if reasons:
+            self.flagged.setdefault(race_key, []).append({
+                'race_key': race_key,
+                'party': row['party'],
+                'candidate': row['candidate'],
+                'county': row['county'],
+                'votes': row['votes'],
+                'previous': previous,
+                'reasons': reasons,
+            })
+        return reasons
+
+    def remember(self, race_key, row):
+        """Record a result as part of the prior snapshot without flagging it"""
+        self.__observe(race_key, row)
+
+    def held(self):
+        """RETURNS: Set of race keys held from publishing"""
+        return set(self.flagged)
+
+    def acknowledge(self, race_key):
+        """Release a held race, returning its flags"""
+        return self.flagged.pop(race_key, [])
+
+    def publishable(self, summary):
+        """RETURNS: Copy of summary with held races at their last published values.
+
+        Races held before they were ever published are left out.
+
+        """
+        publishable = {}
+        for race_key, race in summary.items():
+            if race_key in self.flagged:
+                race = self.__published.get(race_key)
+                if race is None:
+                    continue
+            publishable[race_key] = self.__published[race_key] = race
+        return publishable
+
+    # Private methods
+    def __observe(self, race_key, row):
+        """Update the snapshot and running stats with a row.
+
+        RETURNS:
+
+            (previous votes or None, list of reasons the update looks suspicious)
+
+        """
+        county, votes = row['county'], row['votes']
+        cand_key = (race_key, row['party'], row['candidate'])
+        key = cand_key + (county,)
+        previous = self.__previous.get(key)
+        self.__previous[key] = votes
+        reasons = []
+
+        if previous is not None:
+            if votes < previous:
+                reasons.append('decreased from %s' % previous)
+            elif votes > previous * self.max_growth and votes - previous >= self.min_change:
+                reasons.append('grew from %s' % previous)
+
+        registered = self.registered.get(county)
+        total_key = (race_key, county)
+        county_total = self.__county_totals.get(total_key, 0) - (previous or 0) + votes
+        self.__county_totals[total_key] = county_total
+        if registered is not None and county_total > registered:
+            reasons.append('%s votes in county exceed %s registered' % (county_total, registered))
+
+        if registered:
+            share = votes / float(registered)
+            stats = self.__shares.get(cand_key)
+            if stats is None:
+                stats = self.__shares[cand_key] = RunningStats()
+            if previous is not None:
+                # The county is already in the running stats; swap in the new value
+                stats.remove(previous / float(registered))
+            stddev = stats.stddev()
+            if stats.count >= self.min_counties and stddev > 0:
+                zscore = (share - stats.mean) / stddev
+                if abs(zscore) > self.max_zscore:
+                    reasons.append('share of registered voters is %.1f standard deviations from other counties' % zscore)
+            stats.add(share)
+
+        return previous, reasons
@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+"""
+Delta-compressed archive of every poll's vote totals.
+
+Keeping a full summary CSV per poll adds up to gigabytes over a night, even
+though most county totals don't change from one poll to the next. The
+archive instead stores each poll as a frame in one append-only file:
+
+    header   frame type, poll number, timestamp, section lengths
+    keys     series first seen in this poll: race key, date, office,
+             district, party, candidate and county
+    values   one block per race, in race id order, as a varint race id
+             gap and block length, then one entry per series in id order,
+             as a varint id gap and a zigzag varint value
+
+A series is one candidate's votes in one county. It gets an integer id the
+first time it's seen, and its race gets one the first time any of its
+series is seen. Keyframes store every series' total. Other frames store
+only series that changed since the previous poll, as differences.
+A keyframe is written every keyframe_interval polls, so rebuilding any
+poll decodes one keyframe plus at most keyframe_interval - 1 deltas. The
+key sections of earlier frames are small and are read on their own.
+Reading one race's history skips every other race's block by its length,
+so only that race's entries are decoded.
+
+A series missing from a later poll is recorded as 0 votes.
+
+"""
+from os.path import exists, getsize
+import struct
+
+from elex4.lib.models import Race
+
+KEYFRAME = 1
+DELTA = 2
+
+# Frame type, poll number, timestamp, keys length, values length
+HEADER = struct.Struct('<BIdII')
+
+KEY_FIELDS = ('race_key', 'date', 'office', 'district', 'party', 'candidate', 'county')
+
+
+def encode_varint(value, out):
+    """Append an unsigned integer to bytearray out, 7 bits per byte"""
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(buf, pos):
+    """RETURNS: (value, position after it) for a varint in bytearray buf"""
+    result = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def zigzag(value):
+    """Map signed to unsigned integers so small negative deltas stay small"""
+    return (value << 1) if value >= 0 else ((-value << 1) - 1)
+
+
+def unzigzag(value):
+    return (value >> 1) if not value & 1 else -((value + 1) >> 1)
+
+
+def race_ids(keys):
+    """RETURNS: Race id of each series key, numbering races in order of first appearance"""
+    ids = {}
+    return [ids.setdefault(key[0], len(ids)) for key in keys]
+
+
+def decode_values(buf, race_id=None):
+    """Yield (series id, value) from a frame's values section, for one race if race_id is given"""
+    pos = 0
+    current = -1
+    while pos < len(buf):
+        gap, pos = decode_varint(buf, pos)
+        current += gap + 1
+        length, pos = decode_varint(buf, pos)
+        end = pos + length
+        if race_id is not None and current != race_id:
+            pos = end
+            continue
+        series_id = -1
+        while pos < end:
+            gap, pos = decode_varint(buf, pos)
+            encoded, pos = decode_varint(buf, pos)
+            series_id += gap + 1
+            yield series_id, unzigzag(encoded)
+
+
+def flatten_results(results):
+    """RETURNS: Dictionary of series key (see KEY_FIELDS) -> votes"""
+    totals = {}
+    for race_key, race in results.items():
+        for (party, candidate), cand in race.candidates.items():
+            for county, votes in cand.county_results.items():
+                totals[(race_key, race.date, race.office, race.district, party, candidate, county)] = votes
+    return totals
+
+
+class ArchiveWriter(object):
+
+    def __init__(self, path, keyframe_interval=10):
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self.__ids = {}
+        self.__values = []
+        self.__race_ids = {}
+        # Race id of each series
+        self.__series_races = []
+        self.polls = 0
+        if exists(path):
+            # Pick up where an earlier writer left off
+            reader = ArchiveReader(path)
+            if getsize(path) > reader.end:
+                # Drop a torn frame from an interrupted append, so new
+                # frames follow the last complete one
+                with open(path, 'r+b') as fh:
+                    fh.truncate(reader.end)
+            self.polls = len(reader.frames)
+            if self.polls:
+                for series_id, key in enumerate(reader.keys(self.polls - 1)):
+                    self.__add_series(key)
+                self.__values = reader.values(self.polls - 1)
+
+    def append(self, results, timestamp):
+        """Add a poll's results (race key -> Race) to the archive"""
+        totals = flatten_results(results)
+        keys = bytearray()
+        new_keys = [key for key in totals if key not in self.__ids]
+        new_keys.sort()
+        encode_varint(len(new_keys), keys)
+        for key in new_keys:
+            self.__add_series(key)
+            self.__values.append(0)
+            for field in key:
+                if isinstance(field, unicode):
+                    field = field.encode('utf-8')
+                encode_varint(len(field), keys)
+                keys.extend(field)
+
+        keyframe = self.polls % self.keyframe_interval == 0
+        current = [0] * len(self.__values)
+        for key, votes in totals.iteritems():
+            current[self.__ids[key]] = votes
+        blocks = {}
+        for series_id, votes in enumerate(current):
+            if keyframe:
+                encoded = votes
+            else:
+                encoded = votes - self.__values[series_id]
+                if not encoded:
+                    continue
+            race_id = self.__series_races[series_id]
+            block, last_id = blocks.get(race_id) or (bytearray(), -1)
+            encode_varint(series_id - last_id - 1, block)
+            encode_varint(zigzag(encoded), block)
+            blocks[race_id] = block, series_id
+        values = bytearray()
+        last_race = -1
+        for race_id in sorted(blocks):
+            block = blocks[race_id][0]
+            encode_varint(race_id - last_race - 1, values)
+            encode_varint(len(block), values)
+            values.extend(block)
+            last_race = race_id
+        self.__values = current
+
+        with open(self.path, 'ab') as fh:
+            fh.write(HEADER.pack(KEYFRAME if keyframe else DELTA, self.polls, timestamp, len(keys), len(values)))
+            fh.write(keys)
+            fh.write(values)
+        self.polls += 1
+
+    # Private methods
+    def __add_series(self, key):
+        self.__ids[key] = len(self.__ids)
+        self.__series_races.append(self.__race_ids.setdefault(key[0], len(self.__race_ids)))
+
+
+class ArchiveReader(object):
+
+    def __init__(self, path):
+        self.path = path
+        # (frame type, timestamp, offset of keys section, keys length, values length) per poll
+        self.frames = []
+        # Offset just past the last complete frame
+        self.end = 0
+        size = getsize(path)
+        with open(path, 'rb') as fh:
+            while True:
+                header = fh.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    break
+                frame_type, poll, timestamp, keys_len, values_len = HEADER.unpack(header)
+                if self.end + HEADER.size + keys_len + values_len > size:
+                    # Torn write from an interrupted append
+                    break
+                self.frames.append((frame_type, timestamp, self.end + HEADER.size, keys_len, values_len))
+                self.end += HEADER.size + keys_len + values_len
+                fh.seek(self.end)
+
+    def timestamps(self):
+        return [frame[1] for frame in self.frames]
+
+    def keys(self, poll):
+        """RETURNS: List of series keys defined up to and including poll, in id order"""
+        keys = []
+        with open(self.path, 'rb') as fh:
+            for frame_type, timestamp, offset, keys_len, values_len in self.frames[:poll + 1]:
+                fh.seek(offset)
+                buf = bytearray(fh.read(keys_len))
+                count, pos = decode_varint(buf, 0)
+                for i in range(count):
+                    fields = []
+                    for field in KEY_FIELDS:
+                        length, pos = decode_varint(buf, pos)
+                        fields.append(str(buf[pos:pos + length]))
+                        pos += length
+                    keys.append(tuple(fields))
+        return keys
+
+    def values(self, poll):
+        """RETURNS: List of every series' votes as of poll, in id order.
+
+        Decodes frames from the nearest keyframe at or before poll.
+
+        """
+        start = poll
+        while self.frames[start][0] != KEYFRAME:
+            start -= 1
+        values = [0] * len(self.keys(poll))
+        with open(self.path, 'rb') as fh:
+            for current in range(start, poll + 1):
+                frame_type, buf = self.__read_values(fh, current)
+                for series_id, value in decode_values(buf):
+                    if frame_type == KEYFRAME:
+                        values[series_id] = value
+                    else:
+                        values[series_id] += value
+        return values
+
+    def totals(self, poll):
+        """RETURNS: Dictionary of series key -> votes as of poll"""
+        return dict(zip(self.keys(poll), self.values(poll)))
+
+    def results(self, poll):
+        """RETURNS: A dictionary containing race key and Race instances as values, as of poll"""
+        results = {}
+        for key, votes in zip(self.keys(poll), self.values(poll)):
+            race_key, date, office, district, party, candidate, county = key
+            race = results.get(race_key)
+            if race is None:
+                race = results[race_key] = Race(date, office, district)
+            race.add_result({'party': party, 'candidate': candidate, 'county': county, 'votes': votes})
+        return results
+
+    def race_series(self, race_key):
+        """Vote totals over time for one race.
+
+        RETURNS:
+
+            List of (timestamp, {(party, candidate): votes}) for every poll.
+
+        """
+        keys = self.keys(len(self.frames) - 1)
+        race_id = None
+        # Series id -> (party, candidate) for the race's series
+        watched = {}
+        for series_id, (key, key_race_id) in enumerate(zip(keys, race_ids(keys))):
+            if key[0] == race_key:
+                watched[series_id] = (key[4], key[5])
+                race_id = key_race_id
+        # Votes of each series seen so far
+        values = {}
+        series = []
+        with open(self.path, 'rb') as fh:
+            for poll in range(len(self.frames)):
+                if race_id is not None:
+                    frame_type, buf = self.__read_values(fh, poll)
+                    for series_id, value in decode_values(buf, race_id):
+                        if frame_type == KEYFRAME:
+                            values[series_id] = value
+                        else:
+                            values[series_id] = values.get(series_id, 0) + value
+                totals = {}
+                for series_id, votes in values.items():
+                    cand = watched[series_id]
+                    totals[cand] = totals.get(cand, 0) + votes
+                series.append((self.frames[poll][1], totals))
+        return series
+
+    # Private methods
+    def __read_values(self, fh, poll):
+        # RETURNS: (frame type, values section) for poll
+        frame_type, timestamp, offset, keys_len, values_len = self.frames[poll]
+        fh.seek(offset + keys_len)
+        return frame_type, bytearray(fh.read(values_len))
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+"""
+Batch processing of many results files in a process pool.
+
+Backfilling historical results means hundreds of state/year files, each
+run through parse_and_clean, summarize and write_summary on its own.
+BatchRunner takes a manifest CSV with input and output columns and runs
+the jobs in a pool of worker processes.
+
+    * The largest inputs start first, so a big file isn't left running
+      alone at the end while the other workers sit idle.
+    * A job that fails, including one whose input is missing, is reported
+      with its error and the rest of the batch carries on.
+    * Each finished job is appended to a ledger file. If the batch is
+      interrupted, a re-run skips jobs the ledger shows as done, as long
+      as the input hasn't changed since and the output still exists.
+    * Per-job stage timings are returned, and can be written out as CSV
+      with write_timings.
+
+"""
+from multiprocessing import Pool
+from os.path import dirname, exists, getmtime, getsize, join
+import csv
+import json
+import os
+import time
+
+from elex4.lib.parser import parse_and_clean
+from elex4.lib.summary import summarize, write_summary
+
+TIMING_FIELDS = ['input', 'output', 'size', 'status', 'parse', 'summarize', 'write', 'total', 'error']
+
+
+def load_manifest(path):
+    """RETURNS: List of jobs (dictionaries with input and output paths) from a manifest CSV.
+
+    Relative paths are relative to the manifest's directory.
+
+    """
+    base = dirname(os.path.abspath(path))
+    jobs = []
+    with open(path, 'rb') as fh:
+        for row in csv.DictReader(fh):
+            jobs.append({
+                'input': join(base, row['input']),
+                'output': join(base, row['output']),
+            })
+    return jobs
+
+
+def input_signature(path):
+    """Cheap change check for an input: size and modification time"""
+    return [getsize(path), getmtime(path)]
+
+
+def run_job(job):
+    """Parse, summarize and write one input. Runs in a worker process.
+
+    RETURNS:
+
+        The job dictionary with status, stage timings and any error added.
+
+    """
+    result = dict(job, status='failed', error='')
+    start = time.time()
+    try:
+        results = parse_and_clean(job['input'])
+        parsed = time.time()
+        summary = summarize(results)
+        summarized = time.time()
+        output_dir = dirname(job['output'])
+        if output_dir and not exists(output_dir):
+            os.makedirs(output_dir)
+        write_summary(summary, job['output'])
+        written = time.time()
+    except Exception, exc:
+        result['error'] = '%s: %s' % (exc.__class__.__name__, exc)
+        result['total'] = time.time() - start
+        return result
+    result.update({
+        'status': 'done',
+        'parse': parsed - start,
+        'summarize': summarized - parsed,
+        'write': written - summarized,
+        'total': written - start,
+    })
+    return result
+
+
+class BatchRunner(object):
+
+    def __init__(self, jobs, ledger_path, workers=None):
+        self.jobs = jobs
+        self.ledger_path = ledger_path
+        self.workers = workers
+
+    def pending(self):
+        """RETURNS: Jobs not yet completed, largest input first"""
+        done = self.__load_ledger()
+        pending = []
+        for job in self.jobs:
+            if not exists(job['input']):
+                # Queued anyway so run_job reports it as failed
+                pending.append(dict(job, size=0))
+                continue
+            entry = done.get(job['input'])
+            if (entry is not None and entry['output'] == job['output'] and exists(job['output'])
+                    and entry['signature'] == input_signature(job['input'])):
+                continue
+            pending.append(dict(job, size=getsize(job['input'])))
+        pending.sort(key=lambda job: job['size'], reverse=True)
+        return pending
+
+    def run(self):
+        """Run pending jobs, recording each completed job in the ledger as it finishes.
+
+        RETURNS:
+
+            List of job results from run_job, in order of completion.
+
+        """
+        jobs = self.pending()
+        if not jobs:
+            return []
+        results = []
+        pool = Pool(self.workers)
+        try:
+            with open(self.ledger_path, 'ab') as ledger:
+                # chunksize=1 keeps the largest-first order across workers
+                for result in pool.imap_unordered(run_job, jobs, 1):
+                    results.append(result)
+                    if result['status'] == 'done':
+                        entry = {
+                            'input': result['input'],
+                            'output': result['output'],
+                            'signature': input_signature(result['input']),
+                            'total': result['total'],
+                        }
+                        ledger.write(json.dumps(entry) + '\n')
+                        ledger.flush()
+                        os.fsync(ledger.fileno())
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+        return results
+
+    # Private methods
+    def __load_ledger(self):
+        done = {}
+        if not exists(self.ledger_path):
+            return done
+        with open(self.ledger_path, 'rb') as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Torn write from an interrupted run
+                    continue
+                done[entry['input']] = entry
+        return done
+
+
+def write_timings(results, path):
+    """Write per-job timings to a CSV, slowest first"""
+    with open(path, 'wb') as fh:
+        writer = csv.DictWriter(fh, TIMING_FIELDS, extrasaction='ignore', quoting=csv.QUOTE_MINIMAL)
+        writer.writeheader()
+        for result in sorted(results, key=lambda result: result.get('total', 0), reverse=True):
+            writer.writerow(result)
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+"""
+Sharded race processing across worker processes.
+
+A single process running parse_and_clean and summarize is limited to one
+machine's memory and CPU. Here a coordinator hash-partitions rows by race
+key and ships each partition to a worker process, possibly on another host.
+Workers hold their own Race objects and answer summary requests, and the
+coordinator gathers their answers into the usual summary dictionary.
+
+Workers speak a simple line-based protocol over TCP: each request and
+response is a single line of JSON. Text comes out of JSON as unicode, so
+both sides encode it back to UTF-8 str, as the parser produces it.
+
+    {"command": "add_results", "rows": [...]}  -> {"ok": true, "result": 12}
+    {"command": "summarize"}                   -> {"ok": true, "result": {...}}
+    {"command": "reset"}                       -> {"ok": true, "result": null}
+
+"""
+import json
+import socket
+import zlib
+from SocketServer import StreamRequestHandler, ThreadingTCPServer
+from threading import Lock
+
+from elex4.lib.adapters import encode_utf8
+from elex4.lib.parser import add_row, clean_row, make_race_key, parsed_rows
+from elex4.lib.summary import summarize
+
+
+def shard_for(race_key, num_shards):
+    """Pick a shard for a race key.
+
+    Uses crc32 rather than hash() so every host agrees on the assignment.
+
+    """
+    return (zlib.crc32(race_key) & 0xffffffff) % num_shards
+
+
+def parse_address(address):
+    """Convert 'host:port' into a (host, port) tuple"""
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+
+class ResultsWorker(ThreadingTCPServer):
+    """Holds one partition of Race objects and serves summary requests"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address):
+        ThreadingTCPServer.__init__(self, address, _WorkerHandler)
+        self.results = {}
+        self.lock = Lock()
+
+    def add_results(self, rows):
+        rows = encode_utf8(rows)
+        with self.lock:
+            for row in rows:
+                add_row(self.results, make_race_key(row['office'], row['district']), row)
+        return len(rows)
+
+    def summarize(self):
+        with self.lock:
+            return summarize(self.results)
+
+    def reset(self):
+        with self.lock:
+            self.results = {}
+
+
+class _WorkerHandler(StreamRequestHandler):
+
+    def handle(self):
+        # Serve requests on this connection until the coordinator hangs up
+        try:
+            for line in iter(self.rfile.readline, ''):
+                self.respond(json.loads(line))
+        except socket.error:
+            pass
+
+    def respond(self, request):
+        try:
+            if request['command'] == 'add_results':
+                result = self.server.add_results(request['rows'])
+            elif request['command'] == 'summarize':
+                result = self.server.summarize()
+            elif request['command'] == 'reset':
+                result = self.server.reset()
+            else:
+                raise ValueError("Unknown command: %s" % request['command'])
+            response = {'ok': True, 'result': result}
+        except Exception, exc:
+            response = {'ok': False, 'error': "%s: %s" % (exc.__class__.__name__, exc)}
+        self.wfile.write(json.dumps(response) + '\n')
+        self.wfile.flush()
+
+
+class WorkerError(Exception):
+    """Raised by the coordinator when a worker reports a failure"""
+
+
+class Coordinator(object):
+    """Partitions results across workers and gathers their summaries"""
+
+    def __init__(self, addresses, batch_size=1000):
+        self.addresses = addresses
+        self.batch_size = batch_size
+        self.__connections = [self.__connect(address) for address in addresses]
+
+    def load(self, path, dedup=None):
+        """Parse a results file and send each row to the worker owning its race.
+
+        Rows are parsed exactly as parse_and_clean would, in any format with
+        an input adapter and with an optional dedup.DuplicateFilter.
+
+        RETURNS:
+
+            Number of rows sent.
+
+        """
+        return self.__send_rows(parsed_rows(path, dedup))
+
+    def add_results(self, rows):
+        """Clean up raw rows and send them to workers in batches.
+
+        RETURNS:
+
+            Number of rows sent.
+
+        """
+        return self.__send_rows(
+            (make_race_key(row['office'], row['district']), clean_row(row)) for row in rows)
+
+    def summarize(self):
+        """Gather summaries from every worker.
+
+        RETURNS:
+
+            Dictionary of results, in the same form as summary.summarize.
+
+        """
+        summary = {}
+        for partial in self.__request_all({'command': 'summarize'}):
+            summary.update(partial)
+        return summary
+
+    def reset(self):
+        """Drop all results held by the workers"""
+        self.__request_all({'command': 'reset'})
+
+    def close(self):
+        for rfile, sock in self.__connections:
+            rfile.close()
+            sock.close()
+        self.__connections = []
+
+    # Private methods
+    def __send_rows(self, rows):
+        # rows yields (race key, cleaned-up row)
+        num_shards = len(self.__connections)
+        batches = [[] for i in range(num_shards)]
+        sent = 0
+        for race_key, row in rows:
+            shard = shard_for(race_key, num_shards)
+            batches[shard].append(row)
+            if len(batches[shard]) >= self.batch_size:
+                sent += self.__request_one(shard, {'command': 'add_results', 'rows': batches[shard]})
+                batches[shard] = []
+        for shard, batch in enumerate(batches):
+            if batch:
+                sent += self.__request_one(shard, {'command': 'add_results', 'rows': batch})
+        return sent
+
+    def __connect(self, address):
+        sock = socket.create_connection(parse_address(address))
+        return sock.makefile('rb'), sock
+
+    def __send(self, shard, request):
+        rfile, sock = self.__connections[shard]
+        sock.sendall(json.dumps(request) + '\n')
+
+    def __receive(self, shard):
+        rfile, sock = self.__connections[shard]
+        line = rfile.readline()
+        if not line:
+            raise WorkerError("%s closed the connection" % self.addresses[shard])
+        response = json.loads(line)
+        if not response['ok']:
+            raise WorkerError("%s: %s" % (self.addresses[shard], response['error']))
+        return encode_utf8(response['result'])
+
+    def __request_one(self, shard, request):
+        self.__send(shard, request)
+        return self.__receive(shard)
+
+    def __request_all(self, request):
+        # Send to every worker before waiting on any, so they work in parallel
+        for shard in range(len(self.__connections)):
+            self.__send(shard, request)
+        # Read every reply before raising, so no connection is left with an
+        # unread reply that would be mistaken for the answer to the next request.
+        results = []
+        errors = []
+        for shard in range(len(self.__connections)):
+            try:
+                results.append(self.__receive(shard))
+            except WorkerError, exc:
+                errors.append(exc)
+        if errors:
+            raise errors[0]
+        return results
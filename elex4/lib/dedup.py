@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+"""
+Duplicate-row detection for results feeds.
+
+Vendors sometimes resend county rows. Race.add_result adds a resent row to
+total_votes a second time, while Candidate.add_votes overwrites the county
+result, so the totals disagree. DuplicateFilter spots rows repeating an
+earlier (race, candidate, county) result so the parser can skip them. The
+first copy of a row is the one counted. A later copy with a different vote
+count may be a correction rather than a resend, so it is recorded in
+conflicts for someone to review instead of being dropped silently.
+
+Rows are reduced to 64-bit fingerprints rather than being retained. Up to
+exact_limit rows, fingerprints are kept in a dictionary with their vote
+counts. Beyond that, the filter switches to a Bloom filter costing a couple
+of bytes per row. A Bloom filter can report false positives, so rows it
+flags are held back as "deferred" and checked against the file in a second,
+verification pass.
+
+"""
+from array import array
+from hashlib import md5
+import math
+import struct
+
+
+def row_fingerprint(race_key, row):
+    """64-bit fingerprint of a row's race, candidate and county"""
+    key = '\0'.join((race_key, row['party'], row['candidate'], row['county']))
+    if isinstance(key, unicode):
+        key = key.encode('utf-8')
+    return struct.unpack('<Q', md5(key).digest()[:8])[0]
+
+
+class BloomFilter(object):
+    """Fixed-size set membership test that may return false positives"""
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(capacity, 1)
+        # Standard sizing for the requested false positive rate
+        self.num_bits = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / float(capacity) * math.log(2))))
+        self.bits = array('B', [0]) * ((self.num_bits + 7) // 8)
+
+    def add(self, fingerprint):
+        """Add a fingerprint, returning True if it may already have been present"""
+        present = True
+        for bit in self.__bit_positions(fingerprint):
+            byte, mask = bit >> 3, 1 << (bit & 7)
+            if not self.bits[byte] & mask:
+                present = False
+                self.bits[byte] |= mask
+        return present
+
+    # Private methods
+    def __bit_positions(self, fingerprint):
+        # Double hashing: derive every probe from two halves of the fingerprint
+        first, second = fingerprint & 0xffffffff, (fingerprint >> 32) | 1
+        for i in range(self.num_hashes):
+            yield (first + i * second) % self.num_bits
+
+
+class DuplicateFilter(object):
+
+    def __init__(self, exact_limit=1000000, capacity=None, error_rate=0.001):
+        """
+        exact_limit: number of distinct rows to track exactly before
+            switching to a Bloom filter.
+        capacity: number of rows the Bloom filter should be sized for.
+            Defaults to ten times exact_limit.
+        error_rate: Bloom filter false positive rate. False positives cost
+            time in the verification pass, never correctness.
+
+        """
+        self.exact_limit = exact_limit
+        self.capacity = capacity or exact_limit * 10
+        self.error_rate = error_rate
+        self.duplicates = 0
+        # Duplicates whose votes differ from the copy that was counted
+        self.conflicts = []
+        self.deferred = []
+        # Fingerprint -> votes of the first copy
+        self.__seen = {}
+        self.__bloom = None
+
+    @property
+    def probabilistic(self):
+        return self.__bloom is not None
+
+    def is_duplicate(self, race_key, row, row_num):
+        """Should this row be skipped for now?
+
+        True for rows known to be duplicates, and, once the Bloom filter is in
+        use, for possible duplicates that are deferred until verify().
+
+        """
+        fingerprint = row_fingerprint(race_key, row)
+        if self.__bloom is None:
+            if fingerprint in self.__seen:
+                self.duplicates += 1
+                self.__check_conflict(race_key, row, self.__seen[fingerprint])
+                return True
+            self.__seen[fingerprint] = row['votes']
+            if len(self.__seen) > self.exact_limit:
+                self.__switch_to_bloom()
+            return False
+        if self.__bloom.add(fingerprint):
+            self.deferred.append((row_num, fingerprint, race_key, row))
+            return True
+        return False
+
+    def verify(self, rows):
+        """Second pass: confirm deferred rows against the full input.
+
+        rows should yield the same (row number, race key, row) tuples as the
+        first pass, e.g. parser.clean_rows(path). A deferred row is a true
+        duplicate only if an earlier row has the same fingerprint.
+
+        Yields (race key, row) for deferred rows that turned out to be unique.
+
+        """
+        suspects = set(fingerprint for row_num, fingerprint, race_key, row in self.deferred)
+        # Fingerprint -> (row number, votes) of the first copy
+        first_seen = {}
+        for row_num, race_key, row in rows:
+            fingerprint = row_fingerprint(race_key, row)
+            if fingerprint in suspects and fingerprint not in first_seen:
+                first_seen[fingerprint] = (row_num, row['votes'])
+        deferred, self.deferred = self.deferred, []
+        for row_num, fingerprint, race_key, row in deferred:
+            first_num, first_votes = first_seen[fingerprint]
+            if first_num == row_num:
+                yield race_key, row
+            else:
+                self.duplicates += 1
+                self.__check_conflict(race_key, row, first_votes)
+
+    # Private methods
+    def __check_conflict(self, race_key, row, counted_votes):
+        if row['votes'] != counted_votes:
+            self.conflicts.append({
+                'race': race_key,
+                'party': row['party'],
+                'candidate': row['candidate'],
+                'county': row['county'],
+                'counted': counted_votes,
+                'discarded': row['votes'],
+            })
+
+    def __switch_to_bloom(self):
+        self.__bloom = BloomFilter(self.capacity, self.error_rate)
+        for fingerprint in self.__seen:
+            self.__bloom.add(fingerprint)
+        self.__seen = {}
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""
+Compare two summary_results.csv files, e.g. a re-run against the original
+or a vendor correction against what we published.
+
+Rows are matched on (office, district, party, last_name, first_name). Both
+files are streamed in key order and merge-joined, so only one row from each
+file is held at a time. A file that isn't already in key order is sorted
+externally first: sorted runs of chunk_size rows are written to temp files
+and then merged. Memory stays bounded however big the files are.
+
+diff_summaries yields one change per candidate that was added, removed, or
+whose votes or winner status changed.
+
+"""
+from itertools import islice
+import csv
+import heapq
+import tempfile
+
+KEY_FIELDS = ('office', 'district', 'party', 'last_name', 'first_name')
+
+DIFF_FIELDS = list(KEY_FIELDS) + ['change', 'old_votes', 'new_votes', 'votes_delta', 'old_winner', 'new_winner']
+
+
+def row_key(row):
+    return tuple(row[field] for field in KEY_FIELDS)
+
+
+def is_sorted(path):
+    """Is the file already in key order?"""
+    previous = None
+    with open(path, 'rb') as fh:
+        for row in csv.DictReader(fh):
+            key = row_key(row)
+            if previous is not None and key < previous:
+                return False
+            previous = key
+    return True
+
+
+def sorted_rows(path, chunk_size=50000, tmp_dir=None):
+    """Rows of a summary CSV in key order, sorting externally only if needed"""
+    if is_sorted(path):
+        with open(path, 'rb') as fh:
+            for row in csv.DictReader(fh):
+                yield row
+        return
+
+    runs = []
+    try:
+        with open(path, 'rb') as fh:
+            reader = csv.DictReader(fh)
+            fieldnames = reader.fieldnames
+            while True:
+                chunk = list(islice(reader, chunk_size))
+                if not chunk:
+                    break
+                chunk.sort(key=row_key)
+                run = tempfile.TemporaryFile(dir=tmp_dir)
+                writer = csv.DictWriter(run, fieldnames)
+                writer.writerows(chunk)
+                run.seek(0)
+                runs.append(run)
+        readers = [csv.DictReader(run, fieldnames) for run in runs]
+        # Decorate rows so heapq.merge compares keys, not dictionaries
+        streams = [((row_key(row), i, n, row) for n, row in enumerate(reader)) for i, reader in enumerate(readers)]
+        for key, i, n, row in heapq.merge(*streams):
+            yield row
+    finally:
+        for run in runs:
+            run.close()
+
+
+def merge_join(old_rows, new_rows):
+    """Pair up two key-ordered row streams.
+
+    Yields (key, old row, new row), with None for a row missing on one side.
+
+    """
+    old_rows, new_rows = iter(old_rows), iter(new_rows)
+    old, new = next(old_rows, None), next(new_rows, None)
+    while old is not None or new is not None:
+        old_key = row_key(old) if old is not None else None
+        new_key = row_key(new) if new is not None else None
+        if new is None or (old is not None and old_key < new_key):
+            yield old_key, old, None
+            old = next(old_rows, None)
+        elif old is None or new_key < old_key:
+            yield new_key, None, new
+            new = next(new_rows, None)
+        else:
+            yield old_key, old, new
+            old, new = next(old_rows, None), next(new_rows, None)
+
+
+def diff_summaries(old_path, new_path, chunk_size=50000, tmp_dir=None):
+    """Changes between two summary CSVs.
+
+    RETURNS:
+
+        Generator of dictionaries with DIFF_FIELDS keys. change is 'added',
+        'removed' or 'changed'.
+
+    """
+    old_rows = sorted_rows(old_path, chunk_size, tmp_dir)
+    new_rows = sorted_rows(new_path, chunk_size, tmp_dir)
+    for key, old, new in merge_join(old_rows, new_rows):
+        if old is not None and new is not None:
+            if old['votes'] == new['votes'] and old['winner'] == new['winner']:
+                continue
+            change = 'changed'
+        else:
+            change = 'removed' if new is None else 'added'
+        diff = dict(zip(KEY_FIELDS, key))
+        diff['change'] = change
+        diff['old_votes'] = int(old['votes']) if old else None
+        diff['new_votes'] = int(new['votes']) if new else None
+        diff['votes_delta'] = (diff['new_votes'] or 0) - (diff['old_votes'] or 0)
+        diff['old_winner'] = old['winner'] if old else None
+        diff['new_winner'] = new['winner'] if new else None
+        yield diff
+
+
+def describe(diff):
+    """One-line, human-readable description of a change"""
+    race = diff['office'] + (' %s' % diff['district'] if diff['district'] else '')
+    name = '%s, %s (%s)' % (diff['last_name'], diff['first_name'], diff['party'])
+    if diff['change'] == 'added':
+        return '+ %s: %s added with %s votes' % (race, name, diff['new_votes'])
+    if diff['change'] == 'removed':
+        return '- %s: %s removed, had %s votes' % (race, name, diff['old_votes'])
+    line = '~ %s: %s %s -> %s (%+d)' % (race, name, diff['old_votes'], diff['new_votes'], diff['votes_delta'])
+    if bool(diff['old_winner']) != bool(diff['new_winner']):
+        line += ', now the winner' if diff['new_winner'] else ', no longer the winner'
+    return line
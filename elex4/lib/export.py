@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+Streaming JSON and NDJSON export of summary results.
+
+Rather than building one giant document with json.dumps, these writers
+encode and write one race at a time. Racewide values (date, office,
+district, all_votes) are encoded once per race and the resulting fragment
+is reused for every candidate in that race.
+
+Paths ending in .gz are written with gzip compression.
+
+"""
+import gzip
+import json
+from json.encoder import encode_basestring_ascii
+
+RACE_FIELDS = ['date', 'office', 'district', 'all_votes']
+CANDIDATE_FIELDS = ['last_name', 'first_name', 'party', 'votes', 'winner']
+
+# Field names never change, so bake them into format strings up front
+_RACE_TEMPLATE = ', '.join('"%s": %%s' % field for field in RACE_FIELDS)
+_CANDIDATE_TEMPLATE = ', '.join('"%s": %%s' % field for field in CANDIDATE_FIELDS)
+
+
+def open_output(path):
+    """Open path for writing, gzip-compressed if it ends in .gz"""
+    if path.endswith('.gz'):
+        return gzip.GzipFile(path, 'wb')
+    return open(path, 'wb')
+
+
+def write_ndjson(summary, fh):
+    """Write one JSON object per line for each race/candidate pair.
+
+    Lines contain the same values as rows of summary_results.csv.
+
+    RETURNS:
+
+        Number of lines written.
+
+    """
+    written = 0
+    for race_key in sorted(summary):
+        race = summary[race_key]
+        prefix = '{' + _encode_race(race) + ', '
+        for cand in race['candidates']:
+            fh.write(prefix + _encode_candidate(cand) + '}\n')
+            written += 1
+    return written
+
+
+def write_json(summary, fh):
+    """Write a JSON array containing one object per race.
+
+    Each race object has racewide values plus a list of candidates.
+
+    RETURNS:
+
+        Number of races written.
+
+    """
+    written = 0
+    fh.write('[')
+    for race_key in sorted(summary):
+        race = summary[race_key]
+        if written:
+            fh.write(',')
+        fh.write('\n{' + _encode_race(race) + ', "candidates": [')
+        fh.write(', '.join('{' + _encode_candidate(cand) + '}' for cand in race['candidates']))
+        fh.write(']}')
+        written += 1
+    fh.write('\n]\n')
+    return written
+
+
+def _encode_race(race):
+    return _RACE_TEMPLATE % tuple(_encode(race[field]) for field in RACE_FIELDS)
+
+
+def _encode_candidate(cand):
+    return _CANDIDATE_TEMPLATE % tuple(_encode(cand[field]) for field in CANDIDATE_FIELDS)
+
+
+def _encode(value):
+    # The C string escaper is much faster than a full JSONEncoder.encode call.
+    # It escapes non-ASCII characters, so fragments are plain bytes.
+    if isinstance(value, basestring):
+        return encode_basestring_ascii(value)
+    return json.dumps(value)
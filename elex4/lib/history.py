@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+"""
+Versioned, time-travel results storage.
+
+Each poll of the results feed is recorded as an immutable Snapshot, so we
+can answer questions like "what did race X look like at 10:15pm?".
+
+Keeping a full copy of every poll's Race and Candidate objects would cost
+races * polls memory. Instead, snapshots share structure: races are frozen
+into RaceSnapshots and spread across a fixed number of buckets. Recording
+a poll copies only the buckets containing races that changed, and every
+unchanged race (and bucket) is shared with the previous snapshot. Memory
+grows with the number of changes rather than with the number of polls.
+
+"""
+import zlib
+from bisect import bisect_right
+from datetime import datetime
+
+from elex4.lib.models import Race
+from elex4.lib.summary import summarize
+
+
+class RaceSnapshot(object):
+    """Immutable copy of a Race at one point in time"""
+
+    __slots__ = ('race_key', 'date', 'office', 'district', 'total_votes', 'candidates', '_summary')
+
+    def __init__(self, race_key, race):
+        self.race_key = race_key
+        self.date = race.date
+        self.office = race.office
+        self.district = race.district
+        self.total_votes = race.total_votes
+        self.candidates = freeze_candidates(race)
+        self._summary = None
+
+    def matches(self, race):
+        """Does this snapshot still reflect the current state of race?"""
+        return (self.total_votes == race.total_votes and
+                self.candidates == freeze_candidates(race))
+
+    def thaw(self):
+        """Rebuild a regular Race instance from this snapshot"""
+        race = Race(self.date, self.office, self.district)
+        for party, raw_name, county_results in self.candidates:
+            for county, votes in county_results:
+                race.add_result({
+                    'party': party,
+                    'candidate': raw_name,
+                    'county': county,
+                    'votes': votes,
+                })
+        return race
+
+    def summarize(self):
+        """Summary of the race, computed once and shared by every snapshot containing it"""
+        if self._summary is None:
+            self._summary = summarize({self.race_key: self.thaw()})[self.race_key]
+        return self._summary
+
+
+def freeze_candidates(race):
+    """Convert a Race's candidates into nested tuples of (party, name, county results)"""
+    return tuple(sorted(
+        (party, raw_name, tuple(sorted(cand.county_results.items())))
+        for (party, raw_name), cand in race.candidates.items()
+    ))
+
+
+class Snapshot(object):
+    """All races as of a single poll"""
+
+    def __init__(self, timestamp, buckets):
+        self.timestamp = timestamp
+        self.buckets = buckets
+
+    def race(self, race_key):
+        """RETURNS: RaceSnapshot for race_key. Raises KeyError if unknown."""
+        return self.buckets[bucket_for(race_key, len(self.buckets))][race_key]
+
+    def race_keys(self):
+        keys = []
+        for bucket in self.buckets:
+            keys.extend(bucket.keys())
+        return keys
+
+    def summarize(self):
+        """RETURNS: Dictionary of results, in the same form as summary.summarize."""
+        summary = {}
+        for bucket in self.buckets:
+            for race_key, race in bucket.items():
+                summary[race_key] = race.summarize()
+        return summary
+
+
+def bucket_for(race_key, num_buckets):
+    return (zlib.crc32(race_key) & 0xffffffff) % num_buckets
+
+
+class ResultsHistory(object):
+    """Sequence of Snapshots, one per recorded poll"""
+
+    def __init__(self, num_buckets=64):
+        self.num_buckets = num_buckets
+        self.snapshots = []
+        self.__timestamps = []
+
+    def record(self, results, timestamp=None):
+        """Record the current state of results (race key -> Race) as a new Snapshot.
+
+        RETURNS:
+
+            The new Snapshot.
+
+        """
+        if timestamp is None:
+            timestamp = datetime.now()
+        if self.__timestamps and timestamp < self.__timestamps[-1]:
+            raise ValueError("Snapshots must be recorded in time order")
+
+        if self.snapshots:
+            previous = self.snapshots[-1].buckets
+        else:
+            previous = tuple({} for i in range(self.num_buckets))
+        buckets = list(previous)
+
+        for race_key, race in results.items():
+            index = bucket_for(race_key, self.num_buckets)
+            frozen = previous[index].get(race_key)
+            if frozen is not None and frozen.matches(race):
+                continue
+            # Copy-on-write: only copy a bucket the first time it changes
+            if buckets[index] is previous[index]:
+                buckets[index] = dict(previous[index])
+            buckets[index][race_key] = RaceSnapshot(race_key, race)
+
+        # Drop races that are no longer in the results
+        for index, bucket in enumerate(previous):
+            for race_key in bucket:
+                if race_key not in results:
+                    if buckets[index] is previous[index]:
+                        buckets[index] = dict(previous[index])
+                    del buckets[index][race_key]
+
+        snapshot = Snapshot(timestamp, tuple(buckets))
+        self.snapshots.append(snapshot)
+        self.__timestamps.append(timestamp)
+        return snapshot
+
+    def at(self, timestamp):
+        """RETURNS: the latest Snapshot recorded at or before timestamp.
+
+        Raises KeyError if timestamp is earlier than the first snapshot.
+
+        """
+        index = bisect_right(self.__timestamps, timestamp)
+        if index == 0:
+            raise KeyError(timestamp)
+        return self.snapshots[index - 1]
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+"""
+Write-ahead journal for crash-safe results state.
+
+If the election-night process dies, rebuilding Race and Candidate state by
+re-downloading and re-parsing everything takes time we don't have.
+ResultsJournal backs the in-memory results with two files in a directory:
+
+    journal.log      append-only, one JSON line per applied result
+    checkpoint.json  compact copy of every race as of a journal sequence number
+
+A result sets a candidate's votes in a county, replacing any earlier result
+for that county rather than adding to it, so feeding the journal the full
+feed on every poll doesn't double-count votes. update() journals only the
+county results that changed since the last poll. Results missing from a
+later poll keep their last value.
+
+Every result is written to the journal before it's applied in memory.
+fsync is batched: the journal is flushed to disk every sync_every results,
+and on checkpoint() or sync(). A checkpoint is written to a temp file and
+renamed into place, and then the journal is truncated.
+
+On restart, recover() loads the checkpoint and replays only the journal
+entries after it. An incomplete last line left by a crash mid-write is
+discarded, even if it happens to parse. Text comes back from JSON as
+unicode, so it's encoded to UTF-8 str to match freshly parsed results.
+
+"""
+from os.path import exists, join
+import json
+import os
+
+from elex4.lib.adapters import encode_utf8
+from elex4.lib.models import Race
+from elex4.lib.parser import add_row
+
+JOURNAL = 'journal.log'
+CHECKPOINT = 'checkpoint.json'
+
+
+class ResultsJournal(object):
+
+    def __init__(self, directory, sync_every=100):
+        self.directory = directory
+        self.sync_every = sync_every
+        self.seq = 0
+        self.results = {}
+        self.__unsynced = 0
+        if not exists(directory):
+            os.makedirs(directory)
+        self.__journal = None
+
+    def recover(self):
+        """Rebuild results from the latest checkpoint plus the journal tail.
+
+        RETURNS:
+
+            A dictionary containing race key and Race instances as values.
+
+        """
+        self.results = {}
+        self.seq = 0
+        checkpoint_path = join(self.directory, CHECKPOINT)
+        if exists(checkpoint_path):
+            with open(checkpoint_path, 'rb') as fh:
+                checkpoint = json.load(fh)
+            self.seq = checkpoint['seq']
+            for race_key, state in checkpoint['races'].items():
+                self.results[race_key.encode('utf-8')] = thaw_race(state)
+
+        journal_path = join(self.directory, JOURNAL)
+        good_bytes = 0
+        if exists(journal_path):
+            with open(journal_path, 'rb') as fh:
+                for line in fh:
+                    if not line.endswith('\n'):
+                        # Torn write from a crash; nothing after it was applied
+                        break
+                    try:
+                        entry = encode_utf8(json.loads(line))
+                    except ValueError:
+                        break
+                    good_bytes += len(line)
+                    # Entries at or before the checkpoint are already included
+                    if entry['seq'] > self.seq:
+                        replace_row(self.results, entry['race_key'], entry['row'])
+                        self.seq = entry['seq']
+            # Drop the torn tail so new entries start on a clean line
+            with open(journal_path, 'r+b') as fh:
+                fh.truncate(good_bytes)
+        return self.results
+
+    def apply(self, race_key, row):
+        """Journal a cleaned-up result, then apply it to the in-memory results.
+
+        RETURNS:
+
+            False, without journaling anything, if the result is unchanged.
+
+        """
+        if county_votes(self.results, race_key, row) == row['votes']:
+            return False
+        self.seq += 1
+        line = json.dumps({'seq': self.seq, 'race_key': race_key, 'row': row}, sort_keys=True) + '\n'
+        self._write(line)
+        self.__unsynced += 1
+        if self.__unsynced >= self.sync_every:
+            self.sync()
+        replace_row(self.results, race_key, row)
+        return True
+
+    def update(self, results):
+        """Journal every county result in a freshly parsed poll that changed, then sync.
+
+        RETURNS:
+
+            Number of county results that changed.
+
+        """
+        changed = 0
+        for race_key, row in result_rows(results):
+            if self.apply(race_key, row):
+                changed += 1
+        self.sync()
+        return changed
+
+    def sync(self):
+        """Flush journaled results to disk"""
+        if self.__journal is not None:
+            self.__journal.flush()
+            os.fsync(self.__journal.fileno())
+        self.__unsynced = 0
+
+    def checkpoint(self):
+        """Write a compact copy of all results and start a fresh journal"""
+        self.sync()
+        state = {
+            'seq': self.seq,
+            'races': dict((race_key, freeze_race(race)) for race_key, race in self.results.items()),
+        }
+        path = join(self.directory, CHECKPOINT)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as fh:
+            json.dump(state, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.rename(tmp_path, path)
+        # Safe even if we crash here: recover() skips entries the checkpoint covers
+        self.close()
+        open(join(self.directory, JOURNAL), 'wb').close()
+
+    def close(self):
+        if self.__journal is not None:
+            self.sync()
+            self.__journal.close()
+            self.__journal = None
+
+    def _write(self, line):
+        if self.__journal is None:
+            self.__journal = open(join(self.directory, JOURNAL), 'ab')
+        self.__journal.write(line)
+
+
+def result_rows(results):
+    """Yield (race key, row) for every county result in a results dictionary"""
+    for race_key in sorted(results):
+        race = results[race_key]
+        for (party, raw_name), cand in sorted(race.candidates.items()):
+            for county, votes in sorted(cand.county_results.items()):
+                yield race_key, {
+                    'date': race.date,
+                    'office': race.office,
+                    'district': race.district,
+                    'party': party,
+                    'candidate': raw_name,
+                    'county': county,
+                    'votes': votes,
+                }
+
+
+def county_votes(results, race_key, row):
+    """RETURNS: Votes already recorded for row's candidate and county, or None"""
+    race = results.get(race_key)
+    if race is None:
+        return None
+    cand = race.candidates.get((row['party'], row['candidate']))
+    if cand is None:
+        return None
+    return cand.county_results.get(row['county'])
+
+
+def replace_row(results, race_key, row):
+    """Add a cleaned-up row, replacing any earlier result for the same candidate and county"""
+    previous = county_votes(results, race_key, row)
+    if previous is not None:
+        race = results[race_key]
+        race.total_votes -= previous
+        race.candidates[(row['party'], row['candidate'])].votes -= previous
+    add_row(results, race_key, row)
+
+
+def freeze_race(race):
+    """Convert a Race into JSON-friendly state"""
+    return {
+        'date': race.date,
+        'office': race.office,
+        'district': race.district,
+        'total_votes': race.total_votes,
+        'candidates': [
+            [party, raw_name, cand.votes, cand.county_results]
+            for (party, raw_name), cand in race.candidates.items()
+        ],
+    }
+
+
+def thaw_race(state):
+    """Rebuild a Race from state produced by freeze_race, with text as UTF-8 str"""
+    state = encode_utf8(state)
+    race = Race(state['date'], state['office'], state['district'])
+    for party, raw_name, votes, county_results in state['candidates']:
+        for county, county_votes in county_results.items():
+            race.add_result({'party': party, 'candidate': raw_name, 'county': county, 'votes': county_votes})
+        # Restore totals exactly, even if they don't match the county results
+        race.candidates[(party, raw_name)].votes = votes
+    race.total_votes = state['total_votes']
+    return race
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+"""
+Memory diagnostics for parsed results.
+
+When parse_and_clean blows past a memory limit, the useful questions are
+"what kinds of objects are alive?" and "which part of the model owns the
+bytes?". MemoryCensus answers both after each stage of a run:
+
+    * a census of live, garbage-collected objects by type
+    * deep-size accounting of the Race/Candidate graph, split by logical
+      owner (race objects, candidate objects, county result maps) and by race
+    * the process's peak resident set size
+
+Reports are plain dictionaries that can be saved as JSON and compared with
+diff_reports to see what changed between two runs.
+
+NOTE: tracemalloc isn't available on Python 2, so the census walks
+gc.get_objects() instead. The gc only tracks containers (dicts, lists,
+instances, etc.), so strings and ints show up in the deep-size figures
+but not in the type census.
+
+"""
+from collections import defaultdict
+import gc
+import json
+import resource
+import sys
+
+
+def deep_size(obj, seen=None):
+    """Size in bytes of obj and everything it references that hasn't been seen yet.
+
+    Shared objects (e.g. a county name used by several candidates) are only
+    counted the first time they're reached.
+
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.iteritems():
+            size += deep_size(key, seen) + deep_size(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += deep_size(item, seen)
+    elif hasattr(obj, '__dict__'):
+        size += deep_size(obj.__dict__, seen)
+    return size
+
+
+def type_census(limit=20):
+    """Count and shallow size of live gc-tracked objects, by type name.
+
+    RETURNS:
+
+        Dictionary of type name -> {'count': n, 'bytes': n} for the
+        largest `limit` types by bytes.
+
+    """
+    census = defaultdict(lambda: {'count': 0, 'bytes': 0})
+    for obj in gc.get_objects():
+        entry = census[type(obj).__name__]
+        entry['count'] += 1
+        entry['bytes'] += sys.getsizeof(obj)
+    largest = sorted(census.items(), key=lambda item: item[1]['bytes'], reverse=True)[:limit]
+    return dict(largest)
+
+
+def model_sizes(results):
+    """Deep-size accounting of a dictionary of Race instances.
+
+    Bytes are attributed to the first owner that reaches them, in this
+    order: county result maps, candidate objects, race objects.
+
+    RETURNS:
+
+        Dictionary with byte and object counts by owner, plus bytes per race.
+
+    """
+    seen = set([id(results)])
+    owners = {
+        'races': {'count': 0, 'bytes': 0},
+        'candidates': {'count': 0, 'bytes': 0},
+        'county_results': {'count': 0, 'bytes': 0},
+    }
+    per_race = {}
+    for race_key, race in results.items():
+        race_bytes = deep_size(race_key, seen)
+        for cand in race.candidates.values():
+            county_bytes = deep_size(cand.county_results, seen)
+            owners['county_results']['count'] += len(cand.county_results)
+            owners['county_results']['bytes'] += county_bytes
+            cand_bytes = deep_size(cand, seen)
+            owners['candidates']['count'] += 1
+            owners['candidates']['bytes'] += cand_bytes
+            race_bytes += county_bytes + cand_bytes
+        own_bytes = deep_size(race, seen)
+        owners['races']['count'] += 1
+        owners['races']['bytes'] += own_bytes
+        per_race[race_key] = race_bytes + own_bytes
+    owners['total_bytes'] = sum(per_race.values())
+    owners['per_race'] = per_race
+    return owners
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process (KB on Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class MemoryCensus(object):
+    """Collects a memory report after each stage of a run"""
+
+    def __init__(self):
+        self.stages = []
+
+    def snapshot(self, stage, results=None):
+        """Record memory use after a stage, optionally sizing a results dict"""
+        gc.collect()
+        report = {
+            'stage': stage,
+            'peak_rss_kb': peak_rss_kb(),
+            'types': type_census(),
+            'model': None,
+        }
+        if results is not None:
+            report['model'] = model_sizes(results)
+        self.stages.append(report)
+        return report
+
+    def save(self, path):
+        with open(path, 'wb') as fh:
+            json.dump(self.stages, fh, indent=2, sort_keys=True)
+
+
+def load_report(path):
+    with open(path, 'rb') as fh:
+        return json.load(fh)
+
+
+def diff_reports(before, after):
+    """Compare two saved reports stage by stage.
+
+    RETURNS:
+
+        List of (stage, metric, before, after, change) tuples for metrics
+        that differ, where metric is e.g. 'peak_rss_kb', 'types.dict.bytes'
+        or 'model.candidates.bytes'.
+
+    """
+    changes = []
+    before_stages = dict((stage['stage'], stage) for stage in before)
+    for stage in after:
+        old = before_stages.get(stage['stage'], {})
+        for metric, old_value, new_value in _flat_metrics(old, stage):
+            if old_value != new_value:
+                changes.append((stage['stage'], metric, old_value, new_value, new_value - old_value))
+    return changes
+
+
+def _flat_metrics(old, new):
+    # Pair up the numeric metrics in two stage reports, treating missing values as zero
+    yield 'peak_rss_kb', old.get('peak_rss_kb', 0), new.get('peak_rss_kb', 0)
+    old_types, new_types = old.get('types') or {}, new.get('types') or {}
+    for name in sorted(set(old_types) | set(new_types)):
+        for field in ('count', 'bytes'):
+            yield ('types.%s.%s' % (name, field),
+                   old_types.get(name, {}).get(field, 0),
+                   new_types.get(name, {}).get(field, 0))
+    old_model, new_model = old.get('model') or {}, new.get('model') or {}
+    for owner in ('races', 'candidates', 'county_results'):
+        for field in ('count', 'bytes'):
+            yield ('model.%s.%s' % (owner, field),
+                   old_model.get(owner, {}).get(field, 0),
+                   new_model.get(owner, {}).get(field, 0))
+    yield 'model.total_bytes', old_model.get('total_bytes', 0), new_model.get('total_bytes', 0)
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+"""
+Resolve candidates whose names are spelled differently across feeds.
+
+Race keys candidates on the exact (party, candidate) strings, so a feed
+that sends "Smith, Joe" in one county and "SMITH, JOSEPH" in another splits
+one candidate in two. Comparing every pair of candidates with a fuzzy
+matcher is quadratic, so CandidateMatcher first builds a blocking index
+within each race. Candidates land in the same block if they share a party
+and either the Soundex code of their last name or a trigram of it. Only
+candidates sharing a block are scored against each other. Blocks larger
+than max_block are too common to be useful and are skipped.
+
+Pairs scoring at least the threshold are merged under a canonical key: the
+variant with the most votes. Each merge is recorded in a match report, so
+a person can review it before results are published.
+
+"""
+from difflib import SequenceMatcher
+import re
+
+# Common nicknames, mapped to the formal first name
+NICKNAMES = {
+    'AL': 'ALBERT', 'BEN': 'BENJAMIN', 'BETH': 'ELIZABETH', 'BILL': 'WILLIAM',
+    'BOB': 'ROBERT', 'CHRIS': 'CHRISTOPHER', 'DAN': 'DANIEL', 'DAVE': 'DAVID',
+    'DICK': 'RICHARD', 'ED': 'EDWARD', 'JIM': 'JAMES', 'JOE': 'JOSEPH',
+    'JOHNNY': 'JOHN', 'KATE': 'KATHERINE', 'LIZ': 'ELIZABETH', 'MIKE': 'MICHAEL',
+    'PAT': 'PATRICK', 'PEGGY': 'MARGARET', 'RICK': 'RICHARD', 'ROB': 'ROBERT',
+    'SAM': 'SAMUEL', 'STEVE': 'STEVEN', 'SUE': 'SUSAN', 'TOM': 'THOMAS',
+    'TONY': 'ANTHONY', 'WILL': 'WILLIAM',
+}
+
+# Name suffixes that don't distinguish candidates
+SUFFIXES = set(['JR', 'SR', 'II', 'III', 'IV'])
+
+_NON_ALPHA = re.compile(r'[^A-Z ]+')
+
+_SOUNDEX_CODES = dict((char, str(code)) for code, chars in enumerate(
+    ['AEIOUYHW', 'BFPV', 'CGJKQSXZ', 'DT', 'L', 'MN', 'R']) for char in chars)
+
+
+def split_name(raw_name):
+    """RETURNS: Normalized (last name, first name) from a "Last, First" name"""
+    last, sep, first = raw_name.partition(',')
+    last = _NON_ALPHA.sub('', last.upper().replace('-', ' ')).strip()
+    words = [word for word in _NON_ALPHA.sub('', first.upper()).split() if word not in SUFFIXES]
+    first = NICKNAMES.get(words[0], words[0]) if words else ''
+    return last, first
+
+
+def soundex(name):
+    """Four-character Soundex code of a name"""
+    name = name.replace(' ', '')
+    if not name:
+        return ''
+    code = name[0]
+    previous = _SOUNDEX_CODES.get(name[0])
+    for char in name[1:]:
+        digit = _SOUNDEX_CODES.get(char)
+        if digit is not None and digit != '0' and digit != previous:
+            code += digit
+        # H and W don't separate letters with the same code
+        if char not in 'HW':
+            previous = digit
+    return (code + '000')[:4]
+
+
+def trigrams(name):
+    padded = '  %s ' % name
+    return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def name_similarity(a, b):
+    """Score from 0 to 1 for how likely two normalized (last, first) names are the same person"""
+    last = SequenceMatcher(None, a[0], b[0]).ratio()
+    if not a[1] or not b[1]:
+        first = 0.5
+    elif a[1] == b[1]:
+        first = 1.0
+    elif len(a[1]) == 1 or len(b[1]) == 1:
+        # An initial matching a full first name
+        first = 0.9 if a[1][0] == b[1][0] else 0.0
+    else:
+        first = SequenceMatcher(None, a[1], b[1]).ratio()
+    # Both parts have to agree; a close last name can't make up for a different first name
+    return last * first
+
+
+class CandidateMatcher(object):
+
+    def __init__(self, threshold=0.8, max_block=50):
+        self.threshold = threshold
+        self.max_block = max_block
+
+    def find_matches(self, race):
+        """Likely duplicate candidates in a race.
+
+        RETURNS:
+
+            List of (score, candidate key, candidate key) for pairs scoring at
+            least the threshold, best first.
+
+        """
+        names = dict((key, split_name(key[1])) for key in race.candidates)
+        blocks = {}
+        for key, (last, first) in names.items():
+            party = key[0].upper()
+            for block in [('S', soundex(last))] + [('G', gram) for gram in trigrams(last)]:
+                blocks.setdefault((party,) + block, []).append(key)
+
+        pairs = set()
+        for members in blocks.values():
+            if len(members) < 2 or len(members) > self.max_block:
+                continue
+            members.sort()
+            for i, key in enumerate(members):
+                for other in members[i + 1:]:
+                    pairs.add((key, other))
+
+        matches = []
+        for key, other in pairs:
+            score = name_similarity(names[key], names[other])
+            if score >= self.threshold:
+                matches.append((score, key, other))
+        matches.sort(reverse=True)
+        return matches
+
+    def resolve(self, race):
+        """Merge likely duplicate candidates in a race, in place.
+
+        RETURNS:
+
+            List of report entries, one per merged variant.
+
+        """
+        matches = self.find_matches(race)
+        if not matches:
+            return []
+        # Union-find over matched pairs, so chains of matches form one group
+        parent = {}
+
+        def find(key):
+            parent.setdefault(key, key)
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        scores = {}
+        for score, key, other in matches:
+            parent[find(key)] = find(other)
+            scores[key] = max(scores.get(key, 0), score)
+            scores[other] = max(scores.get(other, 0), score)
+
+        groups = {}
+        for key in parent:
+            groups.setdefault(find(key), []).append(key)
+
+        report = []
+        for members in groups.values():
+            members.sort(key=lambda key: (-race.candidates[key].votes, key))
+            canonical_key = members[0]
+            canonical = race.candidates[canonical_key]
+            for key in members[1:]:
+                variant = race.candidates.pop(key)
+                conflicts = []
+                for county, votes in variant.county_results.items():
+                    if county in canonical.county_results:
+                        # Both spellings reported this county; keep the canonical result
+                        conflicts.append(county)
+                        race.total_votes -= votes
+                    else:
+                        canonical.add_votes(county, votes)
+                report.append({
+                    'canonical_party': canonical_key[0],
+                    'canonical_name': canonical_key[1],
+                    'merged_party': key[0],
+                    'merged_name': key[1],
+                    'score': round(scores[key], 3),
+                    'votes_merged': variant.votes - sum(variant.county_results[county] for county in conflicts),
+                    'conflicting_counties': ';'.join(sorted(conflicts)),
+                })
+        return report
+
+
+REPORT_FIELDS = [
+    'race', 'canonical_party', 'canonical_name', 'merged_party', 'merged_name',
+    'score', 'votes_merged', 'conflicting_counties',
+]
+
+
+def resolve_candidates(results, matcher=None):
+    """Merge likely duplicate candidates in every race, in place.
+
+    RETURNS:
+
+        Match report: a list of dictionaries with REPORT_FIELDS keys.
+
+    """
+    matcher = matcher or CandidateMatcher()
+    report = []
+    for race_key in sorted(results):
+        for entry in matcher.resolve(results[race_key]):
+            entry['race'] = race_key
+            report.append(entry)
+    return report
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""
+Incremental static HTML results pages.
+
+Renders one page per race plus an index page from summary results.
+A manifest in the output directory records a content hash for every race
+page, so later runs only re-render and rewrite pages whose race changed:
+a poll where ten races changed rewrites about ten files (plus the index).
+
+Page file names are slugs of race keys. Distinct race keys can share a
+slug ('State Senate-12' and 'State-Senate 12'), so a race whose slug is
+already taken gets a short hash of its race key appended. A race keeps
+the file name recorded in the manifest, so its page doesn't move when a
+race with the same slug comes or goes.
+
+Templates live in elex4/templates/. Compiled templates are cached on disk
+with Jinja2's bytecode cache, so they aren't recompiled on every run.
+
+"""
+from hashlib import sha1
+from os.path import dirname, exists, join
+import json
+import os
+import re
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+TEMPLATE_DIR = join(dirname(dirname(__file__)), 'templates')
+MANIFEST = '.manifest.json'
+
+
+def slugify(race_key):
+    """Convert a race key such as 'State Senate-12' into 'state-senate-12'"""
+    return re.sub(r'[^a-z0-9]+', '-', race_key.lower()).strip('-')
+
+
+class PageGenerator(object):
+
+    def __init__(self, output_dir, template_dir=TEMPLATE_DIR, cache_dir=None):
+        self.output_dir = output_dir
+        if cache_dir is None:
+            cache_dir = join(output_dir, '.template_cache')
+        for path in (output_dir, cache_dir):
+            if not exists(path):
+                os.makedirs(path)
+        self.env = Environment(
+            loader=FileSystemLoader(template_dir),
+            bytecode_cache=FileSystemBytecodeCache(cache_dir),
+            autoescape=True,
+        )
+        self.manifest = self.__load_manifest()
+
+    def render(self, summary):
+        """Write pages for races whose summary changed since the last run.
+
+        RETURNS:
+
+            List of paths that were written or removed.
+
+        """
+        race_template = self.env.get_template('race.html')
+        # Changing the template invalidates every page
+        template_hash = self.__template_hash('race.html')
+
+        changed = []
+        manifest = {}
+        index_races = []
+        file_names = self.__file_names(summary)
+        for race_key in sorted(summary):
+            race = summary[race_key]
+            fname = file_names[race_key]
+            digest = sha1(template_hash + json.dumps(race, sort_keys=True)).hexdigest()
+            manifest[race_key] = {'file': fname, 'hash': digest}
+            index_races.append((race_key, race, fname))
+
+            path = join(self.output_dir, fname)
+            if self.manifest.get(race_key, {}).get('hash') == digest and exists(path):
+                continue
+            self.__write(path, race_template.render(race=race))
+            changed.append(path)
+
+        # Clean up pages for races that have disappeared from the results,
+        # unless another race has taken over the file name
+        in_use = set(file_names.values())
+        for race_key, entry in self.manifest.items():
+            if race_key not in manifest and entry['file'] not in in_use:
+                path = join(self.output_dir, entry['file'])
+                if exists(path):
+                    os.remove(path)
+                changed.append(path)
+
+        index_path = join(self.output_dir, 'index.html')
+        if changed or not exists(index_path):
+            self.__write(index_path, self.env.get_template('index.html').render(races=index_races))
+            changed.append(index_path)
+
+        self.manifest = manifest
+        self.__write(join(self.output_dir, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True))
+        return changed
+
+    # Private methods
+    def __file_names(self, race_keys):
+        """RETURNS: Dictionary of race key -> unique page file name"""
+        file_names = {}
+        taken = set(['index.html'])
+        for race_key in sorted(race_keys):
+            fname = self.manifest.get(race_key, {}).get('file')
+            if fname and fname not in taken:
+                file_names[race_key] = fname
+                taken.add(fname)
+        for race_key in sorted(race_keys):
+            if race_key in file_names:
+                continue
+            slug = slugify(race_key)
+            fname = slug + '.html'
+            if fname in taken:
+                fname = '%s-%s.html' % (slug, sha1(race_key).hexdigest()[:8])
+            file_names[race_key] = fname
+            taken.add(fname)
+        return file_names
+
+    def __load_manifest(self):
+        path = join(self.output_dir, MANIFEST)
+        if not exists(path):
+            return {}
+        with open(path, 'rb') as fh:
+            return json.load(fh)
+
+    def __template_hash(self, name):
+        source = self.env.loader.get_source(self.env, name)[0]
+        return sha1(source.encode('utf-8')).hexdigest()
+
+    def __write(self, path, content):
+        # Write to a temp file and rename, so readers never see a partial page
+        if isinstance(content, unicode):
+            content = content.encode('utf-8')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as fh:
+            fh.write(content)
+        os.rename(tmp_path, path)
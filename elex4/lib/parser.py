@@ -2,39 +2,189 @@
 import csv
 from collections import defaultdict
 
+from elex4.lib.adapters import adapter_for, read_csv, read_rows
 from elex4.lib.models import Race
 
+# Columns the parser and Race model need, in the order they're unpacked
+REQUIRED_COLUMNS = ('date', 'office', 'district', 'county', 'candidate', 'party', 'votes')
 
-def parse_and_clean(path):
+# Conversions applied to individual columns
+CONVERTERS = {
+    'votes': int,
+}
+
+# Specialized row parsers, cached by CSV header
+_compiled_parsers = {}
+
+
+def parse_and_clean(path, dedup=None, monitor=None):
     """Parse downloaded results file.
 
+    The file can be in any format with an input adapter (see adapters.py).
+    Pass a dedup.DuplicateFilter as dedup to skip rows that repeat an
+    earlier result for the same race, candidate and county. Pass an
+    anomaly.AnomalyDetector as monitor to check each result as it's added.
+
 
     RETURNS:
 
         A dictionary containing race key and Race instances as values.
 
     """
-    # Create reader for ingesting CSV as array of dicts
-    reader = csv.DictReader(open(path, 'rb'))
-
     results = {}
+    for race_key, row in parsed_rows(path, dedup, monitor):
+        add_row(results, race_key, row)
+    return results
+
+
+def parsed_rows(path, dedup=None, monitor=None):
+    """Yield race key and cleaned-up row for each result parse_and_clean would add.
+
+    Takes the same dedup and monitor as parse_and_clean, for callers that
+    send rows somewhere other than a local results dictionary.
+
+    """
+    for row_num, race_key, row in clean_rows(path):
+        if dedup is not None and dedup.is_duplicate(race_key, row, row_num):
+            continue
+        if monitor is not None:
+            monitor.check(race_key, row)
+        yield race_key, row
+
+    # A probabilistic filter holds back possible duplicates until
+    # a second pass over the file can confirm them
+    if dedup is not None and dedup.deferred:
+        for race_key, row in dedup.verify(clean_rows(path)):
+            if monitor is not None:
+                monitor.check(race_key, row)
+            yield race_key, row
+
+
+def clean_rows(path):
+    """Yield row number, race key and cleaned-up row for each row in a results file"""
+    if adapter_for(path) is read_csv:
+        for parsed in clean_lines(open(path, 'rb')):
+            yield parsed
+        return
+
+    # Create reader for ingesting results as array of dicts
+    reader = read_rows(path)
 
-    # Initial data clean-up
-    for row in reader:
-        # Convert votes to integer
-        row['votes'] = int(row['votes'])
+    for row_num, row in enumerate(reader):
+        row = clean_row(row)
 
         # Store races by slugified office and district (if there is one)
-        race_key = row['office'] 
-        if row['district']:
-            race_key += "-%s" % row['district']
+        race_key = make_race_key(row['office'], row['district'])
 
-        try:
-            race = results[race_key]
-        except KeyError:
-            race = Race(row['date'], row['office'], row['district'])
-            results[race_key] = race
+        yield row_num, race_key, row
 
-        race.add_result(row)
 
-    return results
+def clean_lines(lines):
+    """Yield row number, race key and cleaned-up row for each line of a results CSV.
+
+    lines is any iterable of CSV lines, including the header, such as an
+    open file or scraper.stream_results().
+
+    """
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if not header:
+        return
+    parse_row = compile_row_parser(header)
+    for row_num, fields in enumerate(reader):
+        if not fields:
+            # Blank line
+            continue
+        parsed = parse_row(fields) if parse_row is not None else None
+        if parsed is None:
+            # Ragged row or unfamiliar header; use the generic clean-up
+            row = clean_row(dict(zip(header, fields)))
+            parsed = make_race_key(row['office'], row['district']), row
+        yield (row_num,) + parsed
+
+
+def clean_row(row):
+    """Initial data clean-up for a row dictionary"""
+    for column, convert in CONVERTERS.items():
+        row[column] = convert(row[column])
+    return row
+
+
+def compile_row_parser(header):
+    """Build a row parser specialized for a CSV header.
+
+    The generic path builds a dictionary of every column for every row,
+    then looks values up by name. The compiled parser instead knows, for
+    this column layout, the position of each column it needs. It unpacks
+    the list from csv.reader by index, applies converters, and looks race keys
+    up in a cache rather than rebuilding them with string concatenation.
+
+    Parsers are cached by header, so each layout is only compiled once.
+
+    RETURNS:
+
+        Function taking a list of fields and returning (race key, row dict),
+        or None for ragged rows. Returns None instead of a function if the
+        header is missing required columns.
+
+    """
+    header = tuple(header)
+    try:
+        return _compiled_parsers[header]
+    except KeyError:
+        pass
+
+    if not set(REQUIRED_COLUMNS).issubset(header):
+        return None
+
+    values = []
+    for column in REQUIRED_COLUMNS:
+        value = "fields[%d]" % header.index(column)
+        if column in CONVERTERS:
+            value = "convert_%s(%s)" % (column, value)
+        values.append("%r: %s" % (column, value))
+
+    source = (
+        "def parse_row(fields):\n"
+        "    if len(fields) != %(num_columns)d:\n"
+        "        return None\n"
+        "    office = fields[%(office)d]\n"
+        "    district = fields[%(district)d]\n"
+        "    try:\n"
+        "        race_key = race_keys[office, district]\n"
+        "    except KeyError:\n"
+        "        race_key = race_keys[office, district] = make_race_key(office, district)\n"
+        "    return race_key, {%(values)s}\n"
+    ) % {
+        'num_columns': len(header),
+        'office': header.index('office'),
+        'district': header.index('district'),
+        'values': ", ".join(values),
+    }
+    namespace = {'make_race_key': make_race_key, 'race_keys': {}}
+    for column, convert in CONVERTERS.items():
+        namespace['convert_%s' % column] = convert
+    exec source in namespace
+
+    parse_row = namespace['parse_row']
+    _compiled_parsers[header] = parse_row
+    return parse_row
+
+
+def add_row(results, race_key, row):
+    """Add a cleaned-up row to its Race, creating the Race if needed"""
+    try:
+        race = results[race_key]
+    except KeyError:
+        race = Race(row['date'], row['office'], row['district'])
+        results[race_key] = race
+
+    race.add_result(row)
+
+
+def make_race_key(office, district):
+    """Build a race key from office and district (if there is one)"""
+    race_key = office
+    if district:
+        race_key += "-%s" % district
+    return race_key
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""
+Pipelined execution of download, parse, summarize and write.
+
+The regular script runs each step to completion before starting the next,
+so the network, CPU and disk take turns sitting idle. Here each step runs
+in its own thread and hands its output to the next step through a bounded
+queue:
+
+    lines -> parse -> races -> summarize -> rows -> write
+
+Bounded queues provide backpressure: a fast stage blocks once the queue
+in front of a slower stage fills up, so memory stays capped while total
+run time approaches that of the slowest stage.
+
+"""
+import threading
+from Queue import Queue, Full
+
+from elex4.lib.parser import add_row, clean_lines
+from elex4.lib.summary import flatten, summarize
+
+# Marks the end of a stage's output
+DONE = object()
+
+
+def run_pipeline(lines, write_row, maxsize=1000, grouped_by_race=False):
+    """Stream raw CSV lines through parse, summarize and write stages.
+
+    lines is any iterable of CSV lines, such as scraper.stream_results().
+    write_row is called with each flattened summary row, typically the
+    writerow method of a csv.DictWriter.
+
+    Races can only be summarized once all their rows have been parsed. If
+    the feed is grouped by race, pass grouped_by_race=True and each race is
+    handed downstream as soon as the next race starts. Otherwise races are
+    handed off after the last line has been parsed.
+
+    RETURNS:
+
+        Number of rows written.
+
+    """
+    line_queue = Queue(maxsize)
+    race_queue = Queue(maxsize)
+    row_queue = Queue(maxsize)
+    pipeline = _Pipeline()
+
+    pipeline.start(_read_lines, lines, line_queue)
+    pipeline.start(_parse_races, line_queue, race_queue, grouped_by_race)
+    pipeline.start(_summarize_races, race_queue, row_queue)
+    written = pipeline.run(_write_rows, row_queue, write_row)
+    pipeline.join()
+    return written
+
+
+class _Pipeline(object):
+    """Runs stages in threads and re-raises the first error in the caller"""
+
+    def __init__(self):
+        self.threads = []
+        self.errors = []
+        self.failed = threading.Event()
+
+    def start(self, stage, *args):
+        thread = threading.Thread(target=self.run, args=(stage,) + args)
+        thread.daemon = True
+        thread.start()
+        self.threads.append(thread)
+
+    def run(self, stage, *args):
+        try:
+            return stage(self, *args)
+        except _Aborted:
+            pass
+        except Exception, exc:
+            self.errors.append(exc)
+            self.failed.set()
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+        if self.errors:
+            raise self.errors[0]
+
+    def put(self, queue, item):
+        # Block while the queue is full, but give up if another stage failed
+        # so upstream stages don't wait forever on a dead consumer.
+        while not self.failed.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return
+            except Full:
+                pass
+        raise _Aborted()
+
+    def get(self, queue):
+        item = queue.get()
+        if self.failed.is_set():
+            raise _Aborted()
+        return item
+
+    def finish(self, queue):
+        # Always try to tell the next stage we're done, even after an error,
+        # unless that stage has stopped reading.
+        while True:
+            try:
+                queue.put(DONE, timeout=0.1)
+                return
+            except Full:
+                if self.failed.is_set():
+                    return
+
+
+class _Aborted(Exception):
+    """Raised inside a stage when another stage has failed"""
+
+
+def _read_lines(pipeline, lines, line_queue):
+    try:
+        for line in lines:
+            pipeline.put(line_queue, line)
+    finally:
+        pipeline.finish(line_queue)
+
+
+def _parse_races(pipeline, line_queue, race_queue, grouped_by_race):
+    def queued_lines():
+        while True:
+            line = pipeline.get(line_queue)
+            if line is DONE:
+                return
+            yield line
+
+    results = {}
+    handed_off = set()
+    current_key = None
+    try:
+        for row_num, race_key, row in clean_lines(queued_lines()):
+            if grouped_by_race and race_key != current_key:
+                if race_key in handed_off:
+                    raise ValueError("Feed is not grouped by race: %s appears twice" % race_key)
+                if current_key is not None:
+                    handed_off.add(current_key)
+                    pipeline.put(race_queue, (current_key, results.pop(current_key)))
+                current_key = race_key
+
+            add_row(results, race_key, row)
+
+        for race_key, race in results.items():
+            pipeline.put(race_queue, (race_key, race))
+    finally:
+        pipeline.finish(race_queue)
+
+
+def _summarize_races(pipeline, race_queue, row_queue):
+    try:
+        while True:
+            item = pipeline.get(race_queue)
+            if item is DONE:
+                break
+            race_key, race = item
+            summary = summarize({race_key: race})
+            for row in flatten(summary[race_key]):
+                pipeline.put(row_queue, row)
+    finally:
+        pipeline.finish(row_queue)
+
+
+def _write_rows(pipeline, row_queue, write_row):
+    written = 0
+    while True:
+        row = pipeline.get(row_queue)
+        if row is DONE:
+            break
+        write_row(row)
+        written += 1
+    return written
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+"""
+Adaptive polling of results feeds.
+
+Running the download on a fixed cron interval fetches far too often early
+in the evening, when nothing changes, and too rarely at peak reporting.
+PollScheduler instead keeps a poll interval per Feed:
+
+    * a poll that finds new results halves the interval, down to
+      min_interval, so a burst of changes is followed closely
+    * a poll that finds nothing new stretches the interval by backoff,
+      up to max_interval
+    * Cache-Control max-age and Retry-After from the server set a floor
+      on the wait before the next poll
+    * errors back off like an unchanged poll
+    * each interval is randomly jittered so feeds don't poll in lockstep,
+      but never below the server's floor
+
+A failed fetch or on_change callback is reported to on_error and the
+scheduler carries on with the next poll.
+
+A token bucket caps requests across all feeds at budget per budget_window
+seconds, however many feeds are due.
+
+The clock, random number generator and fetch function are all swappable,
+so tests can run the scheduler against a simulated clock.
+
+"""
+from email.utils import mktime_tz, parsedate_tz
+from hashlib import sha1
+from httplib import HTTPException
+from os.path import exists
+import heapq
+import random
+import re
+import sys
+import time
+
+from elex4.lib.scraper import fetch_results
+
+_MAX_AGE = re.compile(r'max-age\s*=\s*(\d+)')
+
+
+class SystemClock(object):
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+class Feed(object):
+
+    def __init__(self, name, url, path, min_interval=15, max_interval=300, initial_interval=60, backoff=1.5):
+        self.name = name
+        self.url = url
+        self.path = path
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = initial_interval
+        self.backoff = backoff
+        self.next_poll = 0
+        # Conditional request validators from the last successful response
+        self.etag = None
+        self.last_modified = None
+        self.content_hash = None
+        self.polls = 0
+        self.changes = 0
+        self.errors = 0
+
+    def update(self, status, headers, now, scale=1.0):
+        """Adapt the interval to the outcome of a poll.
+
+        scale multiplies the interval, for jitter, before the floor from
+        max-age or Retry-After is applied.
+
+        RETURNS:
+
+            (changed, wait) where changed is True if the poll found new
+            results and wait is the seconds until the next poll.
+
+        """
+        self.polls += 1
+        changed = False
+        floor = 0
+        if status == 200:
+            self.etag = headers.get('etag')
+            self.last_modified = headers.get('last-modified')
+            content_hash = _file_hash(self.path)
+            changed = content_hash != self.content_hash
+            self.content_hash = content_hash
+        elif status != 304:
+            self.errors += 1
+            floor = retry_after(headers.get('retry-after'), now)
+
+        if changed:
+            self.changes += 1
+            self.interval = max(self.min_interval, self.interval / 2.0)
+        else:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+        floor = max(floor, max_age(headers.get('cache-control')))
+        return changed, max(self.interval * scale, floor)
+
+
+def max_age(cache_control):
+    """Seconds from a Cache-Control max-age directive, or 0"""
+    match = _MAX_AGE.search(cache_control or '')
+    return int(match.group(1)) if match else 0
+
+
+def retry_after(value, now):
+    """Seconds to wait from a Retry-After header, given as seconds or an HTTP date"""
+    if not value:
+        return 0
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return 0
+    return max(0, mktime_tz(parsed) - now)
+
+
+def _file_hash(path):
+    if not exists(path):
+        return None
+    with open(path, 'rb') as fh:
+        return sha1(fh.read()).hexdigest()
+
+
+def fetch_feed(feed):
+    """Default fetch: conditional GET of the feed's URL to its path"""
+    return fetch_results(feed.path, feed.url, feed.etag, feed.last_modified)
+
+
+def print_error(feed, exc):
+    """Default on_error: report a failed poll on stderr"""
+    print >> sys.stderr, "%s poll failed: %s: %s" % (feed.name, exc.__class__.__name__, exc)
+
+
+class PollScheduler(object):
+
+    def __init__(self, feeds, on_change=None, budget=60, budget_window=60.0,
+                 jitter=0.1, clock=None, fetch=fetch_feed, rng=None, on_error=print_error):
+        """
+        on_change: called with a Feed each time a poll finds new results.
+        budget: maximum requests across all feeds per budget_window seconds.
+        jitter: each interval is scaled by a random factor within +/- jitter.
+        on_error: called with a Feed and the exception when fetching or on_change fails.
+
+        """
+        self.feeds = feeds
+        self.on_change = on_change
+        self.on_error = on_error
+        self.budget = budget
+        self.budget_window = budget_window
+        self.jitter = jitter
+        self.clock = clock or SystemClock()
+        self.fetch = fetch
+        self.rng = rng or random.Random()
+        self.requests = 0
+        self.__tokens = float(budget)
+        self.__refilled_at = self.clock.time()
+        self.__queue = []
+        for index, feed in enumerate(feeds):
+            feed.next_poll = self.clock.time()
+            heapq.heappush(self.__queue, (feed.next_poll, index, feed))
+
+    def run(self, until=None, max_polls=None):
+        """Poll feeds as they come due, until the clock passes until or max_polls polls are made"""
+        polls = 0
+        while self.__queue and (max_polls is None or polls < max_polls):
+            next_poll, index, feed = self.__queue[0]
+            # A due feed still waits for a token if the budget is spent
+            start = max(next_poll, self.clock.time() + self.__token_wait())
+            if until is not None and start > until:
+                break
+            heapq.heappop(self.__queue)
+            self.clock.sleep(start - self.clock.time())
+            self.__refill()
+            self.__tokens -= 1
+            self.poll(feed)
+            polls += 1
+            heapq.heappush(self.__queue, (feed.next_poll, index, feed))
+        return polls
+
+    def poll(self, feed):
+        """Fetch one feed now and schedule its next poll"""
+        try:
+            status, headers = self.fetch(feed)
+        except (IOError, HTTPException), exc:
+            self.__report(feed, exc)
+            status, headers = None, {}
+        self.requests += 1
+        now = self.clock.time()
+        scale = self.rng.uniform(1 - self.jitter, 1 + self.jitter) if self.jitter else 1.0
+        changed, wait = feed.update(status, headers, now, scale)
+        feed.next_poll = now + wait
+        if changed and self.on_change is not None:
+            try:
+                self.on_change(feed)
+            except Exception, exc:
+                # A failed publish shouldn't stop polling
+                self.__report(feed, exc)
+        return changed
+
+    # Private methods
+    def __report(self, feed, exc):
+        if self.on_error is not None:
+            self.on_error(feed, exc)
+
+    def __refill(self):
+        now = self.clock.time()
+        rate = self.budget / float(self.budget_window)
+        self.__tokens = min(self.budget, self.__tokens + (now - self.__refilled_at) * rate)
+        self.__refilled_at = now
+
+    def __token_wait(self):
+        self.__refill()
+        if self.__tokens >= 1:
+            return 0
+        return (1 - self.__tokens) * self.budget_window / float(self.budget)
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+"""
+Server-sent events (SSE) push of live race updates.
+
+Instead of polling for the whole summary, clients hold open a request like
+
+    GET /events?races=President,Senate-1 HTTP/1.1
+
+and receive an event each time one of those races changes (leave off the
+races parameter to follow every race). New clients first receive the
+latest event for each race they follow.
+
+PushServer is built on asyncore, so a single thread can serve thousands
+of connections. Each update is encoded once and the same bytes are queued
+for every subscriber. Every client's queue holds at most one pending event
+per race: if a slow client hasn't received an update before the next one
+arrives, the newer event replaces it, so a queue never holds more than
+one event per race. A client that has had more than max_pending
+undelivered updates replaced by newer ones since it last caught up is
+disconnected. The replay sent to new clients doesn't count toward that
+limit, so following many races doesn't by itself get a client dropped.
+
+"""
+from collections import OrderedDict
+from urlparse import parse_qs, urlparse
+import asyncore
+import json
+import socket
+import threading
+
+RESPONSE_HEADERS = (
+    "HTTP/1.1 200 OK\r\n"
+    "Content-Type: text/event-stream\r\n"
+    "Cache-Control: no-cache\r\n"
+    "Connection: keep-alive\r\n"
+    "\r\n"
+)
+
+
+def encode_event(event_id, race_key, race_summary):
+    """Encode a race summary as a single SSE message"""
+    data = json.dumps({'race': race_key, 'summary': race_summary}, sort_keys=True)
+    return "id: %s\nevent: race\ndata: %s\n\n" % (event_id, data)
+
+
+class PushServer(asyncore.dispatcher):
+
+    def __init__(self, address, max_pending=100):
+        # Use a private socket map so several servers (or tests) can coexist
+        self.socket_map = {}
+        asyncore.dispatcher.__init__(self, map=self.socket_map)
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind(address)
+        self.listen(1024)
+        self.max_pending = max_pending
+        self.clients = set()
+        # Latest encoded event for each race, replayed to new subscribers
+        self.latest = {}
+        self.lock = threading.Lock()
+        self.__last_event_id = 0
+        self.__published = {}
+        self.__serving = False
+        self.__stopping = False
+
+    def publish(self, summary):
+        """Push events for races whose summary changed since the last publish.
+
+        Safe to call from a thread other than the one running serve_forever.
+
+        RETURNS:
+
+            List of race keys that changed.
+
+        """
+        changed = []
+        for race_key in sorted(summary):
+            data = json.dumps(summary[race_key], sort_keys=True)
+            if self.__published.get(race_key) == data:
+                continue
+            self.__published[race_key] = data
+            self.__last_event_id += 1
+            # Encode once, then share the same message with every subscriber
+            message = encode_event(self.__last_event_id, race_key, summary[race_key])
+            with self.lock:
+                self.latest[race_key] = message
+                for client in self.clients:
+                    client.queue(race_key, message)
+            changed.append(race_key)
+        return changed
+
+    def serve_forever(self, timeout=0.1):
+        with self.lock:
+            self.__serving = not self.__stopping
+        try:
+            while self.socket_map and not self.__stopping:
+                asyncore.loop(timeout, use_poll=True, map=self.socket_map, count=1)
+        finally:
+            with self.lock:
+                self.__serving = False
+                self.__close_all()
+
+    def shutdown(self):
+        """Close the server and every connection.
+
+        If serve_forever is running, it does the closing in its own thread
+        and returns soon after, so sockets are never closed under it.
+
+        """
+        with self.lock:
+            self.__stopping = True
+            if not self.__serving:
+                self.__close_all()
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            _SSEClient(pair[0], self)
+
+    def subscribe(self, client):
+        with self.lock:
+            for race_key in sorted(self.latest):
+                client.queue(race_key, self.latest[race_key], replay=True)
+            self.clients.add(client)
+
+    def unsubscribe(self, client):
+        with self.lock:
+            self.clients.discard(client)
+
+    # Private methods
+    def __close_all(self):
+        for dispatcher in self.socket_map.values():
+            dispatcher.close()
+
+
+class _SSEClient(asyncore.dispatcher):
+
+    def __init__(self, sock, server):
+        asyncore.dispatcher.__init__(self, sock, map=server.socket_map)
+        self.server = server
+        self.request = ''
+        self.races = None
+        self.outbuf = ''
+        self.pending = OrderedDict()
+        # Races whose pending event is from the replay on subscribe
+        self.replayed = set()
+        # Undelivered events replaced by newer ones since the queue last emptied
+        self.superseded = 0
+        self.overflowed = False
+        self.close_when_done = False
+
+    def queue(self, race_key, message, replay=False):
+        """Queue an event, replacing any undelivered event for the same race.
+
+        Called with the server lock held.
+
+        """
+        if self.races is not None and race_key not in self.races:
+            return
+        if race_key in self.pending and race_key not in self.replayed:
+            self.superseded += 1
+            if self.superseded > self.server.max_pending:
+                # Too far behind; let the event loop thread hang up on this client
+                self.overflowed = True
+                return
+        self.pending[race_key] = message
+        if replay:
+            self.replayed.add(race_key)
+        else:
+            self.replayed.discard(race_key)
+
+    def handle_read(self):
+        data = self.recv(4096)
+        if self.outbuf or self in self.server.clients:
+            # Ignore anything sent after the request
+            return
+        self.request += data
+        if '\r\n\r\n' not in self.request and '\n\n' not in self.request:
+            if len(self.request) > 8192:
+                self.close()
+            return
+        request_line = self.request.split('\n', 1)[0].split()
+        if len(request_line) < 2 or request_line[0] != 'GET':
+            self.outbuf = "HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n"
+            self.close_when_done = True
+            return
+        params = parse_qs(urlparse(request_line[1]).query)
+        if 'races' in params:
+            self.races = set(key for value in params['races'] for key in value.split(','))
+        self.outbuf = RESPONSE_HEADERS
+        self.server.subscribe(self)
+
+    def writable(self):
+        return bool(self.outbuf or self.pending or self.overflowed)
+
+    def handle_write(self):
+        if self.overflowed:
+            self.handle_close()
+            return
+        if not self.outbuf:
+            with self.server.lock:
+                race_key, self.outbuf = self.pending.popitem(last=False)
+                self.replayed.discard(race_key)
+                if not self.pending:
+                    self.superseded = 0
+        sent = self.send(self.outbuf)
+        self.outbuf = self.outbuf[sent:]
+        if self.close_when_done and not self.outbuf:
+            self.handle_close()
+
+    def handle_close(self):
+        self.server.unsubscribe(self)
+        self.close()
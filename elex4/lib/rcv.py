@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+"""
+Ranked-choice (instant runoff) tabulation.
+
+Race.assign_winner only handles plurality contests. The classes here
+tabulate ranked-choice races from ballot-level files, where every row is a
+single voter's rankings.
+
+Ballots are integer-encoded: each candidate name is mapped to a small int,
+and identical rankings are collapsed into a single ballot "group" with a
+count. Each group remembers which of its choices it currently counts for,
+and each candidate keeps a pile of the groups counting for them. When a
+candidate is eliminated, only the groups in that candidate's pile are
+re-examined, so a round costs time proportional to the eliminated pile
+rather than to the whole ballot file.
+
+"""
+import csv
+from array import array
+
+from elex4.lib.parser import make_race_key
+
+
+def parse_ballots(path):
+    """Parse a ballot-level CSV of ranked-choice votes.
+
+    Expects date, office and district columns, plus one column per
+    ranking (rank_1, rank_2, ...) holding the raw candidate name.
+    Blank rankings are skipped.
+
+    RETURNS:
+
+        A dictionary containing race key and RankedChoiceRace instances as values.
+
+    """
+    reader = csv.DictReader(open(path, 'rb'))
+    rank_cols = sorted(
+        [col for col in reader.fieldnames if col.startswith('rank_')],
+        key=lambda col: int(col.split('_')[1])
+    )
+
+    results = {}
+
+    for row in reader:
+        race_key = make_race_key(row['office'], row['district'])
+
+        try:
+            race = results[race_key]
+        except KeyError:
+            race = RankedChoiceRace(row['date'], row['office'], row['district'])
+            results[race_key] = race
+
+        race.add_ballot([row[col] for col in rank_cols])
+
+    return results
+
+
+class RankedChoiceRace(object):
+
+    def __init__(self, date, office, district):
+        self.date = date
+        self.office = office
+        self.district = district
+        self.total_ballots = 0
+        # Raw candidate names, indexed by their integer id
+        self.candidates = []
+        self.rounds = []
+        self.winner = None
+        self.__candidate_ids = {}
+        self.__ballot_groups = {}
+
+    def add_ballot(self, rankings):
+        """Add a single voter's rankings, most preferred first"""
+        ballot = []
+        for raw_name in rankings:
+            raw_name = raw_name.strip()
+            if not raw_name:
+                continue
+            cand_id = self.__get_or_create_candidate_id(raw_name)
+            # Only the first ranking of a candidate counts
+            if cand_id not in ballot:
+                ballot.append(cand_id)
+        self.total_ballots += 1
+        ballot = tuple(ballot)
+        self.__ballot_groups[ballot] = self.__ballot_groups.get(ballot, 0) + 1
+
+    def tabulate(self):
+        """Run instant-runoff rounds until one candidate has a majority.
+
+        Ties for last place are broken by eliminating the candidate with
+        fewer votes in the previous round, then by the order the candidate
+        first appeared on a ballot.
+
+        RETURNS:
+
+            List of round dictionaries with tallies keyed by raw candidate name,
+            the eliminated candidate (if any) and the number of exhausted ballots.
+
+        """
+        rankings = self.__ballot_groups.keys()
+        counts = array('l', [self.__ballot_groups[ballot] for ballot in rankings])
+        # Index into each group's rankings of the choice it currently counts for
+        positions = array('l', [0] * len(rankings))
+
+        num_cands = len(self.candidates)
+        tallies = [0] * num_cands
+        piles = [[] for i in range(num_cands)]
+        continuing = set(range(num_cands))
+        exhausted = 0
+
+        for group, ballot in enumerate(rankings):
+            if ballot:
+                tallies[ballot[0]] += counts[group]
+                piles[ballot[0]].append(group)
+            else:
+                exhausted += counts[group]
+
+        self.rounds = []
+        self.winner = None
+        previous = tallies[:]
+
+        while continuing:
+            active_votes = sum(tallies[cand_id] for cand_id in continuing)
+            leader = max(continuing, key=lambda cand_id: (tallies[cand_id], -cand_id))
+            this_round = {
+                'round': len(self.rounds) + 1,
+                'tallies': dict((self.candidates[cand_id], tallies[cand_id]) for cand_id in continuing),
+                'exhausted': exhausted,
+                'eliminated': None,
+            }
+            self.rounds.append(this_round)
+
+            if tallies[leader] * 2 > active_votes or len(continuing) == 1:
+                self.winner = self.candidates[leader]
+                break
+
+            loser = min(continuing, key=lambda cand_id: (tallies[cand_id], previous[cand_id], -cand_id))
+            this_round['eliminated'] = self.candidates[loser]
+            continuing.remove(loser)
+            previous = tallies[:]
+
+            # Redistribute only the groups counting for the eliminated candidate
+            for group in piles[loser]:
+                ballot = rankings[group]
+                pos = positions[group] + 1
+                while pos < len(ballot) and ballot[pos] not in continuing:
+                    pos += 1
+                positions[group] = pos
+                if pos < len(ballot):
+                    tallies[ballot[pos]] += counts[group]
+                    piles[ballot[pos]].append(group)
+                else:
+                    exhausted += counts[group]
+            tallies[loser] = 0
+            piles[loser] = []
+
+        return self.rounds
+
+    # Private methods
+    def __get_or_create_candidate_id(self, raw_name):
+        try:
+            cand_id = self.__candidate_ids[raw_name]
+        except KeyError:
+            cand_id = len(self.candidates)
+            self.candidates.append(raw_name)
+            self.__candidate_ids[raw_name] = cand_id
+        return cand_id
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""
+Re-aggregation of county results into custom geographies.
+
+Reporters want results for media markets, split congressional districts
+and regions, not just counties. A crosswalk file maps each county (or
+precinct) to one or more regions, optionally with an allocation weight
+for units split between regions:
+
+    county,region,weight
+    Some County,North,1
+    Another County,North,0.25
+    Another County,South,0.75
+
+The crosswalk is compiled once into a sparse mapping matrix: for every
+county, the list of (region, weight) pairs it contributes to. Applying it
+to a race multiplies every candidate's county vote vector by that matrix
+in a single pass. The regional totals are fed back through the regular
+Race model, so winners and summaries work exactly as they do for
+statewide results.
+
+Weighted votes are rounded to whole votes per candidate and region. A
+race appears in every region one of its counties maps to, with all of its
+candidates, even those with no votes there.
+
+"""
+from collections import defaultdict
+import csv
+
+from elex4.lib.models import Race
+
+
+def load_crosswalk(path):
+    """Read a county/region crosswalk CSV into a Crosswalk"""
+    reader = csv.DictReader(open(path, 'rb'))
+    return Crosswalk((row['county'], row['region'], float(row.get('weight') or 1)) for row in reader)
+
+
+class Crosswalk(object):
+
+    def __init__(self, mappings):
+        """mappings is an iterable of (county, region, weight) tuples"""
+        self.regions = []
+        self.unmapped = set()
+        region_index = {}
+        # Sparse matrix rows: county -> [(region index, weight), ...]
+        self.__matrix = defaultdict(list)
+        for county, region, weight in mappings:
+            if region not in region_index:
+                region_index[region] = len(self.regions)
+                self.regions.append(region)
+            self.__matrix[county].append((region_index[region], weight))
+        self.__matrix = dict(self.__matrix)
+
+    def apply(self, race):
+        """Multiply every candidate's county votes by the mapping matrix.
+
+        RETURNS:
+
+            Dictionary of candidate key -> list of vote totals, one per region.
+
+        """
+        num_regions = len(self.regions)
+        matrix = self.__matrix
+        totals = {}
+        for cand_key, cand in race.candidates.items():
+            row = [0.0] * num_regions
+            for county, votes in cand.county_results.items():
+                try:
+                    mapping = matrix[county]
+                except KeyError:
+                    self.unmapped.add(county)
+                    continue
+                for region, weight in mapping:
+                    row[region] += votes * weight
+            totals[cand_key] = row
+        return totals
+
+    def regions_for(self, race):
+        """RETURNS: Set of indexes of regions that any of race's counties map to"""
+        regions = set()
+        for cand in race.candidates.values():
+            for county in cand.county_results:
+                for region, weight in self.__matrix.get(county, []):
+                    regions.add(region)
+        return regions
+
+
+def reaggregate(results, crosswalk):
+    """Re-aggregate every race into the crosswalk's regions.
+
+    RETURNS:
+
+        Dictionary of region -> dictionary of race key -> Race, containing
+        only races with counties mapped to that region.
+
+    """
+    by_region = defaultdict(dict)
+    for race_key, race in results.items():
+        totals = crosswalk.apply(race)
+        for region_index in sorted(crosswalk.regions_for(race)):
+            region = crosswalk.regions[region_index]
+            regional = Race(race.date, race.office, race.district)
+            for (party, raw_name), row in sorted(totals.items()):
+                votes = int(round(row[region_index]))
+                regional.add_result({'party': party, 'candidate': raw_name, 'county': region, 'votes': votes})
+            by_region[region][race_key] = regional
+    return dict(by_region)
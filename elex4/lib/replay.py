@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+"""
+Election-night replay for measuring end-to-end latency.
+
+A ReplayServer serves recorded feed snapshots from a local HTTP server,
+switching to each snapshot when its time comes on an accelerated timeline.
+ReplayHarness then polls it like the real feed, running download, parse,
+summarize and write on every poll. For each snapshot, it records how long
+after the feed changed the new results were published.
+
+Snapshots are files named by their offset in seconds from the start of the
+night, optionally followed by an underscore and a label:
+
+    snapshots/
+        0000_polls_close.csv
+        0300.csv
+        0600.csv
+
+With speedup=60, a snapshot at offset 600 goes live 10 seconds into the replay.
+
+"""
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from os.path import join
+from threading import Thread
+import math
+import os
+import re
+import time
+
+from elex4.lib.parser import parse_and_clean
+from elex4.lib.scraper import fetch_results
+from elex4.lib.summary import summarize, write_summary
+
+_OFFSET = re.compile(r'^(\d+)')
+
+
+def load_snapshots(directory):
+    """RETURNS: List of (offset in seconds, path) for snapshot files, in order"""
+    snapshots = []
+    for name in os.listdir(directory):
+        match = _OFFSET.match(name)
+        if match:
+            snapshots.append((int(match.group(1)), join(directory, name)))
+    return sorted(snapshots)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = int(math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[max(rank, 1) - 1]
+
+
+class _SnapshotHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        index, path = self.server.current()
+        with open(path, 'rb') as fh:
+            body = fh.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Snapshot', str(index))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ReplayServer(HTTPServer):
+    """Local stand-in for the results feed, replaying snapshots on a fast clock"""
+
+    def __init__(self, snapshots, speedup=60.0, address=('127.0.0.1', 0)):
+        HTTPServer.__init__(self, address, _SnapshotHandler)
+        self.snapshots = snapshots
+        self.speedup = float(speedup)
+        self.started = None
+        self.__thread = None
+
+    @property
+    def url(self):
+        return 'http://%s:%s/results.csv' % self.server_address
+
+    def start(self):
+        self.started = time.time()
+        self.__thread = Thread(target=self.serve_forever, args=(0.01,))
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def live_at(self, index):
+        """Wall-clock time snapshot number index went live"""
+        return self.started + self.snapshots[index][0] / self.speedup
+
+    def current(self):
+        """RETURNS: (index, path) of the snapshot live right now"""
+        elapsed = (time.time() - self.started) * self.speedup
+        index = 0
+        for i, (offset, path) in enumerate(self.snapshots):
+            if offset <= elapsed:
+                index = i
+        return index, self.snapshots[index][1]
+
+
+class ReplayHarness(object):
+
+    def __init__(self, server, work_dir, poll_interval=30):
+        """
+        poll_interval is in timeline seconds, so it's compressed by the
+        server's speedup along with the snapshots.
+
+        """
+        self.server = server
+        self.work_dir = work_dir
+        self.poll_interval = poll_interval
+        self.polls = []
+        # Snapshot index -> seconds from going live to published output
+        self.latencies = {}
+
+    def run(self):
+        """Poll until the last snapshot has been published.
+
+        RETURNS:
+
+            The report from report().
+
+        """
+        raw_path = join(self.work_dir, 'replay_results.csv')
+        out_path = join(self.work_dir, 'summary_results.csv')
+        wait = self.poll_interval / self.server.speedup
+        last_index = len(self.server.snapshots) - 1
+        while last_index not in self.latencies:
+            timings = {}
+            start = time.time()
+            status, headers = fetch_results(raw_path, self.server.url)
+            index = int(headers['x-snapshot'])
+            timings['download'] = time.time() - start
+            results = self.__timed(timings, 'parse', parse_and_clean, raw_path)
+            summary = self.__timed(timings, 'summarize', summarize, results)
+            self.__timed(timings, 'write', write_summary, summary, out_path)
+            published = time.time()
+            timings['total'] = published - start
+            self.polls.append({'snapshot': index, 'timings': timings})
+            # Only the first poll to publish a snapshot counts toward latency
+            if index not in self.latencies:
+                self.latencies[index] = published - self.server.live_at(index)
+            time.sleep(max(0, wait - (time.time() - start)))
+        return self.report()
+
+    def report(self):
+        """Latency percentiles, plus per-stage timings averaged over polls"""
+        latencies = self.latencies.values()
+        report = {
+            'polls': len(self.polls),
+            'snapshots_published': len(self.latencies),
+            'snapshots_missed': len(self.server.snapshots) - len(self.latencies),
+            'latency': dict(('p%s' % pct, percentile(latencies, pct)) for pct in (50, 90, 99)),
+            'stages': {},
+        }
+        report['latency']['max'] = max(latencies) if latencies else None
+        for stage in ('download', 'parse', 'summarize', 'write', 'total'):
+            values = [poll['timings'][stage] for poll in self.polls]
+            report['stages'][stage] = sum(values) / len(values) if values else None
+        return report
+
+    # Private methods
+    def __timed(self, timings, stage, func, *args):
+        start = time.time()
+        value = func(*args)
+        timings[stage] = time.time() - start
+        return value
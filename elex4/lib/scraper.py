@@ -1,5 +1,9 @@
 #!/usr/bin/env python
 from urllib import urlretrieve
+from urllib2 import HTTPError, Request, urlopen
+import os
+
+RESULTS_URL = "https://docs.google.com/spreadsheet/pub?key=0AhhC0IWaObRqdGFkUW1kUmp2ZlZjUjdTYV9lNFJ5RHc&output=csv"
 
 
 def download_results(path):
@@ -15,5 +19,67 @@ def download_results(path):
     send an email alert that the site is non-responsive.
 
     """
-    url = "https://docs.google.com/spreadsheet/pub?key=0AhhC0IWaObRqdGFkUW1kUmp2ZlZjUjdTYV9lNFJ5RHc&output=csv"
-    urlretrieve(url, path)
+    urlretrieve(RESULTS_URL, path)
+
+
+def fetch_results(path, url=RESULTS_URL, etag=None, last_modified=None, timeout=30):
+    """Download results only if they changed since the last fetch
+
+    Sends the ETag and Last-Modified values from the previous response, so
+    an unchanged feed costs the server a 304 instead of the whole file. The
+    file is written under a temporary name and renamed into place, so
+    readers never see a partial download.
+
+    RETURNS:
+
+        (status, headers) where headers is a dictionary with lowercase keys.
+        path is only written when status is 200. Error statuses such as 429
+        and 503 are returned rather than raised, so callers can honor
+        Retry-After.
+
+    """
+    request = Request(url)
+    if etag:
+        request.add_header('If-None-Match', etag)
+    if last_modified:
+        request.add_header('If-Modified-Since', last_modified)
+    try:
+        response = urlopen(request, timeout=timeout)
+    except HTTPError, exc:
+        return exc.code, dict(exc.info().items())
+    try:
+        tmp_path = path + '.part'
+        with open(tmp_path, 'wb') as fh:
+            for chunk in iter(lambda: response.read(64 * 1024), ''):
+                fh.write(chunk)
+        os.rename(tmp_path, path)
+        return response.getcode(), dict(response.info().items())
+    finally:
+        response.close()
+
+
+def stream_results(url=RESULTS_URL, chunk_size=64 * 1024):
+    """Download results in chunks, yielding lines as soon as they arrive
+
+    Unlike download_results, nothing is written to disk, so a parser can
+    start on the first rows while the rest of the file is still downloading.
+
+    """
+    response = urlopen(url)
+    try:
+        for line in iter_lines(iter(lambda: response.read(chunk_size), '')):
+            yield line
+    finally:
+        response.close()
+
+
+def iter_lines(chunks):
+    """Re-assemble arbitrary chunks of text into complete lines"""
+    leftover = ''
+    for chunk in chunks:
+        lines = (leftover + chunk).split('\n')
+        leftover = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    if leftover:
+        yield leftover
@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+"""
+Shadow runs of an alternate parse/summarize engine next to the primary one.
+
+Before a faster engine replaces the one we publish from, we want proof it
+produces the same output on real feeds. ShadowRunner runs a candidate
+engine on a sampled fraction of polls, in a separate worker process, so a
+crash or slowdown in the candidate can't delay or break publication. The
+candidate's summary is compared race by race with the primary's. Every
+shadow run, with both engines' latency and any divergence, is appended as
+a JSON line to a log.
+
+Engines are named in ENGINES as a pair of "module:function" paths for
+parsing and summarizing. elex1 is a top-level script with no functions to
+call, so it can't be run as an engine.
+
+The worker only runs one shadow at a time. A sampled poll that arrives
+while the previous shadow is still running is skipped and counted, rather
+than queued, so a slow candidate can't build up a backlog. A shadow that
+fails outside the engine, or whose worker dies, is logged with its error
+and the worker is replaced, so shadowing carries on with the next poll.
+
+"""
+from multiprocessing import Pool
+import importlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ENGINES = {
+    'elex2': ('elex2.election_results:parse_and_clean', 'elex2.election_results:summarize'),
+    'elex3': ('elex3.lib.parser:parse_and_clean', 'elex3.lib.summary:summarize'),
+    'elex4': ('elex4.lib.parser:parse_and_clean', 'elex4.lib.summary:summarize'),
+}
+
+
+def load_function(path):
+    module_name, func_name = path.split(':')
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def run_engine(engine, path):
+    """Parse and summarize path with a named engine.
+
+    RETURNS:
+
+        (normalized summary, seconds taken)
+
+    """
+    parse, summarize = [load_function(func) for func in ENGINES[engine]]
+    start = time.time()
+    summary = summarize(parse(path))
+    return normalize(summary), time.time() - start
+
+
+def _run_shadow(engine, path):
+    # Runs in the worker process, on a private copy of the input
+    try:
+        summary, elapsed = run_engine(engine, path)
+        return summary, elapsed, None
+    except Exception, exc:
+        return None, None, '%s: %s' % (exc.__class__.__name__, exc)
+    finally:
+        os.remove(path)
+
+
+def normalize(summary):
+    """Reduce a summary from any engine to comparable plain values.
+
+    Candidates are keyed by (party, last name, first name), since engines
+    differ in candidate order and in which extra attributes they keep.
+
+    """
+    normalized = {}
+    for race_key, race in summary.items():
+        normalized[race_key] = {
+            'all_votes': race['all_votes'],
+            'date': race['date'],
+            'office': race['office'],
+            'district': race['district'],
+            'candidates': dict(
+                ((cand['party'], cand['last_name'], cand['first_name']), (cand['votes'], cand['winner']))
+                for cand in race['candidates']
+            ),
+        }
+    return normalized
+
+
+def compare_summaries(primary, candidate):
+    """Race-by-race differences between two normalized summaries.
+
+    RETURNS:
+
+        List of dictionaries with race, field, primary and candidate values,
+        sorted by race.
+
+    """
+    differences = []
+    for race_key in sorted(set(primary) | set(candidate)):
+        if race_key not in candidate or race_key not in primary:
+            differences.append({
+                'race': race_key,
+                'field': 'race',
+                'primary': race_key in primary,
+                'candidate': race_key in candidate,
+            })
+            continue
+        ours, theirs = primary[race_key], candidate[race_key]
+        for field in ('all_votes', 'date', 'office', 'district'):
+            if ours[field] != theirs[field]:
+                differences.append({'race': race_key, 'field': field, 'primary': ours[field], 'candidate': theirs[field]})
+        cands = set(ours['candidates']) | set(theirs['candidates'])
+        for cand in sorted(cands):
+            if ours['candidates'].get(cand) != theirs['candidates'].get(cand):
+                differences.append({
+                    'race': race_key,
+                    'field': 'candidate %s, %s (%s)' % (cand[1], cand[2], cand[0]),
+                    'primary': ours['candidates'].get(cand),
+                    'candidate': theirs['candidates'].get(cand),
+                })
+    return differences
+
+
+class ShadowRunner(object):
+
+    def __init__(self, candidate, log_path, primary='elex4', sample_rate=0.1, rng=None, timeout=600):
+        """
+        timeout: seconds a shadow run can go without a result before it's
+        logged as lost and the worker process is replaced.
+
+        """
+        self.candidate = candidate
+        self.primary = primary
+        self.log_path = log_path
+        self.sample_rate = sample_rate
+        self.rng = rng or random.Random()
+        self.timeout = timeout
+        self.submitted = 0
+        self.skipped_busy = 0
+        self.__busy = threading.Event()
+        # [AsyncResult, start time, log record] for the shadow in flight
+        self.__running = None
+        self.__lock = threading.Lock()
+        self.__tmp_dir = tempfile.mkdtemp(prefix='elex4_shadow_')
+        self.__pool = Pool(1)
+
+    def run(self, path):
+        """Parse and summarize path with the primary engine, shadowing a sample of calls.
+
+        RETURNS:
+
+            The primary engine's summary, to publish.
+
+        """
+        parse, summarize = [load_function(func) for func in ENGINES[self.primary]]
+        start = time.time()
+        summary = summarize(parse(path))
+        self.submit(path, summary, time.time() - start)
+        return summary
+
+    def submit(self, path, primary_summary, primary_seconds):
+        """Maybe shadow a poll the primary engine already handled.
+
+        RETURNS:
+
+            True if the candidate engine was started on path.
+
+        """
+        if self.rng.random() >= self.sample_rate:
+            return False
+        self.__check_running()
+        if self.__busy.is_set():
+            self.skipped_busy += 1
+            return False
+        # The next poll may overwrite path, so the worker gets its own copy
+        fd, copy_path = tempfile.mkstemp(dir=self.__tmp_dir)
+        os.close(fd)
+        shutil.copyfile(path, copy_path)
+        primary = normalize(primary_summary)
+        record = {
+            'path': path,
+            'primary': self.primary,
+            'candidate': self.candidate,
+            'primary_seconds': primary_seconds,
+            'candidate_seconds': None,
+            'error': None,
+            'races': len(primary),
+            'differences': [],
+        }
+
+        def compare(outcome):
+            # Runs in the pool's result thread, which dies if this raises
+            try:
+                summary, elapsed, error = outcome
+                differences = compare_summaries(primary, summary) if error is None else []
+                self.__finish(run, dict(record, candidate_seconds=elapsed, error=error, differences=differences))
+            except Exception, exc:
+                print >> sys.stderr, "Shadow run of %s not logged: %s: %s" % (path, exc.__class__.__name__, exc)
+                self.__finish(run, None)
+
+        self.__busy.set()
+        self.submitted += 1
+        with self.__lock:
+            run = self.__running = [None, time.time(), record]
+            run[0] = self.__pool.apply_async(_run_shadow, (self.candidate, copy_path), callback=compare)
+        return True
+
+    def wait(self, timeout=None):
+        """Block until the running shadow, if any, has been logged or given up as lost"""
+        deadline = None if timeout is None else time.time() + timeout
+        while self.__busy.is_set():
+            self.__check_running()
+            if deadline is not None and time.time() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self):
+        self.__pool.close()
+        self.__pool.join()
+        shutil.rmtree(self.__tmp_dir, ignore_errors=True)
+
+    # Private methods
+    def __check_running(self):
+        # Python 2's apply_async has no error callback, and a task whose
+        # worker process dies never completes, so look in on it here.
+        with self.__lock:
+            run = self.__running
+        if run is None:
+            return
+        result, started, record = run
+        if result is None:
+            return
+        if result.ready():
+            # A successful result has already been through compare()
+            if not result.successful():
+                try:
+                    result.get(0)
+                except Exception, exc:
+                    self.__finish(run, dict(record, error='%s: %s' % (exc.__class__.__name__, exc)))
+        elif self.timeout is not None and time.time() - started > self.timeout:
+            # The task can't be cancelled, so replace the worker it's stuck in.
+            # Not under the lock: terminating waits on the result thread.
+            pool, self.__pool = self.__pool, Pool(1)
+            pool.terminate()
+            self.__finish(run, dict(record, error='Lost: no result after %s seconds' % self.timeout))
+
+    def __finish(self, run, record):
+        # Log a shadow run once, whether it ended in compare() or was given up on
+        with self.__lock:
+            if self.__running is not run:
+                return
+            self.__running = None
+            try:
+                if record is not None:
+                    self.__log(dict(record, time=time.time()))
+            finally:
+                self.__busy.clear()
+
+    def __log(self, record):
+        # Called with the lock held
+        with open(self.log_path, 'ab') as fh:
+            fh.write(json.dumps(record, default=repr) + '\n')
+
+
+def load_log(path):
+    """RETURNS: List of shadow run records from a log"""
+    with open(path, 'rb') as fh:
+        return [json.loads(line) for line in fh if line.strip()]
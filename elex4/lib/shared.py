@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+"""
+Read-only results shared between processes through a memory-mapped file.
+
+Web workers that each load summary_results.csv hold one copy of the
+results per process. Instead, a publisher lays out race totals, candidate
+votes and county results in a compact binary file (in /dev/shm where
+available), and every reader process maps that same file. The OS shares
+the pages between processes, so memory stays the same however many workers
+there are.
+
+Each poll is published as a new file, which is then renamed over the old
+one. The rename is atomic, so readers always see either the old version or
+the new one, never a half-written mix. Readers call refresh() to pick up a
+new version; until then they keep a consistent view of the old one.
+
+NOTE: multiprocessing.shared_memory is not available on Python 2, so this
+uses mmap on a tmpfs-backed file, which gives the same zero-copy sharing.
+
+File layout, all integers little-endian:
+
+    header     magic, format, version, counts and section offsets
+    races      fixed-size records, sorted by race key for binary search
+    candidates fixed-size records, grouped by race
+    counties   fixed-size records, grouped by candidate
+    strings    UTF-8 text referenced by (offset, length) pairs
+
+"""
+from os.path import exists, join
+import mmap
+import os
+import struct
+import tempfile
+
+from elex4.lib.models import Candidate, Race
+
+MAGIC = 'ELX4'
+FORMAT = 1
+
+HEADER = struct.Struct('<4sHHQIIIIIII')
+# key, date, office and district strings; total votes; first candidate and candidate count
+RACE = struct.Struct('<IIIIIIIIqII')
+# party and raw name strings; votes; first county and county count
+CANDIDATE = struct.Struct('<IIIIqII')
+# county name string; votes
+COUNTY = struct.Struct('<IIq')
+
+if exists('/dev/shm'):
+    DEFAULT_PATH = '/dev/shm/elex4_results'
+else:
+    DEFAULT_PATH = join(tempfile.gettempdir(), 'elex4_results')
+
+
+def publish(results, version, path=DEFAULT_PATH):
+    """Lay out results (race key -> Race) in a file readers can map.
+
+    The file is written under a temporary name and atomically renamed
+    into place.
+
+    """
+    strings = _StringTable()
+    races, cands, counties = [], [], []
+    for race_key in sorted(results):
+        race = results[race_key]
+        first_cand = len(cands)
+        for (party, raw_name), cand in sorted(race.candidates.items()):
+            first_county = len(counties)
+            for county, votes in sorted(cand.county_results.items()):
+                counties.append(COUNTY.pack(*(strings.add(county) + (votes,))))
+            cands.append(CANDIDATE.pack(*(strings.add(party) + strings.add(raw_name) +
+                                          (cand.votes, first_county, len(counties) - first_county))))
+        races.append(RACE.pack(*(strings.add(race_key) + strings.add(race.date) + strings.add(race.office) +
+                                 strings.add(race.district) + (race.total_votes, first_cand, len(cands) - first_cand))))
+
+    races_offset = HEADER.size
+    cands_offset = races_offset + RACE.size * len(races)
+    counties_offset = cands_offset + CANDIDATE.size * len(cands)
+    strings_offset = counties_offset + COUNTY.size * len(counties)
+    header = HEADER.pack(MAGIC, FORMAT, 0, version, len(races), len(cands), len(counties),
+                         races_offset, cands_offset, counties_offset, strings_offset)
+
+    tmp_path = '%s.%s.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as fh:
+        fh.write(header)
+        fh.write(''.join(races))
+        fh.write(''.join(cands))
+        fh.write(''.join(counties))
+        fh.write(strings.getvalue())
+    os.rename(tmp_path, path)
+
+
+class _StringTable(object):
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+        self.offsets = {}
+
+    def add(self, value):
+        """RETURNS: (offset, length) of value, storing each distinct string once"""
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        try:
+            return self.offsets[value]
+        except KeyError:
+            location = self.offsets[value] = (self.size, len(value))
+            self.chunks.append(value)
+            self.size += len(value)
+            return location
+
+    def getvalue(self):
+        return ''.join(self.chunks)
+
+
+class SharedResults(object):
+    """Read-only, Race-like view of published results"""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.version = None
+        self.__map = None
+        self.__inode = None
+        self.refresh()
+
+    def refresh(self):
+        """Map the latest published version, if it changed.
+
+        RETURNS:
+
+            True if a new version was mapped.
+
+        """
+        inode = os.stat(self.path).st_ino
+        if inode == self.__inode:
+            return False
+        with open(self.path, 'rb') as fh:
+            new_map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, fmt, reserved, version, self.num_races, self.num_candidates, self.num_counties,
+         self.__races_offset, self.__cands_offset, self.__counties_offset,
+         self.__strings_offset) = HEADER.unpack_from(new_map, 0)
+        if magic != MAGIC or fmt != FORMAT:
+            new_map.close()
+            raise ValueError("%s is not a published results file" % self.path)
+        # Don't close the old map: Races handed out earlier may still read from
+        # it, and it's released once they're garbage collected.
+        self.__map = new_map
+        self.__inode = inode
+        self.version = version
+        return True
+
+    def race_keys(self):
+        return [self.__race_key(index) for index in range(self.num_races)]
+
+    def race(self, race_key):
+        """RETURNS: Race for race_key, reading only that race's records. Raises KeyError if unknown."""
+        # Binary search over race records, which are sorted by key
+        low, high = 0, self.num_races
+        while low < high:
+            mid = (low + high) // 2
+            key = self.__race_key(mid)
+            if key < race_key:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self.num_races and self.__race_key(low) == race_key:
+            return self.__build_race(low)
+        raise KeyError(race_key)
+
+    def results(self):
+        """RETURNS: A dictionary containing race key and Race instances as values."""
+        results = {}
+        for index in range(self.num_races):
+            results[self.__race_key(index)] = self.__build_race(index)
+        return results
+
+    def close(self):
+        if self.__map is not None:
+            self.__map.close()
+            self.__map = None
+            self.__inode = None
+
+    # Private methods
+    def __string(self, offset, length):
+        start = self.__strings_offset + offset
+        return self.__map[start:start + length]
+
+    def __race_key(self, index):
+        offset, length = struct.unpack_from('<II', self.__map, self.__races_offset + index * RACE.size)
+        return self.__string(offset, length)
+
+    def __race_record(self, index):
+        fields = RACE.unpack_from(self.__map, self.__races_offset + index * RACE.size)
+        key, date, office, district = [self.__string(*fields[i:i + 2]) for i in range(0, 8, 2)]
+        return key, date, office, district, fields[8], fields[9], fields[10]
+
+    def __build_race(self, index):
+        key, date, office, district, total_votes, first_cand, num_cands = self.__race_record(index)
+        race = Race(date, office, district)
+        race.total_votes = total_votes
+        for cand_index in range(first_cand, first_cand + num_cands):
+            fields = CANDIDATE.unpack_from(self.__map, self.__cands_offset + cand_index * CANDIDATE.size)
+            party, raw_name = self.__string(*fields[0:2]), self.__string(*fields[2:4])
+            cand = Candidate(raw_name, party)
+            cand.votes = fields[4]
+            cand.county_results = CountyResults(self.__map, self.__counties_offset, self.__strings_offset,
+                                                fields[5], fields[6])
+            race.candidates[(party, raw_name)] = cand
+        return race
+
+
+class CountyResults(object):
+    """Read-only mapping of county -> votes, decoded from the shared file on access"""
+
+    def __init__(self, buf, counties_offset, strings_offset, first, count):
+        self.__buf = buf
+        self.__counties_offset = counties_offset
+        self.__strings_offset = strings_offset
+        self.__first = first
+        self.__count = count
+
+    def __len__(self):
+        return self.__count
+
+    def __iter__(self):
+        for county, votes in self.iteritems():
+            yield county
+
+    def __getitem__(self, county):
+        for name, votes in self.iteritems():
+            if name == county:
+                return votes
+        raise KeyError(county)
+
+    def iteritems(self):
+        for index in range(self.__first, self.__first + self.__count):
+            offset, length, votes = COUNTY.unpack_from(self.__buf, self.__counties_offset + index * COUNTY.size)
+            start = self.__strings_offset + offset
+            yield self.__buf[start:start + length], votes
+
+    def items(self):
+        return list(self.iteritems())
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+"""
+Out-of-core aggregation for results files too big to hold in memory.
+
+parse_and_clean keeps every Race, along with each candidate's
+county_results, in memory at once. For precinct-level national archives
+that doesn't fit. ExternalAggregator instead works within a memory budget:
+
+    1. Cleaned rows are buffered in memory, bucketed by a hash of their
+       race key. If the buffers grow past the budget, every bucket is
+       appended to its own spill file on disk.
+    2. Each partition is then aggregated into Races and summarized on its
+       own, and its Races are thrown away before the next partition.
+
+A race's rows all hash to the same partition, so every partition can be
+summarized on its own. A partition that would still be over the budget is
+re-split with a different hash salt. Files that fit within the budget never
+touch disk.
+
+Memory is estimated from the size of the buffered rows (sys.getsizeof of
+each row and its values), not measured, so memory_budget is approximate.
+
+"""
+import cPickle as pickle
+import os
+import shutil
+import sys
+import tempfile
+import zlib
+
+from elex4.lib.parser import add_row, clean_rows
+from elex4.lib.summary import summarize
+
+# Re-split a partition at most this many times before aggregating it anyway
+MAX_DEPTH = 3
+
+
+def row_size(race_key, row):
+    """Approximate bytes held by a buffered row"""
+    size = sys.getsizeof(row) + sys.getsizeof(race_key)
+    for value in row.itervalues():
+        size += sys.getsizeof(value)
+    return size
+
+
+class ExternalAggregator(object):
+
+    def __init__(self, memory_budget=256 * 1024 * 1024, partitions=16, tmp_dir=None):
+        self.memory_budget = memory_budget
+        self.partitions = partitions
+        self.tmp_dir = tmp_dir
+        # Statistics about the last run
+        self.spills = 0
+        self.peak_bytes = 0
+
+    def summarize(self, rows):
+        """Aggregate (race key, row) pairs and summarize them partition by partition.
+
+        RETURNS:
+
+            Generator of (race key, race summary) pairs, in the format of
+            summary.summarize. Races come out grouped by partition, not sorted.
+
+        """
+        self.spills = 0
+        self.peak_bytes = 0
+        work_dir = tempfile.mkdtemp(prefix='elex4_spill_', dir=self.tmp_dir)
+        try:
+            for item in self.__aggregate(rows, work_dir, 0):
+                yield item
+        finally:
+            shutil.rmtree(work_dir)
+
+    # Private methods
+    def __aggregate(self, rows, work_dir, depth):
+        salt = str(depth)
+        buffers = [[] for i in range(self.partitions)]
+        # Estimated bytes per partition, buffered and spilled
+        sizes = [0] * self.partitions
+        buffered = 0
+        spill_paths = None
+        for race_key, row in rows:
+            index = zlib.crc32(salt + race_key) % self.partitions
+            buffers[index].append((race_key, row))
+            size = row_size(race_key, row)
+            sizes[index] += size
+            buffered += size
+            self.peak_bytes = max(self.peak_bytes, buffered)
+            if buffered > self.memory_budget:
+                if spill_paths is None:
+                    spill_dir = tempfile.mkdtemp(dir=work_dir)
+                    spill_paths = [os.path.join(spill_dir, '%s.spill' % i) for i in range(self.partitions)]
+                self.__spill(buffers, spill_paths)
+                buffered = 0
+
+        if spill_paths is None:
+            # Everything fit: aggregate straight from memory
+            results = {}
+            for bucket in buffers:
+                for race_key, row in bucket:
+                    add_row(results, race_key, row)
+            del buffers
+            for item in summarize(results).iteritems():
+                yield item
+            return
+
+        self.__spill(buffers, spill_paths)
+        del buffers
+        for path, size in zip(spill_paths, sizes):
+            if size > self.memory_budget and depth < MAX_DEPTH:
+                # Too big for one pass; split it again with a different salt
+                items = self.__aggregate(_read_spill(path), work_dir, depth + 1)
+            else:
+                items = self.__summarize_partition(path)
+            for item in items:
+                yield item
+            if os.path.exists(path):
+                os.remove(path)
+
+    def __summarize_partition(self, path):
+        results = {}
+        for race_key, row in _read_spill(path):
+            add_row(results, race_key, row)
+        return summarize(results).iteritems()
+
+    def __spill(self, buffers, spill_paths):
+        self.spills += 1
+        for bucket, path in zip(buffers, spill_paths):
+            if bucket:
+                with open(path, 'ab') as fh:
+                    pickle.dump(bucket, fh, pickle.HIGHEST_PROTOCOL)
+                del bucket[:]
+
+
+def _read_spill(path):
+    """(race key, row) pairs from a spill file, one spilled batch at a time"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb') as fh:
+        while True:
+            try:
+                batch = pickle.load(fh)
+            except EOFError:
+                return
+            for item in batch:
+                yield item
+
+
+def summarize_file(path, memory_budget=256 * 1024 * 1024, partitions=16, tmp_dir=None):
+    """Summarize a results file of any size within an approximate memory budget.
+
+    RETURNS:
+
+        Generator of (race key, race summary) pairs.
+
+    """
+    aggregator = ExternalAggregator(memory_budget, partitions, tmp_dir)
+    rows = ((race_key, row) for row_num, race_key, row in clean_rows(path))
+    return aggregator.summarize(rows)
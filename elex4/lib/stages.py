@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+"""
+Make-style runner for results processing stages.
+
+Each Stage declares the files it reads (inputs) and writes (outputs).
+Stages that read another stage's outputs depend on it, and together they
+form a DAG. On each run, StageRunner:
+
+    * content-hashes each stage's inputs, along with the stage's own code
+      and the source of the modules it declares it depends on
+    * skips the stage if that signature matches the last successful run
+      and its outputs are still on disk, unchanged
+    * runs stages whose dependencies are done in parallel threads
+
+So a change to one writer only re-runs that writer, not the download or
+parsing, and an unchanged download skips everything downstream of it.
+
+"""
+from hashlib import sha1
+from multiprocessing.pool import ThreadPool
+from os.path import exists
+import cPickle as pickle
+import importlib
+import inspect
+import json
+import os
+import sys
+
+BLOCK_SIZE = 1024 * 1024
+
+
+class Stage(object):
+
+    def __init__(self, name, func, inputs=(), outputs=(), always=False, modules=()):
+        """
+        func is called as func(inputs, outputs) with lists of paths.
+        Set always=True for stages whose inputs aren't files, such as a download.
+        modules lists the names of modules func calls into, such as
+        'elex4.lib.parser'. Modules they use from the same top-level package
+        are included automatically.
+
+        """
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.always = always
+        self.modules = list(modules)
+
+    def code_hash(self):
+        """Hash of the stage function's code and its modules' source, so editing either invalidates the cache"""
+        code = self.func.func_code
+        digest = sha1(code.co_code + repr(code.co_consts) + repr(code.co_names))
+        for module in module_closure(self.modules):
+            digest.update(module.__name__)
+            digest.update(file_hash(inspect.getsourcefile(module) or module.__file__))
+        return digest.hexdigest()
+
+
+def module_closure(names):
+    """RETURNS: Named modules plus the modules they use from their own top-level package, sorted by name"""
+    found = {}
+    pending = [importlib.import_module(name) for name in names]
+    while pending:
+        module = pending.pop()
+        if module.__name__ in found:
+            continue
+        found[module.__name__] = module
+        package = module.__name__.split('.')[0]
+        for value in vars(module).values():
+            if inspect.ismodule(value):
+                name = value.__name__
+            elif inspect.isfunction(value) or inspect.isclass(value):
+                name = value.__module__
+            else:
+                continue
+            if name and name.split('.')[0] == package and name in sys.modules:
+                pending.append(sys.modules[name])
+    return [found[name] for name in sorted(found)]
+
+
+def file_hash(path):
+    digest = sha1()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(BLOCK_SIZE), ''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def save_artifact(obj, path):
+    """Pickle an intermediate artifact (e.g. parsed Race objects) for later stages"""
+    with open(path, 'wb') as fh:
+        pickle.dump(obj, fh, pickle.HIGHEST_PROTOCOL)
+
+
+def load_artifact(path):
+    with open(path, 'rb') as fh:
+        return pickle.load(fh)
+
+
+class StageRunner(object):
+
+    def __init__(self, stages, state_path, max_workers=4):
+        self.stages = stages
+        self.state_path = state_path
+        self.max_workers = max_workers
+        self.levels = self.__levels()
+
+    def run(self, force=False):
+        """Run stages whose inputs or code changed, in dependency order.
+
+        RETURNS:
+
+            Dictionary of stage name -> 'ran' or 'skipped'.
+
+        """
+        state = self.__load_state()
+        status = {}
+        pool = ThreadPool(self.max_workers)
+        try:
+            for level in self.levels:
+                # Every stage in a level only depends on earlier levels
+                outcomes = pool.map(lambda stage: self.__run_stage(stage, state, force), level)
+                for stage, (outcome, entry) in zip(level, outcomes):
+                    status[stage.name] = outcome
+                    state[stage.name] = entry
+                self.__save_state(state)
+        finally:
+            pool.close()
+            pool.join()
+        return status
+
+    # Private methods
+    def __run_stage(self, stage, state, force):
+        signature = self.__signature(stage)
+        previous = state.get(stage.name)
+        if not (force or stage.always) and previous is not None and previous['signature'] == signature:
+            if all(exists(path) and file_hash(path) == digest for path, digest in previous['outputs'].items()):
+                return 'skipped', previous
+        stage.func(stage.inputs, stage.outputs)
+        outputs = dict((path, file_hash(path)) for path in stage.outputs)
+        return 'ran', {'signature': signature, 'outputs': outputs}
+
+    def __signature(self, stage):
+        digest = sha1(stage.name)
+        digest.update(stage.code_hash())
+        for path in stage.inputs:
+            digest.update(path)
+            digest.update(file_hash(path))
+        return digest.hexdigest()
+
+    def __levels(self):
+        # Group stages into levels with Kahn's algorithm
+        producers = {}
+        for stage in self.stages:
+            for path in stage.outputs:
+                if path in producers:
+                    raise ValueError("%s is an output of both %s and %s" % (path, producers[path].name, stage.name))
+                producers[path] = stage
+        deps = dict((stage.name, set(producers[path].name for path in stage.inputs if path in producers))
+                    for stage in self.stages)
+        levels = []
+        done = set()
+        remaining = list(self.stages)
+        while remaining:
+            level = [stage for stage in remaining if deps[stage.name] <= done]
+            if not level:
+                raise ValueError("Stages have a dependency cycle: %s" % ", ".join(stage.name for stage in remaining))
+            levels.append(level)
+            done.update(stage.name for stage in level)
+            remaining = [stage for stage in remaining if stage.name not in done]
+        return levels
+
+    def __load_state(self):
+        if not exists(self.state_path):
+            return {}
+        with open(self.state_path, 'rb') as fh:
+            return json.load(fh)
+
+    def __save_state(self, state):
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'wb') as fh:
+            json.dump(state, fh, indent=2, sort_keys=True)
+        os.rename(tmp_path, self.state_path)
@@ -1,6 +1,20 @@
 from collections import defaultdict
+import csv
 from operator import itemgetter
 
+# Limit output to cleanly parsed, standardized values
+FIELDNAMES = [
+    'date',
+    'office',
+    'district',
+    'last_name',
+    'first_name',
+    'party',
+    'all_votes',
+    'votes',
+    'winner',
+]
+
 
 def summarize(results):
     """Triggers winner assignments and formats data for output.
@@ -38,3 +52,37 @@ def summarize(results):
 
     return summary
 
+
+def flatten(race_summary):
+    """Yield one output row per candidate in a summarized race.
+
+    Each row combines racewide values (date, office, all_votes, etc.)
+    with a single candidate's values.
+
+    """
+    racewide = dict((key, val) for key, val in race_summary.items() if key != 'candidates')
+    for cand in race_summary['candidates']:
+        row = racewide.copy()
+        row.update(cand)
+        yield row
+
+
+def summary_writer(fh):
+    """RETURNS: csv.DictWriter for summary rows on an open file, with the header written"""
+    writer = csv.DictWriter(fh, FIELDNAMES, extrasaction='ignore', quoting=csv.QUOTE_MINIMAL)
+    writer.writeheader()
+    return writer
+
+
+def write_summary(summary, path):
+    """Write summarized results to a CSV at path, one row per race/candidate pair.
+
+    summary can be a dictionary or an iterable of (race key, race summary) pairs.
+
+    """
+    with open(path, 'wb') as fh:
+        writer = summary_writer(fh)
+        items = summary.items() if isinstance(summary, dict) else summary
+        for race, results in items:
+            for row in flatten(results):
+                writer.writerow(row)
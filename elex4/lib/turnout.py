@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+County-level turnout from results and a voter registration file.
+
+This is a hash join. The results are the small side: one entry per county,
+indexed in a dictionary. The registration file is the large side, possibly
+millions of rows, and is streamed past that index once. Memory grows with
+the number of counties, not with the number of registration rows.
+
+"""
+from collections import defaultdict
+import csv
+
+
+def county_votes(results):
+    """Build side of the join: votes cast in each race, by county.
+
+    RETURNS:
+
+        Dictionary of county -> race key -> total votes.
+
+    """
+    index = defaultdict(lambda: defaultdict(int))
+    for race_key, race in results.items():
+        for cand in race.candidates.values():
+            for county, votes in cand.county_results.items():
+                index[county][race_key] += votes
+    return index
+
+
+def count_registered(rows, counties, count_column=None):
+    """Probe side of the join: stream registration rows, tallying matching counties.
+
+    rows can be one row per voter (leave count_column as None) or
+    pre-aggregated rows with a count in count_column. Rows for counties
+    without results are counted as unmatched rather than stored. Pass None
+    as counties to count every county in rows.
+
+    RETURNS:
+
+        Tuple of (county -> registered voters, number of unmatched rows).
+
+    """
+    registered = dict.fromkeys(counties or (), 0)
+    unmatched = 0
+    for row in rows:
+        county = row['county']
+        if county not in registered:
+            if counties is not None:
+                unmatched += 1
+                continue
+            registered[county] = 0
+        if count_column is None:
+            registered[county] += 1
+        else:
+            registered[county] += int(row[count_column])
+    return registered, unmatched
+
+
+def join_turnout(results, registration_path, count_column=None):
+    """Turnout for every race in every county, in a single pass over registration_path.
+
+    RETURNS:
+
+        List of dicts with date, office, district, county, votes,
+        registered and turnout (percent, or '' if registration is unknown),
+        sorted by race and county.
+
+    """
+    index = county_votes(results)
+    reader = csv.DictReader(open(registration_path, 'rb'))
+    registered, unmatched = count_registered(reader, index, count_column)
+
+    rows = []
+    for county in sorted(index):
+        for race_key, votes in sorted(index[county].items()):
+            race = results[race_key]
+            voters = registered[county]
+            rows.append({
+                'date': race.date,
+                'office': race.office,
+                'district': race.district,
+                'county': county,
+                'votes': votes,
+                'registered': voters,
+                'turnout': round(100.0 * votes / voters, 2) if voters else '',
+            })
+    rows.sort(key=lambda row: (row['office'], row['district'], row['county']))
+    return rows
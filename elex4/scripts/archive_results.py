@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""
+This script downloads the latest results and appends them to the poll
+archive, which keeps every poll's county totals as compact deltas. It can
+also print a race's vote totals over time from the archive.
+
+USAGE:
+
+    # Archive the current poll (run once per poll)
+    python archive_results.py
+
+    # Print each candidate's votes at every archived poll for a race
+    python archive_results.py --series=President
+
+
+OUTPUT:
+
+    results.archive in the elex4/ directory, or CSV of the race's totals
+    over time on stdout with --series.
+
+
+"""
+from os.path import dirname, join
+import csv
+import sys
+import time
+
+from elex4.lib.archive import ArchiveReader, ArchiveWriter
+from elex4.lib.parser import parse_and_clean
+from elex4.lib.scraper import download_results
+
+ARCHIVE = join(dirname(dirname(__file__)), 'results.archive')
+
+
+def main():
+    fname = 'fake_va_elec_results.csv'
+    path = join(dirname(dirname(__file__)), fname)
+    download_results(path)
+    writer = ArchiveWriter(ARCHIVE)
+    writer.append(parse_and_clean(path), time.time())
+    print "Archived poll %s" % (writer.polls - 1)
+
+
+def print_series(race_key):
+    series = ArchiveReader(ARCHIVE).race_series(race_key)
+    cands = sorted(set(cand for timestamp, totals in series for cand in totals))
+    writer = csv.writer(sys.stdout)
+    writer.writerow(['timestamp'] + ['%s (%s)' % (name, party) for party, name in cands])
+    for timestamp, totals in series:
+        writer.writerow([timestamp] + [totals.get(cand, 0) for cand in cands])
+
+
+
+if __name__ == '__main__':
+    races = [arg.split('=', 1)[1] for arg in sys.argv[1:] if arg.startswith('--series=')]
+    if races:
+        print_series(races[0])
+    else:
+        main()
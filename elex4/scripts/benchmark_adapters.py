@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""
+Benchmark parse_and_clean with each input adapter.
+
+Writes the same synthetic precinct-level results as CSV, XML and JSON, then
+parses each file in its own child process, reporting rows per second and
+peak memory.
+
+USAGE:
+
+    python benchmark_adapters.py [num_races] [cands_per_race] [precincts]
+
+
+"""
+from multiprocessing import Process, Queue
+import csv
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from elex4.lib.parser import parse_and_clean
+
+FIELDS = ['date', 'office', 'district', 'county', 'candidate', 'party', 'votes']
+
+
+def fake_rows(num_races, cands_per_race, precincts):
+    for race in range(num_races):
+        for cand in range(cands_per_race):
+            for precinct in range(precincts):
+                yield {
+                    'date': '2012-11-06',
+                    'office': 'State House',
+                    'district': str(race),
+                    'county': 'Precinct %s' % precinct,
+                    'candidate': 'Candidate%s, Pat' % cand,
+                    'party': 'P%s' % cand,
+                    'votes': precinct % 100,
+                }
+
+
+def write_csv(rows, fh):
+    writer = csv.DictWriter(fh, FIELDS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+
+
+def write_xml(rows, fh):
+    # Rows arrive grouped by race, then candidate
+    fh.write('<?xml version="1.0" encoding="utf-8"?>\n<results date="2012-11-06">\n')
+    race = cand = None
+    for row in rows:
+        if row['district'] != race:
+            if cand is not None:
+                fh.write('</candidate></race>\n')
+            race, cand = row['district'], None
+            fh.write('<race office="%(office)s" district="%(district)s">\n' % row)
+        if row['candidate'] != cand:
+            if cand is not None:
+                fh.write('</candidate>\n')
+            cand = row['candidate']
+            fh.write('<candidate name="%(candidate)s" party="%(party)s">\n' % row)
+        fh.write('<county name="%(county)s" votes="%(votes)s"/>\n' % row)
+    fh.write('</candidate></race>\n</results>\n')
+
+
+def write_json(rows, fh):
+    fh.write('[\n')
+    for i, row in enumerate(rows):
+        if i:
+            fh.write(',\n')
+        fh.write(json.dumps(row))
+    fh.write('\n]\n')
+
+
+def run(path, queue):
+    start = time.time()
+    results = parse_and_clean(path)
+    elapsed = time.time() - start
+    queue.put((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def main(num_races=200, cands_per_race=4, precincts=500):
+    num_rows = num_races * cands_per_race * precincts
+    print "%s rows" % num_rows
+    print "%-6s %12s %10s %12s %12s" % ('format', 'file MB', 'seconds', 'rows/sec', 'peak RSS KB')
+    for ext, writer in (('.csv', write_csv), ('.xml', write_xml), ('.json', write_json)):
+        fd, path = tempfile.mkstemp(suffix=ext)
+        with os.fdopen(fd, 'wb') as fh:
+            writer(fake_rows(num_races, cands_per_race, precincts), fh)
+        queue = Queue()
+        proc = Process(target=run, args=(path, queue))
+        proc.start()
+        elapsed, peak_rss = queue.get()
+        proc.join()
+        size = os.path.getsize(path) / 1024.0 / 1024
+        os.remove(path)
+        print "%-6s %12.1f %10.3f %12d %12d" % (ext[1:], size, elapsed, num_rows / elapsed, peak_rss)
+
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
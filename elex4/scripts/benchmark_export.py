@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""
+Benchmark JSON export of a synthetic statewide summary.
+
+Compares the streaming writers in lib/export.py against building the whole
+document with json.dumps. Each variant runs in its own child process so its
+peak memory can be read from the OS.
+
+USAGE:
+
+    python benchmark_export.py [num_races] [cands_per_race]
+
+
+"""
+from multiprocessing import Process, Queue
+import json
+import os
+import resource
+import sys
+import time
+
+from elex4.lib.export import open_output, write_json, write_ndjson
+from elex4.lib.summary import flatten
+
+
+def fake_summary(num_races, cands_per_race):
+    summary = {}
+    for i in range(num_races):
+        race_key = "State House-%s" % i
+        summary[race_key] = {
+            'date': '2012-11-06',
+            'office': 'State House',
+            'district': str(i),
+            'all_votes': cands_per_race * 1000,
+            'candidates': [
+                {
+                    'last_name': 'Candidate%s' % j,
+                    'first_name': 'Pat',
+                    'party': 'P%s' % j,
+                    'votes': 1000,
+                    'winner': '',
+                }
+                for j in range(cands_per_race)
+            ],
+        }
+    return summary
+
+
+def dumps_ndjson(summary, fh):
+    # Baseline: build every line in memory, then write
+    lines = [json.dumps(row) for race in summary.values() for row in flatten(race)]
+    fh.write('\n'.join(lines) + '\n')
+
+
+def dumps_json(summary, fh):
+    # Baseline: build the whole document in memory, then write
+    fh.write(json.dumps(summary.values()))
+
+
+def run(variant, path, num_races, cands_per_race, queue):
+    summary = fake_summary(num_races, cands_per_race)
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    fh = open_output(path)
+    variant(summary, fh)
+    fh.close()
+    elapsed = time.time() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, peak_rss - baseline_rss, os.path.getsize(path)))
+
+
+def main(num_races=5000, cands_per_race=6):
+    rows = num_races * cands_per_race
+    print "%s races, %s candidate rows" % (num_races, rows)
+    print "%-24s %10s %12s %14s %12s" % ('variant', 'seconds', 'rows/sec', 'extra peak KB', 'bytes')
+    variants = [
+        ('write_ndjson', write_ndjson, 'bench.ndjson'),
+        ('write_ndjson (gzip)', write_ndjson, 'bench.ndjson.gz'),
+        ('json.dumps lines', dumps_ndjson, 'bench.ndjson'),
+        ('write_json', write_json, 'bench.json'),
+        ('json.dumps document', dumps_json, 'bench.json'),
+    ]
+    for name, variant, fname in variants:
+        path = os.path.join('/tmp', fname)
+        queue = Queue()
+        proc = Process(target=run, args=(variant, path, num_races, cands_per_race, queue))
+        proc.start()
+        elapsed, extra_rss, size = queue.get()
+        proc.join()
+        os.remove(path)
+        print "%-24s %10.3f %12d %14d %12d" % (name, elapsed, rows / elapsed, extra_rss, size)
+
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
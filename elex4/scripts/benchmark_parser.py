@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Benchmark the header-specialized CSV row parser against the original
+csv.DictReader loop.
+
+USAGE:
+
+    python benchmark_parser.py [num_rows]
+
+
+"""
+import csv
+import os
+import sys
+import tempfile
+import time
+
+from elex4.lib.models import Race
+from elex4.lib.parser import parse_and_clean
+
+
+def dict_reader_parse(path):
+    """The original parse_and_clean loop"""
+    reader = csv.DictReader(open(path, 'rb'))
+    results = {}
+    for row in reader:
+        row['votes'] = int(row['votes'])
+        race_key = row['office']
+        if row['district']:
+            race_key += "-%s" % row['district']
+        try:
+            race = results[race_key]
+        except KeyError:
+            race = Race(row['date'], row['office'], row['district'])
+            results[race_key] = race
+        race.add_result(row)
+    return results
+
+
+def write_fake_results(path, num_rows):
+    with open(path, 'wb') as fh:
+        writer = csv.writer(fh)
+        writer.writerow(['date', 'office', 'district', 'county', 'candidate', 'party', 'votes'])
+        for i in range(num_rows):
+            writer.writerow(['2012-11-06', 'State House', i % 100, 'Precinct %s' % (i // 400),
+                             'Candidate%s, Pat' % (i % 4), 'P%s' % (i % 4), i % 500])
+
+
+def best_of(func, path, repeat=3):
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        func(path)
+        times.append(time.time() - start)
+    return min(times)
+
+
+def main(num_rows=200000):
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+    write_fake_results(path, num_rows)
+    try:
+        print "%s rows" % num_rows
+        for name, func in (('DictReader loop', dict_reader_parse), ('compiled parser', parse_and_clean)):
+            elapsed = best_of(func, path)
+            print "%-16s %8.3f s %10d rows/sec" % (name, elapsed, num_rows / elapsed)
+    finally:
+        os.remove(path)
+
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+"""
+This script compares two summary CSVs, such as a re-run against what was
+published, and reports candidates whose votes or winner status changed,
+along with candidates that were added or removed.
+
+USAGE:
+
+    python diff_summaries.py old_summary_results.csv new_summary_results.csv
+
+    # Write the changes as CSV instead of one line per change
+    python diff_summaries.py --csv old_summary_results.csv new_summary_results.csv
+
+
+OUTPUT:
+
+    One line per change on stdout, or a CSV with DIFF_FIELDS columns with --csv.
+    Exits with status 1 if there were any changes.
+
+
+"""
+import csv
+import sys
+
+from elex4.lib.diff import DIFF_FIELDS, describe, diff_summaries
+
+
+def main(old_path, new_path, as_csv=False):
+    changes = 0
+    writer = None
+    if as_csv:
+        writer = csv.DictWriter(sys.stdout, DIFF_FIELDS, quoting=csv.QUOTE_MINIMAL)
+        writer.writeheader()
+    for diff in diff_summaries(old_path, new_path):
+        changes += 1
+        if writer:
+            writer.writerow(diff)
+        else:
+            print describe(diff)
+    return changes
+
+
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if arg != '--csv']
+    sys.exit(1 if main(args[0], args[1], as_csv='--csv' in sys.argv[1:]) else 0)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""
+This script runs the download, parse and summarize stages and reports
+memory use after each one.
+
+USAGE:
+
+    # Write a report for this run
+    python memory_census.py report.json
+
+    # Compare two earlier reports
+    python memory_census.py --diff before.json after.json
+
+
+OUTPUT:
+
+    JSON report with, for each stage, peak RSS, live objects by type and
+    bytes owned by races, candidates and county result maps.
+
+
+"""
+from os.path import dirname, join
+import sys
+
+from elex4.lib.memory import MemoryCensus, diff_reports, load_report
+from elex4.lib.parser import parse_and_clean
+from elex4.lib.scraper import download_results
+from elex4.lib.summary import summarize
+
+
+def main(outfile):
+    census = MemoryCensus()
+    census.snapshot('start')
+    fname = 'fake_va_elec_results.csv'
+    path = join(dirname(dirname(__file__)), fname)
+    download_results(path)
+    census.snapshot('download')
+    results = parse_and_clean(path)
+    census.snapshot('parse', results)
+    summary = summarize(results)
+    census.snapshot('summarize', results)
+    census.save(outfile)
+    for stage in census.stages:
+        model = stage['model'] or {}
+        print "%-10s peak RSS %8s KB   model %10s bytes" % (stage['stage'], stage['peak_rss_kb'], model.get('total_bytes', '-'))
+
+
+def print_diff(before_path, after_path):
+    changes = diff_reports(load_report(before_path), load_report(after_path))
+    for stage, metric, before, after, change in changes:
+        print "%-10s %-40s %12s -> %12s (%+d)" % (stage, metric, before, after, change)
+
+
+
+if __name__ == '__main__':
+    if sys.argv[1] == '--diff':
+        print_diff(sys.argv[2], sys.argv[3])
+    else:
+        main(sys.argv[1])
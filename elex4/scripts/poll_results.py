@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""
+This script replaces running save_summary_to_csv.py from cron. It polls the
+results feed on an adaptive schedule, polling more often while results are
+changing and backing off while they aren't, and rewrites the summary CSV
+each time new results arrive.
+
+Races with suspicious county updates keep their last published results in
+the CSV (or are left out, if they were never published) until their race
+keys are added, one per line, to acknowledged.txt in elex4/. The file
+is removed when the next poll starts, so flags raised by that poll or
+later ones hold the race again.
+
+County totals that change are written to a journal in elex4/journal/. After
+a restart, the journaled results become the prior snapshot, so the first
+poll is still checked for suspicious updates.
+
+USAGE:
+
+    python poll_results.py
+
+    # Cap requests to the feed at 20 per minute
+    python poll_results.py --budget=20
+
+    # Check the elex3 engine against elex4 on 10% of polls, without publishing it
+    python poll_results.py --shadow=elex3 --shadow-rate=0.1
+
+    # Check county totals against registered voters, from a file with one
+    # row per voter (the default is registration.csv in elex4/, if present)...
+    python poll_results.py --registration=/path/to/registration.csv
+
+    # ...or with a count of voters per row
+    python poll_results.py --registration=/path/to/registration.csv --registration-count=registered
+
+
+OUTPUT:
+
+    summary_results.csv containing racewide totals for each race/candidate pair,
+    rewritten whenever the feed changes. Held races and the reasons they were
+    flagged are printed. With --shadow, shadow_runs.jsonl in elex4/ logs each
+    shadow run's latency and differences.
+
+
+"""
+from os.path import dirname, exists, join
+import csv
+import os
+import sys
+import time
+
+from elex4.lib.anomaly import AnomalyDetector
+from elex4.lib.journal import ResultsJournal, result_rows
+from elex4.lib.parser import parse_and_clean
+from elex4.lib.polling import Feed, PollScheduler
+from elex4.lib.scraper import RESULTS_URL
+from elex4.lib.shadow import ShadowRunner
+from elex4.lib.summary import summarize, write_summary
+from elex4.lib.turnout import count_registered
+
+# Checkpoint the journal after this many changed polls
+CHECKPOINT_EVERY = 10
+
+# Kept across polls so each poll is checked against the one before
+detector = None
+journal = None
+shadow = None
+
+
+def main(budget=60, shadow_engine=None, shadow_rate=0.1, registration_path=None, count_column=None):
+    global detector, journal, shadow
+    fname = 'fake_va_elec_results.csv'
+    path = join(dirname(dirname(__file__)), fname)
+    if registration_path is None:
+        registration_path = join(dirname(dirname(__file__)), 'registration.csv')
+    detector = AnomalyDetector(load_registered(registration_path, count_column))
+    journal = ResultsJournal(join(dirname(dirname(__file__)), 'journal'))
+    for race_key, row in result_rows(journal.recover()):
+        detector.remember(race_key, row)
+    if shadow_engine:
+        shadow = ShadowRunner(shadow_engine, join(dirname(dirname(__file__)), 'shadow_runs.jsonl'),
+                              sample_rate=shadow_rate)
+    feed = Feed('results', RESULTS_URL, path)
+    scheduler = PollScheduler([feed], on_change=publish, budget=budget)
+    try:
+        scheduler.run()
+    finally:
+        journal.close()
+        if shadow is not None:
+            shadow.close()
+
+
+def publish(feed):
+    """Re-summarize a feed that changed and rewrite the CSV, keeping held races at their last published results"""
+    # Acknowledgements only release flags raised before this poll; anything
+    # suspicious in the new results holds its race again.
+    acknowledge_races()
+    start = time.time()
+    results = parse_and_clean(feed.path, monitor=detector)
+    summary = summarize(results)
+    if shadow is not None:
+        shadow.submit(feed.path, summary, time.time() - start)
+    # Replaces each county's journaled totals, so re-polling doesn't double-count
+    journal.update(results)
+    if feed.changes % CHECKPOINT_EVERY == 0:
+        journal.checkpoint()
+    for race_key in sorted(detector.held()):
+        for flag in detector.flagged[race_key]:
+            print "HELD %s: %s in %s: %s" % (race_key, flag['candidate'], flag['county'], '; '.join(flag['reasons']))
+    write_summary(detector.publishable(summary), join(dirname(dirname(__file__)), 'summary_results.csv'))
+    print "%s changed: %s polls, %s changes, next poll in %.0fs" % (
+        feed.name, feed.polls, feed.changes, feed.interval)
+
+
+def load_registered(path, count_column=None):
+    """RETURNS: Dictionary of county -> registered voters, or None if path doesn't exist"""
+    if not exists(path):
+        print "No registration file at %s; only checking against the prior poll" % path
+        return None
+    with open(path, 'rb') as fh:
+        registered, unmatched = count_registered(csv.DictReader(fh), None, count_column)
+    return registered
+
+
+def acknowledge_races():
+    path = join(dirname(dirname(__file__)), 'acknowledged.txt')
+    if exists(path):
+        with open(path, 'rb') as fh:
+            for line in fh:
+                detector.acknowledge(line.strip())
+        os.remove(path)
+
+
+
+if __name__ == '__main__':
+    options = dict(arg[2:].split('=', 1) for arg in sys.argv[1:] if arg.startswith('--') and '=' in arg)
+    main(int(options.get('budget', 60)), options.get('shadow'), float(options.get('shadow-rate', 0.1)),
+         options.get('registration'), options.get('registration-count'))
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+"""
+This script publishes parsed results to a shared, memory-mapped file that
+any number of worker processes can read without loading their own copy.
+
+USAGE:
+
+    python publish_shared_results.py [path]
+
+    # In each worker process
+    from elex4.lib.shared import SharedResults
+    shared = SharedResults()
+    shared.refresh()  # after each poll
+    race = shared.race('President')
+
+
+"""
+from os.path import dirname, join
+import sys
+import time
+
+from elex4.lib.parser import parse_and_clean
+from elex4.lib.scraper import download_results
+from elex4.lib.shared import DEFAULT_PATH, publish
+
+
+def main(path=DEFAULT_PATH):
+    fname = 'fake_va_elec_results.csv'
+    results_path = join(dirname(dirname(__file__)), fname)
+    download_results(results_path)
+    results = parse_and_clean(results_path)
+    version = int(time.time())
+    publish(results, version, path)
+    print "Published version %s of %s races to %s" % (version, len(results), path)
+
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""
+This script replays recorded feed snapshots through a local stand-in for
+the results feed, running download, parse, summarize and write on every
+poll, and reports how long it took for each feed change to be published.
+
+USAGE:
+
+    python replay_election_night.py path/to/snapshots/
+
+    # Replay 120x faster than real time, polling every 30 timeline seconds
+    python replay_election_night.py path/to/snapshots/ --speedup=120 --poll=30
+
+
+OUTPUT:
+
+    Latency percentiles and average per-stage timings, as JSON on stdout.
+
+
+"""
+import json
+import shutil
+import sys
+import tempfile
+
+from elex4.lib.replay import ReplayHarness, ReplayServer, load_snapshots
+
+
+def main(snapshot_dir, speedup=60, poll_interval=30):
+    server = ReplayServer(load_snapshots(snapshot_dir), speedup=speedup)
+    work_dir = tempfile.mkdtemp(prefix='elex4_replay_')
+    server.start()
+    try:
+        report = ReplayHarness(server, work_dir, poll_interval).run()
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir)
+    print json.dumps(report, indent=2, sort_keys=True)
+
+
+def option(name, default):
+    values = [arg.split('=', 1)[1] for arg in sys.argv[1:] if arg.startswith('--%s=' % name)]
+    return float(values[0]) if values else default
+
+
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    main(args[0], speedup=option('speedup', 60), poll_interval=option('poll', 30))
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+This script backfills many results files at once. Each input listed in a
+manifest is parsed, summarized and written to its output in a pool of
+worker processes. Re-running after an interruption skips completed jobs.
+
+USAGE:
+
+    python run_batch.py manifest.csv
+
+    # Limit the pool to 4 worker processes (defaults to one per CPU)
+    python run_batch.py manifest.csv --workers=4
+
+The manifest is a CSV with input and output columns, relative to the
+manifest's directory:
+
+    input,output
+    va/2012.csv,summaries/va_2012.csv
+    va/2014.csv,summaries/va_2014.csv
+
+
+OUTPUT:
+
+    Each job's summary CSV, plus batch_ledger.jsonl (completed jobs) and
+    batch_timings.csv (per-job stage timings) next to the manifest.
+
+
+"""
+from os.path import dirname, join
+import os
+import sys
+
+from elex4.lib.batch import BatchRunner, load_manifest, write_timings
+
+
+def main(manifest_path, workers=None):
+    base = dirname(os.path.abspath(manifest_path))
+    runner = BatchRunner(load_manifest(manifest_path), join(base, 'batch_ledger.jsonl'), workers)
+    results = runner.run()
+    write_timings(results, join(base, 'batch_timings.csv'))
+    failed = [result for result in results if result['status'] != 'done']
+    for result in failed:
+        print "FAILED %s: %s" % (result['input'], result['error'])
+    print "Ran %s jobs, %s failed" % (len(results), len(failed))
+    return len(failed)
+
+
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    workers = [arg.split('=', 1)[1] for arg in sys.argv[1:] if arg.startswith('--workers=')]
+    sys.exit(1 if main(args[0], int(workers[0]) if workers else None) else 0)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+This script runs results processing as a set of cached stages: download,
+parse, validate, summarize and one stage per writer. A stage only re-runs
+when its inputs, its own code or the library modules it uses changed, and
+independent stages (such as the writers) run in parallel.
+
+USAGE:
+
+    python run_results_stages.py
+
+    # Re-run every stage, ignoring cached artifacts
+    python run_results_stages.py --force
+
+
+OUTPUT:
+
+    summary_results.csv, summary_results.ndjson and pages/ in the elex4/
+    directory, plus intermediate artifacts and the stage cache in build/.
+
+
+"""
+from os.path import dirname, exists, join
+import json
+import os
+import sys
+
+from elex4.lib.export import open_output, write_ndjson
+from elex4.lib.pages import TEMPLATE_DIR, PageGenerator
+from elex4.lib.parser import parse_and_clean
+from elex4.lib.scraper import download_results
+from elex4.lib.stages import Stage, StageRunner, load_artifact, save_artifact
+from elex4.lib.summary import summarize, write_summary
+
+ROOT = dirname(dirname(__file__))
+BUILD = join(ROOT, 'build')
+
+RAW = join(ROOT, 'fake_va_elec_results.csv')
+RESULTS = join(BUILD, 'results.pickle')
+VALIDATION = join(BUILD, 'validation.json')
+SUMMARY = join(BUILD, 'summary.pickle')
+CSV_OUT = join(ROOT, 'summary_results.csv')
+NDJSON_OUT = join(ROOT, 'summary_results.ndjson')
+PAGES_INDEX = join(ROOT, 'pages', 'index.html')
+TEMPLATES = [join(TEMPLATE_DIR, 'race.html'), join(TEMPLATE_DIR, 'index.html')]
+
+
+def download(inputs, outputs):
+    download_results(outputs[0])
+
+
+def parse(inputs, outputs):
+    save_artifact(parse_and_clean(inputs[0]), outputs[0])
+
+
+def validate(inputs, outputs):
+    """Check race totals against candidate votes before anything is published"""
+    results = load_artifact(inputs[0])
+    problems = []
+    for race_key, race in sorted(results.items()):
+        cand_total = sum(cand.votes for cand in race.candidates.values())
+        if cand_total != race.total_votes:
+            problems.append("%s: candidates have %s votes, race total is %s" % (race_key, cand_total, race.total_votes))
+    with open(outputs[0], 'wb') as fh:
+        json.dump({'problems': problems}, fh, indent=2)
+    if problems:
+        raise ValueError("Results failed validation:\n%s" % "\n".join(problems))
+
+
+def summarize_results(inputs, outputs):
+    # Depends on validation output so summaries are never built from bad results
+    save_artifact(summarize(load_artifact(inputs[0])), outputs[0])
+
+
+def write_csv(inputs, outputs):
+    write_summary(load_artifact(inputs[0]), outputs[0])
+
+
+def write_json(inputs, outputs):
+    fh = open_output(outputs[0])
+    try:
+        write_ndjson(load_artifact(inputs[0]), fh)
+    finally:
+        fh.close()
+
+
+def write_pages(inputs, outputs):
+    PageGenerator(dirname(outputs[0])).render(load_artifact(inputs[0]))
+
+
+STAGES = [
+    Stage('download', download, outputs=[RAW], always=True, modules=['elex4.lib.scraper']),
+    Stage('parse', parse, inputs=[RAW], outputs=[RESULTS], modules=['elex4.lib.parser']),
+    Stage('validate', validate, inputs=[RESULTS], outputs=[VALIDATION], modules=['elex4.lib.models']),
+    Stage('summarize', summarize_results, inputs=[RESULTS, VALIDATION], outputs=[SUMMARY],
+          modules=['elex4.lib.summary']),
+    Stage('write_csv', write_csv, inputs=[SUMMARY], outputs=[CSV_OUT], modules=['elex4.lib.summary']),
+    Stage('write_json', write_json, inputs=[SUMMARY], outputs=[NDJSON_OUT], modules=['elex4.lib.export']),
+    Stage('write_pages', write_pages, inputs=[SUMMARY] + TEMPLATES, outputs=[PAGES_INDEX],
+          modules=['elex4.lib.pages']),
+]
+
+
+def main(force=False):
+    if not exists(BUILD):
+        os.makedirs(BUILD)
+    runner = StageRunner(STAGES, join(BUILD, 'stages.json'))
+    status = runner.run(force=force)
+    for stage in STAGES:
+        print "%-12s %s" % (stage.name, status[stage.name])
+
+
+
+if __name__ == '__main__':
+    main(force='--force' in sys.argv[1:])
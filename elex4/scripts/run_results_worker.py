@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+"""
+This script starts a results worker that holds one partition of races
+for a sharded run of save_summary_to_csv.py.
+
+USAGE:
+
+    python run_results_worker.py 0.0.0.0:9001
+
+    # Then, on the coordinator:
+    python save_summary_to_csv.py --workers=host1:9001,host2:9001
+
+
+"""
+import sys
+
+from elex4.lib.cluster import ResultsWorker, parse_address
+
+
+def main(address):
+    server = ResultsWorker(parse_address(address))
+    print "Results worker listening on %s:%s" % server.server_address
+    server.serve_forever()
+
+
+
+if __name__ == '__main__':
+    main(sys.argv[1])
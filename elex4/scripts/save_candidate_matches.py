@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+"""
+This script merges candidates whose names are spelled differently across
+the feed (e.g. "Smith, Joe" and "SMITH, JOSEPH") before summarizing, and
+writes a report of every merge for review.
+
+USAGE:
+
+    python save_candidate_matches.py
+
+
+OUTPUT:
+
+    candidate_matches.csv listing each merged spelling and its canonical
+    candidate, and summary_results.csv with the merged candidates, both in
+    the elex4/ directory.
+
+
+"""
+from os.path import dirname, join
+import csv
+
+from elex4.lib.names import REPORT_FIELDS, resolve_candidates
+from elex4.lib.parser import parse_and_clean
+from elex4.lib.scraper import download_results
+from elex4.lib.summary import summarize, write_summary
+
+
+def main():
+    fname = 'fake_va_elec_results.csv'
+    path = join(dirname(dirname(__file__)), fname)
+    download_results(path)
+    results = parse_and_clean(path)
+    report = resolve_candidates(results)
+
+    outfile = join(dirname(dirname(__file__)), 'candidate_matches.csv')
+    with open(outfile, 'wb') as fh:
+        writer = csv.DictWriter(fh, REPORT_FIELDS, quoting=csv.QUOTE_MINIMAL)
+        writer.writeheader()
+        writer.writerows(report)
+
+    write_summary(summarize(results), join(dirname(dirname(__file__)), 'summary_results.csv'))
+    print "Merged %s candidate spellings" % len(report)
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+This script tabulates ranked-choice races from a ballot-level CSV and
+writes round-by-round results.
+
+USAGE:
+
+    python save_rcv_rounds_to_csv.py /path/to/ballots.csv
+
+
+OUTPUT:
+
+    rcv_rounds.csv containing each candidate's votes in every round,
+    alongside summary_results.csv in the elex4/ directory.
+
+
+"""
+from os.path import dirname, join
+import csv
+import sys
+
+from elex4.lib.rcv import parse_ballots
+
+
+def main(path):
+    races = parse_ballots(path)
+    for race in races.values():
+        race.tabulate()
+    write_csv(races)
+
+
+def write_csv(races):
+    """Generates CSV from tabulated ranked-choice races
+
+    CSV is written to 'rcv_rounds.csv' file in elex4/ directory.
+
+    """
+    outfile = join(dirname(dirname(__file__)), 'rcv_rounds.csv')
+    with open(outfile, 'wb') as fh:
+        fieldnames = [
+            'date',
+            'office',
+            'district',
+            'round',
+            'last_name',
+            'first_name',
+            'votes',
+            'exhausted',
+            'status',
+        ]
+        writer = csv.DictWriter(fh, fieldnames, extrasaction='ignore', quoting=csv.QUOTE_MINIMAL)
+        writer.writeheader()
+        for race_key, race in sorted(races.items()):
+            for rnd in race.rounds:
+                for raw_name, votes in sorted(rnd['tallies'].items(), key=lambda item: -item[1]):
+                    if raw_name == rnd['eliminated']:
+                        status = 'eliminated'
+                    elif raw_name == race.winner and rnd is race.rounds[-1]:
+                        status = 'winner'
+                    else:
+                        status = ''
+                    last_name, first_name = [name.strip() for name in raw_name.split(",")]
+                    writer.writerow({
+                        'date': race.date,
+                        'office': race.office,
+                        'district': race.district,
+                        'round': rnd['round'],
+                        'last_name': last_name,
+                        'first_name': first_name,
+                        'votes': votes,
+                        'exhausted': rnd['exhausted'],
+                        'status': status,
+                    })
+
+
+
+if __name__ == '__main__':
+    main(sys.argv[1])
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""
+This script re-aggregates county results into custom regions, such as
+media markets or split congressional districts.
+
+USAGE:
+
+    python save_region_results_to_csv.py /path/to/crosswalk.csv
+
+
+OUTPUT:
+
+    region_results.csv in the elex4/ directory, next to summary_results.csv,
+    with the summary columns plus a region column.
+
+
+"""
+from os.path import dirname, join
+import csv
+import sys
+
+from elex4.lib.parser import parse_and_clean
+from elex4.lib.regions import load_crosswalk, reaggregate
+from elex4.lib.scraper import download_results
+from elex4.lib.summary import FIELDNAMES, flatten, summarize
+
+
+def main(crosswalk_path):
+    fname = 'fake_va_elec_results.csv'
+    path = join(dirname(dirname(__file__)), fname)
+    download_results(path)
+    results = parse_and_clean(path)
+    crosswalk = load_crosswalk(crosswalk_path)
+    by_region = reaggregate(results, crosswalk)
+    if crosswalk.unmapped:
+        print "Counties missing from crosswalk: %s" % ", ".join(sorted(crosswalk.unmapped))
+    write_csv(by_region)
+
+
+def write_csv(by_region):
+    """Generates CSV from re-aggregated results
+
+    CSV is written to 'region_results.csv' file in elex4/ directory.
+
+    """
+    outfile = join(dirname(dirname(__file__)), 'region_results.csv')
+    with open(outfile, 'wb') as fh:
+        writer = csv.DictWriter(fh, ['region'] + FIELDNAMES, extrasaction='ignore', quoting=csv.QUOTE_MINIMAL)
+        writer.writeheader()
+        for region, results in sorted(by_region.items()):
+            for race_key, race in sorted(summarize(results).items()):
+                for row in flatten(race):
+                    row['region'] = region
+                    writer.writerow(row)
+
+
+
+if __name__ == '__main__':
+    main(sys.argv[1])
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+"""
+This script renders static HTML results pages, one per race plus an index.
+Only pages for races that changed since the last run are rewritten.
+
+USAGE:
+
+    python save_results_pages.py
+
+
+OUTPUT:
+
+    pages/ directory in elex4/ containing index.html and a page per race.
+
+
+"""
+from os.path import dirname, join
+
+from elex4.lib.pages import PageGenerator
+from elex4.lib.parser import parse_and_clean
+from elex4.lib.scraper import download_results
+from elex4.lib.summary import summarize
+
+
+def main():
+    fname = 'fake_va_elec_results.csv'
+    path = join(dirname(dirname(__file__)), fname)
+    download_results(path)
+    results = parse_and_clean(path)
+    summary = summarize(results)
+    generator = PageGenerator(join(dirname(dirname(__file__)), 'pages'))
+    changed = generator.render(summary)
+    print "Updated %s files" % len(changed)
+
+
+
+if __name__ == '__main__':
+    main()
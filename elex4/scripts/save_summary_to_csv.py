@@ -7,59 +7,99 @@ USAGE:
 
     python save_summary_results_to_csv.py
 
+    # Stream the download through parsing, summarizing and writing
+    python save_summary_results_to_csv.py --pipelined
+
+    # Partition races across results workers (see run_results_worker.py)
+    python save_summary_results_to_csv.py --workers=host1:9001,host2:9001
+
+    # Spill to disk rather than use more than roughly 512MB for results
+    python save_summary_results_to_csv.py --memory-budget=512
+
 
 OUTPUT:
 
     summary_results.csv containing racewide totals for each race/candidate pair.
+    County rows sent more than once with different vote counts are printed.
 
 
 """
 from os.path import dirname, join
-import csv
+import sys
 
-from elex4.lib.summary import summarize
+from elex4.lib.cluster import Coordinator
+from elex4.lib.dedup import DuplicateFilter
+from elex4.lib.pipeline import run_pipeline
+from elex4.lib.summary import summarize, summary_writer, write_summary
 from elex4.lib.parser import parse_and_clean
-from elex4.lib.scraper import download_results
+from elex4.lib.scraper import download_results, stream_results
+from elex4.lib.spill import summarize_file
 
 
 def main():
     fname = 'fake_va_elec_results.csv'
     path = join(dirname(dirname(__file__)), fname)
     download_results(path)
-    results = parse_and_clean(path)
+    # Skip county rows the vendor sent more than once
+    dedup = DuplicateFilter()
+    results = parse_and_clean(path, dedup=dedup)
+    for conflict in dedup.conflicts:
+        print "CONFLICT %(race)s: %(candidate)s in %(county)s sent as %(counted)s, then %(discarded)s" % conflict
     summary = summarize(results)
     write_csv(summary)
 
 
+def main_pipelined():
+    """Overlap download, parse, summarize and write instead of running them in turn"""
+    outfile = join(dirname(dirname(__file__)), 'summary_results.csv')
+    with open(outfile, 'wb') as fh:
+        # Rows are written as the pipeline produces them, with the same writer as write_summary
+        run_pipeline(stream_results(), summary_writer(fh).writerow)
+
+
+def main_sharded(addresses):
+    """Parse and summarize on results workers instead of in this process"""
+    fname = 'fake_va_elec_results.csv'
+    path = join(dirname(dirname(__file__)), fname)
+    download_results(path)
+    coordinator = Coordinator(addresses)
+    try:
+        coordinator.reset()
+        coordinator.load(path)
+        summary = coordinator.summarize()
+    finally:
+        coordinator.close()
+    write_csv(summary)
+
+
+def main_external(memory_budget_mb):
+    """Summarize results too big for memory by spilling partitions to disk"""
+    fname = 'fake_va_elec_results.csv'
+    path = join(dirname(dirname(__file__)), fname)
+    download_results(path)
+    summary = summarize_file(path, memory_budget=memory_budget_mb * 1024 * 1024)
+    write_csv(summary)
+
+
 def write_csv(summary):
     """Generates CSV from summary election results data
 
     CSV is written to 'summary_results.csv' file in elex4/ directory.
+    summary can be a dictionary or an iterable of (race key, race summary) pairs.
 
     """
-    outfile = join(dirname(dirname(__file__)), 'summary_results.csv')
-    with open(outfile, 'wb') as fh:
-        # Limit output to cleanly parsed, standardized values
-        fieldnames = [
-            'date',
-            'office',
-            'district',
-            'last_name',
-            'first_name',
-            'party',
-            'all_votes',
-            'votes',
-            'winner',
-        ]
-        writer = csv.DictWriter(fh, fieldnames, extrasaction='ignore', quoting=csv.QUOTE_MINIMAL)
-        writer.writeheader()
-        for race, results in summary.items():
-            cands = results.pop('candidates')
-            for cand in cands:
-                results.update(cand)
-                writer.writerow(results)
+    write_summary(summary, join(dirname(dirname(__file__)), 'summary_results.csv'))
 
 
 
 if __name__ == '__main__':
-    main()
+    workers = [arg.split('=', 1)[1] for arg in sys.argv[1:] if arg.startswith('--workers=')]
+    budgets = [arg.split('=', 1)[1] for arg in sys.argv[1:] if arg.startswith('--memory-budget=')]
+    if workers:
+        main_sharded(workers[0].split(','))
+    elif budgets:
+        main_external(int(budgets[0]))
+    elif '--pipelined' in sys.argv[1:]:
+        main_pipelined()
+    else:
+        main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+This script generates JSON versions of the summary election results,
+streaming them race by race instead of building one big document.
+
+USAGE:
+
+    python save_summary_to_json.py
+
+    # Write a single JSON array of races instead of NDJSON
+    python save_summary_to_json.py --array
+
+    # Compress the output
+    python save_summary_to_json.py --gzip
+
+
+OUTPUT:
+
+    summary_results.ndjson (or summary_results.json with --array) in the
+    elex4/ directory, next to summary_results.csv. A .gz suffix is added
+    with --gzip.
+
+
+"""
+from os.path import dirname, join
+import sys
+
+from elex4.lib.export import open_output, write_json, write_ndjson
+from elex4.lib.parser import parse_and_clean
+from elex4.lib.scraper import download_results
+from elex4.lib.summary import summarize
+
+
+def main(array=False, compress=False):
+    fname = 'fake_va_elec_results.csv'
+    path = join(dirname(dirname(__file__)), fname)
+    download_results(path)
+    results = parse_and_clean(path)
+    summary = summarize(results)
+
+    outfile = join(dirname(dirname(__file__)), 'summary_results.json' if array else 'summary_results.ndjson')
+    if compress:
+        outfile += '.gz'
+    fh = open_output(outfile)
+    try:
+        if array:
+            write_json(summary, fh)
+        else:
+            write_ndjson(summary, fh)
+    finally:
+        fh.close()
+
+
+
+if __name__ == '__main__':
+    main(array='--array' in sys.argv[1:], compress='--gzip' in sys.argv[1:])
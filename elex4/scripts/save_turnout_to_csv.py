@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""
+This script joins county results against a voter registration file to
+compute turnout per county and race.
+
+USAGE:
+
+    # Registration file with one row per voter and a county column
+    python save_turnout_to_csv.py /path/to/registration.csv
+
+    # Registration file with a count of voters per row
+    python save_turnout_to_csv.py /path/to/registration.csv registered
+
+
+OUTPUT:
+
+    turnout_results.csv in the elex4/ directory, next to summary_results.csv.
+
+
+"""
+from os.path import dirname, join
+import csv
+import sys
+
+from elex4.lib.parser import parse_and_clean
+from elex4.lib.scraper import download_results
+from elex4.lib.turnout import join_turnout
+
+
+def main(registration_path, count_column=None):
+    fname = 'fake_va_elec_results.csv'
+    path = join(dirname(dirname(__file__)), fname)
+    download_results(path)
+    results = parse_and_clean(path)
+    write_csv(join_turnout(results, registration_path, count_column))
+
+
+def write_csv(rows):
+    """Generates CSV from county turnout rows
+
+    CSV is written to 'turnout_results.csv' file in elex4/ directory.
+
+    """
+    outfile = join(dirname(dirname(__file__)), 'turnout_results.csv')
+    with open(outfile, 'wb') as fh:
+        fieldnames = [
+            'date',
+            'office',
+            'district',
+            'county',
+            'votes',
+            'registered',
+            'turnout',
+        ]
+        writer = csv.DictWriter(fh, fieldnames, quoting=csv.QUOTE_MINIMAL)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+"""
+This script polls the results feed and pushes changed races to connected
+clients as server-sent events.
+
+USAGE:
+
+    python serve_race_updates.py [port] [poll_seconds]
+
+    # In a browser or another terminal
+    curl -N 'http://localhost:8001/events?races=President'
+
+
+"""
+from os.path import dirname, join
+from threading import Thread
+import sys
+import time
+
+from elex4.lib.parser import parse_and_clean
+from elex4.lib.push import PushServer
+from elex4.lib.scraper import download_results
+from elex4.lib.summary import summarize
+
+
+def main(port=8001, poll_seconds=30):
+    server = PushServer(('', port))
+    poller = Thread(target=poll, args=(server, poll_seconds))
+    poller.daemon = True
+    poller.start()
+    print "Pushing race updates on http://localhost:%s/events" % port
+    server.serve_forever()
+
+
+def poll(server, poll_seconds):
+    fname = 'fake_va_elec_results.csv'
+    path = join(dirname(dirname(__file__)), fname)
+    while True:
+        download_results(path)
+        results = parse_and_clean(path)
+        changed = server.publish(summarize(results))
+        print "Pushed %s changed races" % len(changed)
+        time.sleep(poll_seconds)
+
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
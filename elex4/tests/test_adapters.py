@@ -0,0 +1,81 @@
+from os.path import dirname, join
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+
+from elex4.lib.adapters import read_json, read_rows
+from elex4.lib.parser import parse_and_clean
+from elex4.lib.summary import summarize, write_summary
+
+
+class TestAdapters(TestCase):
+
+    def parse(self, fname):
+        return parse_and_clean(join(dirname(__file__), fname))
+
+    def assert_president(self, results):
+        race = results['President']
+        self.assertEqual(race.total_votes, 31)
+        votes = dict((cand.last_name, cand.votes) for cand in race.candidates.values())
+        self.assertEqual(votes, {'Smith': 15, 'Doe': 16})
+
+    def test_xml_matches_csv(self):
+        "XML feeds should produce the same races as the CSV feed"
+        results = self.parse('sample_results.xml')
+        self.assert_president(results)
+        self.assertEqual(results['Senate-1'].date, '2012-11-06')
+        self.assertEqual(results['Senate-1'].total_votes, 7)
+
+    def test_json_matches_csv(self):
+        "JSON feeds should produce the same races as the CSV feed"
+        results = self.parse('sample_results.json')
+        self.assert_president(results)
+        self.assertEqual(sorted(results.keys()), ['President', 'Senate-1'])
+
+    def test_json_objects_split_across_chunks(self):
+        "JSON objects straddling read chunks should be decoded intact"
+        path = join(dirname(__file__), 'sample_results.json')
+        rows = list(read_json(path, chunk_size=7))
+        self.assertEqual(rows, list(read_json(path)))
+        self.assertEqual(len(rows), 6)
+
+    def test_non_ascii_names_match_csv(self):
+        "Accented names from JSON and XML should be UTF-8 str and written like names read from CSV"
+        tmp = tempfile.mkdtemp()
+        try:
+            written = {}
+            for suffix in ('.csv', '.json', '.xml'):
+                path = join(dirname(__file__), 'sample_results_accents' + suffix)
+                for row in read_rows(path):
+                    self.assertTrue(isinstance(row['candidate'], str))
+                    self.assertTrue(isinstance(row['county'], str))
+                outfile = join(tmp, 'summary%s.csv' % suffix)
+                write_summary(summarize(parse_and_clean(path)), outfile)
+                with open(outfile, 'rb') as fh:
+                    written[suffix] = sorted(fh.read().splitlines())
+            self.assertEqual(written['.json'], written['.csv'])
+            self.assertEqual(written['.xml'], written['.csv'])
+            self.assertTrue(any('Pe\xc3\xb1a' in line for line in written['.csv']))
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_ndjson(self):
+        "NDJSON files with one row object per line should be supported"
+        fd, path = tempfile.mkstemp(suffix='.ndjson')
+        os.write(fd, '{"office": "President", "votes": 1}\n{"office": "Senate", "votes": 2}\n')
+        os.close(fd)
+        try:
+            self.assertEqual([row['office'] for row in read_rows(path)], ['President', 'Senate'])
+        finally:
+            os.remove(path)
+
+    def test_truncated_json_rejected(self):
+        "A truncated JSON feed should raise an error rather than silently drop rows"
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.write(fd, '[{"office": "President", "votes": 1}, {"office": "Sen')
+        os.close(fd)
+        try:
+            self.assertRaises(ValueError, list, read_rows(path))
+        finally:
+            os.remove(path)
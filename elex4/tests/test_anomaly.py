@@ -0,0 +1,111 @@
+from os.path import dirname, join
+from unittest import TestCase
+
+from elex4.lib.anomaly import AnomalyDetector, RunningStats
+from elex4.lib.parser import parse_and_clean
+
+
+def result(county, votes, candidate='Smith, Joe', party='GOP'):
+    return {'county': county, 'votes': votes, 'candidate': candidate, 'party': party}
+
+
+class TestRunningStats(TestCase):
+
+    def test_add_and_remove(self):
+        "Removing a value should restore the mean and variance without it"
+        stats = RunningStats()
+        for value in [1.0, 2.0, 3.0, 10.0]:
+            stats.add(value)
+        stats.remove(10.0)
+        self.assertAlmostEqual(stats.mean, 2.0)
+        self.assertAlmostEqual(stats.stddev(), 1.0)
+        self.assertEqual(stats.count, 3)
+
+
+class TestAnomalyDetector(TestCase):
+
+    def test_first_snapshot_not_flagged(self):
+        "Plausible first results should pass"
+        detector = AnomalyDetector()
+        self.assertEqual(detector.check('President', result('A', 500)), [])
+        self.assertEqual(detector.held(), set())
+
+    def test_jump_from_prior_snapshot(self):
+        "A county total growing tenfold should be flagged"
+        detector = AnomalyDetector()
+        detector.check('President', result('A', 500))
+        reasons = detector.check('President', result('A', 5000))
+        self.assertEqual(reasons, ['grew from 500'])
+        self.assertEqual(detector.held(), set(['President']))
+
+    def test_small_jumps_ignored(self):
+        "Large relative growth on small counts should not be flagged"
+        detector = AnomalyDetector()
+        detector.check('President', result('A', 2))
+        self.assertEqual(detector.check('President', result('A', 40)), [])
+
+    def test_decrease_flagged(self):
+        "A county total going down should be flagged"
+        detector = AnomalyDetector()
+        detector.check('President', result('A', 500))
+        self.assertEqual(detector.check('President', result('A', 400)), ['decreased from 500'])
+
+    def test_registration_ceiling(self):
+        "Votes across candidates can't exceed registered voters"
+        detector = AnomalyDetector(registered={'A': 1000})
+        detector.check('President', result('A', 600))
+        reasons = detector.check('President', result('A', 500, 'Doe, Jane', 'DEM'))
+        self.assertEqual(reasons, ['1100 votes in county exceed 1000 registered'])
+        # An update replaces the candidate's earlier value rather than adding to it
+        self.assertEqual(detector.check('Senate', result('A', 600)), [])
+        self.assertEqual(detector.check('Senate', result('A', 610)), [])
+
+    def test_share_outlier(self):
+        "A share of registered voters far from other counties should be flagged"
+        registered = dict(('County %s' % i, 1000) for i in range(10))
+        detector = AnomalyDetector(registered=registered, max_zscore=3, min_counties=5)
+        for i in range(9):
+            self.assertEqual(detector.check('President', result('County %s' % i, 400 + i * 5)), [])
+        reasons = detector.check('President', result('County 9', 990))
+        self.assertEqual(len(reasons), 1)
+        self.assertTrue('standard deviations' in reasons[0])
+
+    def test_acknowledge_releases_race(self):
+        "Acknowledged races should be published again"
+        detector = AnomalyDetector()
+        detector.check('President', result('A', 500))
+        detector.check('President', result('A', 5000))
+        summary = {'President': {}, 'Senate': {}}
+        self.assertEqual(sorted(detector.publishable(summary)), ['Senate'])
+        flags = detector.acknowledge('President')
+        self.assertEqual(flags[0]['county'], 'A')
+        self.assertEqual(sorted(detector.publishable(summary)), ['President', 'Senate'])
+
+    def test_held_race_keeps_last_published_values(self):
+        "A held race should be published with its last good results, not dropped"
+        detector = AnomalyDetector()
+        detector.check('President', result('A', 500))
+        self.assertEqual(detector.publishable({'President': {'all_votes': 500}}), {'President': {'all_votes': 500}})
+        detector.check('President', result('A', 5000))
+        self.assertEqual(detector.publishable({'President': {'all_votes': 5000}}), {'President': {'all_votes': 500}})
+        detector.acknowledge('President')
+        self.assertEqual(detector.publishable({'President': {'all_votes': 5000}}), {'President': {'all_votes': 5000}})
+
+    def test_parser_monitor(self):
+        "parse_and_clean should check every row with the monitor"
+        path = join(dirname(__file__), 'sample_results.csv')
+        detector = AnomalyDetector()
+        parse_and_clean(path, monitor=detector)
+        self.assertEqual(detector.held(), set())
+        # Re-parsing the same snapshot is unchanged, so nothing is flagged
+        parse_and_clean(path, monitor=detector)
+        self.assertEqual(detector.held(), set())
+
+    def test_remembered_results_are_prior_snapshot(self):
+        "Remembered results shouldn't be flagged, but later polls should be checked against them"
+        detector = AnomalyDetector(registered={'A': 100})
+        # Over the registration ceiling, but remembered rather than checked
+        detector.remember('President', result('A', 500))
+        self.assertEqual(detector.held(), set())
+        detector.registered = {}
+        self.assertEqual(detector.check('President', result('A', 400)), ['decreased from 500'])
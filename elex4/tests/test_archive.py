@@ -0,0 +1,140 @@
+from os.path import join
+from unittest import TestCase
+import shutil
+import tempfile
+
+from elex4.lib.archive import (ArchiveReader, ArchiveWriter, decode_values, decode_varint, encode_varint,
+                               flatten_results, race_ids, unzigzag, zigzag)
+from elex4.lib.parser import add_row, make_race_key
+
+
+def poll_results(poll, num_counties=20):
+    """Results that grow a little in a few counties each poll"""
+    results = {}
+    for county in range(num_counties):
+        for office, district in [('President', ''), ('Senate', '1')]:
+            for cand, party in [('Smith, Joe', 'GOP'), ('Doe, Jane', 'DEM')]:
+                votes = 100 * county + (poll * 7 if county % 5 == poll % 5 else 0) + len(party)
+                row = {'date': '2012-11-06', 'office': office, 'district': district,
+                       'county': 'County %s' % county, 'candidate': cand, 'party': party, 'votes': votes}
+                add_row(results, make_race_key(office, district), row)
+    if poll >= 3:
+        # A write-in candidate shows up partway through the night
+        add_row(results, 'President', {'date': '2012-11-06', 'office': 'President', 'district': '',
+                                       'county': 'County 0', 'candidate': 'Roe, Pat', 'party': 'IND',
+                                       'votes': poll})
+    return results
+
+
+class TestVarint(TestCase):
+
+    def test_round_trip(self):
+        "Varints and zigzag encoding should round-trip"
+        buf = bytearray()
+        values = [0, 1, 127, 128, 300, 2 ** 40]
+        for value in values:
+            encode_varint(value, buf)
+        pos = 0
+        for value in values:
+            decoded, pos = decode_varint(buf, pos)
+            self.assertEqual(decoded, value)
+        for value in [0, -1, 1, -64, 64, -2 ** 33]:
+            self.assertEqual(unzigzag(zigzag(value)), value)
+        self.assertEqual(zigzag(-1), 1)
+
+
+class TestArchive(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = join(self.tmp, 'polls.archive')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write_polls(self, count, keyframe_interval=4):
+        writer = ArchiveWriter(self.path, keyframe_interval)
+        for poll in range(count):
+            writer.append(poll_results(poll), 1000.0 + poll)
+
+    def test_reconstruct_every_poll(self):
+        "Every poll should be rebuilt exactly, across keyframes"
+        self.write_polls(10)
+        reader = ArchiveReader(self.path)
+        self.assertEqual(reader.timestamps(), [1000.0 + poll for poll in range(10)])
+        for poll in range(10):
+            self.assertEqual(reader.totals(poll), flatten_results(poll_results(poll)))
+
+    def test_results_rebuilt_as_races(self):
+        "A poll should be rebuilt as Race instances"
+        self.write_polls(5)
+        results = ArchiveReader(self.path).results(4)
+        expected = poll_results(4)
+        self.assertEqual(sorted(results), sorted(expected))
+        self.assertEqual(results['President'].total_votes, expected['President'].total_votes)
+        self.assertEqual(results['Senate-1'].office, 'Senate')
+
+    def test_race_series(self):
+        "A race's candidate totals should be available for every poll"
+        self.write_polls(6)
+        series = ArchiveReader(self.path).race_series('President')
+        self.assertEqual(len(series), 6)
+        for poll, (timestamp, totals) in enumerate(series):
+            expected = poll_results(poll)['President']
+            self.assertEqual(timestamp, 1000.0 + poll)
+            self.assertEqual(totals.get(('GOP', 'Smith, Joe')), expected.candidates[('GOP', 'Smith, Joe')].votes)
+        self.assertEqual(series[2][1].get(('IND', 'Roe, Pat'), 0), 0)
+        self.assertEqual(series[5][1][('IND', 'Roe, Pat')], 5)
+
+    def test_race_blocks_decoded_alone(self):
+        "Decoding one race's block should yield only that race's series"
+        self.write_polls(6)
+        reader = ArchiveReader(self.path)
+        keys = reader.keys(5)
+        series_races = race_ids(keys)
+        with open(self.path, 'rb') as fh:
+            archive = fh.read()
+        for frame_type, timestamp, offset, keys_len, values_len in reader.frames:
+            buf = bytearray(archive[offset + keys_len:offset + keys_len + values_len])
+            everything = list(decode_values(buf))
+            for race_id in set(series_races):
+                expected = [entry for entry in everything if series_races[entry[0]] == race_id]
+                self.assertEqual(list(decode_values(buf, race_id)), expected)
+
+    def test_resume_appending(self):
+        "A new writer should continue an existing archive"
+        self.write_polls(5)
+        writer = ArchiveWriter(self.path, 4)
+        self.assertEqual(writer.polls, 5)
+        writer.append(poll_results(5), 1005.0)
+        self.assertEqual(ArchiveReader(self.path).totals(5), flatten_results(poll_results(5)))
+
+    def test_torn_frame_ignored(self):
+        "A partially written last frame should be ignored, and dropped when writing resumes"
+        self.write_polls(3)
+        with open(self.path, 'ab') as fh:
+            fh.write('\x02\x03\x00')
+        self.assertEqual(len(ArchiveReader(self.path).frames), 3)
+        writer = ArchiveWriter(self.path, 4)
+        for poll in range(3, 5):
+            writer.append(poll_results(poll), 1000.0 + poll)
+        reader = ArchiveReader(self.path)
+        self.assertEqual(len(reader.frames), 5)
+        self.assertEqual(reader.results(4)['President'].total_votes,
+                         poll_results(4)['President'].total_votes)
+
+    def test_resume_without_complete_frame(self):
+        "An archive holding only a torn first frame should be started over"
+        with open(self.path, 'wb') as fh:
+            fh.write('\x01\x00')
+        self.write_polls(2)
+        reader = ArchiveReader(self.path)
+        self.assertEqual(len(reader.frames), 2)
+        self.assertEqual(reader.timestamps(), [1000.0, 1001.0])
+
+    def test_deltas_are_small(self):
+        "Delta frames should be much smaller than keyframes"
+        self.write_polls(4, keyframe_interval=4)
+        frames = ArchiveReader(self.path).frames
+        keyframe_values, delta_values = frames[0][4], frames[1][4]
+        self.assertTrue(delta_values * 5 < keyframe_values)
@@ -0,0 +1,84 @@
+from os.path import dirname, exists, join
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+
+from elex4.lib.batch import BatchRunner, load_manifest, write_timings
+
+
+class TestBatchRunner(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        with open(join(dirname(__file__), 'sample_results.csv'), 'rb') as fh:
+            header, rows = fh.readline(), fh.read()
+        manifest = ['input,output']
+        # Inputs of increasing size, plus one that can't be parsed
+        for i in range(3):
+            with open(join(self.tmp, 'va_%s.csv' % i), 'wb') as fh:
+                fh.write(header + rows * (i + 1))
+            manifest.append('va_%s.csv,out/va_%s_summary.csv' % (i, i))
+        with open(join(self.tmp, 'broken.csv'), 'wb') as fh:
+            fh.write('not,a,results,file\n1,2,3,4\n')
+        # Output directories don't exist yet; run_job creates them
+        manifest.append('broken.csv,out/broken_summary.csv')
+        self.manifest = join(self.tmp, 'manifest.csv')
+        with open(self.manifest, 'wb') as fh:
+            fh.write('\n'.join(manifest) + '\n')
+        self.ledger = join(self.tmp, 'ledger.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def runner(self):
+        return BatchRunner(load_manifest(self.manifest), self.ledger, workers=2)
+
+    def test_manifest_paths_relative_to_manifest(self):
+        "Manifest paths should resolve against the manifest's directory"
+        jobs = load_manifest(self.manifest)
+        self.assertEqual(jobs[0]['input'], join(self.tmp, 'va_0.csv'))
+        self.assertEqual(jobs[0]['output'], join(self.tmp, 'out', 'va_0_summary.csv'))
+
+    def test_largest_first(self):
+        "Pending jobs should be ordered by input size, largest first"
+        inputs = [os.path.basename(job['input']) for job in self.runner().pending()]
+        self.assertEqual(inputs, ['va_2.csv', 'va_1.csv', 'va_0.csv', 'broken.csv'])
+
+    def test_run_and_resume(self):
+        "Completed jobs should be skipped on a re-run, and failed ones retried"
+        results = self.runner().run()
+        statuses = dict((os.path.basename(result['input']), result['status']) for result in results)
+        self.assertEqual(statuses, {'va_0.csv': 'done', 'va_1.csv': 'done', 'va_2.csv': 'done', 'broken.csv': 'failed'})
+        for i in range(3):
+            self.assertTrue(exists(join(self.tmp, 'out', 'va_%s_summary.csv' % i)))
+        rerun = self.runner().run()
+        self.assertEqual([os.path.basename(result['input']) for result in rerun], ['broken.csv'])
+
+    def test_changed_input_rerun(self):
+        "A job whose input changed or output vanished should run again"
+        self.runner().run()
+        with open(join(self.tmp, 'va_0.csv'), 'ab') as fh:
+            fh.write('\n')
+        os.remove(join(self.tmp, 'out', 'va_1_summary.csv'))
+        pending = sorted(os.path.basename(job['input']) for job in self.runner().pending())
+        self.assertEqual(pending, ['broken.csv', 'va_0.csv', 'va_1.csv'])
+
+    def test_missing_input_fails_alone(self):
+        "A missing input should be reported as a failed job without stopping the batch"
+        os.remove(join(self.tmp, 'va_1.csv'))
+        results = self.runner().run()
+        statuses = dict((os.path.basename(result['input']), result['status']) for result in results)
+        self.assertEqual(statuses, {'va_0.csv': 'done', 'va_1.csv': 'failed', 'va_2.csv': 'done', 'broken.csv': 'failed'})
+        missing = [result for result in results if result['input'].endswith('va_1.csv')][0]
+        self.assertTrue(missing['error'].startswith('IOError'))
+
+    def test_write_timings(self):
+        "Timings should be written slowest first with an error column"
+        results = self.runner().run()
+        path = join(self.tmp, 'timings.csv')
+        write_timings(results, path)
+        with open(path, 'rb') as fh:
+            lines = fh.read().splitlines()
+        self.assertEqual(lines[0], 'input,output,size,status,parse,summarize,write,total,error')
+        self.assertEqual(len(lines), 5)
@@ -0,0 +1,105 @@
+from os.path import dirname, join
+from threading import Thread
+from unittest import TestCase
+import shutil
+import tempfile
+
+from elex4.lib.cluster import Coordinator, ResultsWorker, WorkerError, shard_for
+from elex4.lib.parser import parse_and_clean
+from elex4.lib.summary import summarize, write_summary
+
+
+class TestShardFor(TestCase):
+
+    def test_shard_is_stable(self):
+        "Race keys should always map to the same shard"
+        self.assertEqual(shard_for('President', 4), shard_for('President', 4))
+        self.assertTrue(0 <= shard_for('Senate-1', 3) < 3)
+
+
+class TestCoordinator(TestCase):
+
+    def setUp(self):
+        self.workers = []
+        for i in range(3):
+            worker = ResultsWorker(('127.0.0.1', 0))
+            thread = Thread(target=worker.serve_forever, args=(0.01,))
+            thread.daemon = True
+            thread.start()
+            self.workers.append(worker)
+        addresses = ['%s:%s' % worker.server_address for worker in self.workers]
+        self.coordinator = Coordinator(addresses, batch_size=2)
+        self.path = join(dirname(__file__), 'sample_results.csv')
+
+    def tearDown(self):
+        self.coordinator.close()
+        for worker in self.workers:
+            worker.shutdown()
+            worker.server_close()
+
+    def test_races_partitioned_by_key(self):
+        "Each race should live on exactly one worker"
+        self.coordinator.add_results([
+            {'date': '2012-11-06', 'office': office, 'district': '', 'county': 'Some County',
+             'candidate': 'Smith, Joe', 'party': 'GOP', 'votes': '1'}
+            for office in ['President', 'Senate', 'Governor', 'Mayor']
+        ])
+        holders = [sorted(worker.results.keys()) for worker in self.workers]
+        self.assertEqual(sorted(sum(holders, [])), ['Governor', 'Mayor', 'President', 'Senate'])
+        for worker in self.workers:
+            for race_key in worker.results:
+                self.assertEqual(shard_for(race_key, 3), self.workers.index(worker))
+
+    def test_summary_matches_single_process(self):
+        "Gathered summary should match summarizing in a single process"
+        self.coordinator.load(self.path)
+        expected = summarize(parse_and_clean(self.path))
+        summary = self.coordinator.summarize()
+        self.assertEqual(summary['President']['all_votes'], expected['President']['all_votes'])
+        votes = dict((cand['last_name'], cand['votes']) for cand in summary['President']['candidates'])
+        self.assertEqual(votes, {'Smith': 15, 'Doe': 16})
+
+    def test_non_ascii_names_written(self):
+        "Accented names should come back from workers as UTF-8 str and be written like a local summary"
+        path = join(dirname(__file__), 'sample_results_accents.json')
+        self.coordinator.load(path)
+        summary = self.coordinator.summarize()
+        names = [cand['last_name'] for cand in summary['President']['candidates']]
+        self.assertTrue('Pe\xc3\xb1a' in names)
+        tmp = tempfile.mkdtemp()
+        try:
+            write_summary(summary, join(tmp, 'cluster.csv'))
+            write_summary(summarize(parse_and_clean(path)), join(tmp, 'local.csv'))
+            written = [sorted(open(join(tmp, name), 'rb').read().splitlines())
+                       for name in ('cluster.csv', 'local.csv')]
+            self.assertEqual(written[0], written[1])
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_reset_clears_workers(self):
+        "Reset should drop every race held by the workers"
+        self.coordinator.load(self.path)
+        self.coordinator.reset()
+        self.assertEqual(self.coordinator.summarize(), {})
+
+    def test_worker_errors_reported(self):
+        "Failures inside a worker should surface as WorkerError"
+        self.coordinator.add_results([
+            {'date': '2012-11-06', 'office': 'President', 'district': '', 'county': 'Some County',
+             'candidate': 'Smith, Joe', 'party': 'GOP', 'votes': '1'}
+        ])
+        # A single-candidate race can't be summarized
+        self.assertRaises(WorkerError, self.coordinator.summarize)
+
+    def test_connections_usable_after_worker_error(self):
+        "A worker error shouldn't leave other workers' replies unread"
+        self.coordinator.add_results([
+            {'date': '2012-11-06', 'office': office, 'district': '', 'county': 'Some County',
+             'candidate': 'Smith, Joe', 'party': 'GOP', 'votes': '1'}
+            for office in ['President', 'Senate', 'Governor', 'Mayor']
+        ])
+        self.assertRaises(WorkerError, self.coordinator.summarize)
+        self.coordinator.reset()
+        self.coordinator.load(self.path)
+        summary = self.coordinator.summarize()
+        self.assertEqual(summary.keys(), ['President'])
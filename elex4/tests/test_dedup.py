@@ -0,0 +1,73 @@
+from os.path import dirname, join
+from unittest import TestCase
+import shutil
+import tempfile
+
+from elex4.lib.dedup import BloomFilter, DuplicateFilter
+from elex4.lib.parser import parse_and_clean
+
+
+class TestBloomFilter(TestCase):
+
+    def test_no_false_negatives(self):
+        "Fingerprints already added should always be reported as present"
+        bloom = BloomFilter(100)
+        for fingerprint in range(0, 1000, 7):
+            bloom.add(fingerprint * 2654435761)
+        for fingerprint in range(0, 1000, 7):
+            self.assertTrue(bloom.add(fingerprint * 2654435761))
+
+
+class TestDuplicateFilter(TestCase):
+
+    def setUp(self):
+        self.path = join(dirname(__file__), 'sample_results_duplicates.csv')
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def assert_deduped(self, results):
+        race = results['President']
+        self.assertEqual(race.total_votes, 31)
+        votes = dict((cand.last_name, cand.votes) for cand in race.candidates.values())
+        self.assertEqual(votes, {'Smith': 15, 'Doe': 16})
+
+    def test_resent_rows_counted_twice_without_dedup(self):
+        "Without dedup, resent rows inflate the race total"
+        self.assertEqual(parse_and_clean(self.path)['President'].total_votes, 46)
+
+    def test_exact_dedup(self):
+        "Resent rows should be skipped so race and candidate totals agree"
+        dedup = DuplicateFilter()
+        self.assert_deduped(parse_and_clean(self.path, dedup=dedup))
+        self.assertEqual(dedup.duplicates, 2)
+        self.assertFalse(dedup.probabilistic)
+
+    def test_probabilistic_dedup_verified(self):
+        "Bloom filter false positives should be restored by the verification pass"
+        # A tiny, error-prone filter flags nearly every row as a possible duplicate
+        dedup = DuplicateFilter(exact_limit=0, capacity=1, error_rate=0.9)
+        self.assert_deduped(parse_and_clean(self.path, dedup=dedup))
+        self.assertTrue(dedup.probabilistic)
+        self.assertEqual(dedup.duplicates, 2)
+
+    def test_conflicting_duplicates_flagged(self):
+        "Resent rows with different votes should be recorded as conflicts"
+        lines = open(self.path, 'rb').read() + '2012-11-06,President,,Some County,"Doe, Jane",DEM,12\n'
+        path = join(self.tmp_dir, 'corrected.csv')
+        with open(path, 'wb') as fh:
+            fh.write(lines)
+        for dedup in (DuplicateFilter(), DuplicateFilter(exact_limit=0, capacity=1, error_rate=0.9)):
+            parse_and_clean(path, dedup=dedup)
+            self.assertEqual(dedup.duplicates, 3)
+            self.assertEqual(dedup.conflicts, [{
+                'race': 'President', 'party': 'DEM', 'candidate': 'Doe, Jane',
+                'county': 'Some County', 'counted': 11, 'discarded': 12,
+            }])
+
+    def test_identical_duplicates_not_flagged(self):
+        "Resent rows with the same votes shouldn't be recorded as conflicts"
+        dedup = DuplicateFilter()
+        parse_and_clean(self.path, dedup=dedup)
+        self.assertEqual(dedup.conflicts, [])
@@ -0,0 +1,83 @@
+from os.path import join
+from unittest import TestCase
+import csv
+import shutil
+import tempfile
+
+from elex4.lib.diff import diff_summaries, describe, is_sorted, merge_join, row_key, sorted_rows
+from elex4.lib.summary import FIELDNAMES
+
+
+def summary_row(office, last_name, votes, winner='', party='GOP', district=''):
+    return {
+        'date': '2012-11-06',
+        'office': office,
+        'district': district,
+        'last_name': last_name,
+        'first_name': 'Pat',
+        'party': party,
+        'all_votes': 100,
+        'votes': votes,
+        'winner': winner,
+    }
+
+
+class TestDiff(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, rows):
+        path = join(self.tmp, name)
+        with open(path, 'wb') as fh:
+            writer = csv.DictWriter(fh, FIELDNAMES)
+            writer.writeheader()
+            writer.writerows(rows)
+        return path
+
+    def test_external_sort(self):
+        "Unsorted files should come back in key order across several runs"
+        rows = [summary_row('Office %02d' % (i * 7 % 20), 'Smith', i) for i in range(20)]
+        path = self.write('unsorted.csv', rows)
+        self.assertFalse(is_sorted(path))
+        keys = [row_key(row) for row in sorted_rows(path, chunk_size=3, tmp_dir=self.tmp)]
+        self.assertEqual(len(keys), 20)
+        self.assertEqual(keys, sorted(keys))
+
+    def test_merge_join_pairs_rows(self):
+        "Rows missing from one side should be paired with None"
+        old = [summary_row('A', 'Smith', 1), summary_row('B', 'Smith', 2)]
+        new = [summary_row('B', 'Smith', 3), summary_row('C', 'Smith', 4)]
+        pairs = [(key[0], bool(o), bool(n)) for key, o, n in merge_join(old, new)]
+        self.assertEqual(pairs, [('A', True, False), ('B', True, True), ('C', False, True)])
+
+    def test_reports_changes(self):
+        "Vote changes, winner flips, additions and removals should be reported"
+        old = self.write('old.csv', [
+            summary_row('President', 'Smith', 10, 'X'),
+            summary_row('President', 'Doe', 8, party='DEM'),
+            summary_row('Senate', 'Jones', 5, 'X'),
+            summary_row('Governor', 'Brown', 7, 'X'),
+        ])
+        new = self.write('new.csv', [
+            summary_row('Senate', 'Jones', 5, 'X'),
+            summary_row('President', 'Doe', 12, 'X', party='DEM'),
+            summary_row('President', 'Smith', 10),
+            summary_row('Mayor', 'Green', 3, 'X'),
+        ])
+        changes = dict((diff['last_name'], diff) for diff in diff_summaries(old, new, chunk_size=2))
+        self.assertEqual(sorted(changes), ['Brown', 'Doe', 'Green', 'Smith'])
+        self.assertEqual(changes['Doe']['votes_delta'], 4)
+        self.assertEqual(changes['Smith']['change'], 'changed')
+        self.assertEqual(changes['Brown']['change'], 'removed')
+        self.assertEqual(changes['Green']['change'], 'added')
+        self.assertEqual(describe(changes['Doe']), '~ President: Doe, Pat (DEM) 8 -> 12 (+4), now the winner')
+        self.assertEqual(describe(changes['Smith']), '~ President: Smith, Pat (GOP) 10 -> 10 (+0), no longer the winner')
+
+    def test_identical_files(self):
+        "Identical files should have no changes"
+        rows = [summary_row('President', 'Smith', 10, 'X'), summary_row('Senate', 'Doe', 3, 'X')]
+        self.assertEqual(list(diff_summaries(self.write('a.csv', rows), self.write('b.csv', rows))), [])
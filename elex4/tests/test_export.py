@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from StringIO import StringIO
+from unittest import TestCase
+import gzip
+import json
+import os
+import tempfile
+
+from elex4.lib.export import open_output, write_json, write_ndjson
+from elex4.lib.summary import flatten
+
+
+class TestExportBase(TestCase):
+
+    def setUp(self):
+        self.summary = {
+            'President': {
+                'date': '2012-11-06',
+                'office': 'President',
+                'district': '',
+                'all_votes': 31,
+                'candidates': [
+                    {'last_name': 'Doe', 'first_name': 'Jane', 'party': 'DEM', 'votes': 16, 'winner': 'X'},
+                    {'last_name': 'Smith', 'first_name': 'Joe', 'party': 'GOP', 'votes': 15, 'winner': ''},
+                ],
+            },
+            'Senate-1': {
+                'date': '2012-11-06',
+                'office': 'Senate',
+                'district': '1',
+                'all_votes': 7,
+                'candidates': [
+                    {'last_name': u'Nu\xf1ez', 'first_name': 'Ana', 'party': 'DEM', 'votes': 7, 'winner': 'X'},
+                ],
+            },
+        }
+
+
+class TestNDJSON(TestExportBase):
+
+    def test_one_line_per_candidate(self):
+        "NDJSON export should contain one row per race/candidate pair"
+        fh = StringIO()
+        written = write_ndjson(self.summary, fh)
+        lines = fh.getvalue().splitlines()
+        self.assertEqual(written, 3)
+        self.assertEqual(len(lines), 3)
+
+    def test_rows_match_csv_values(self):
+        "NDJSON rows should hold the same values as summary CSV rows"
+        fh = StringIO()
+        write_ndjson(self.summary, fh)
+        rows = [json.loads(line) for line in fh.getvalue().splitlines()]
+        expected = list(flatten(self.summary['President'])) + list(flatten(self.summary['Senate-1']))
+        self.assertEqual(rows, expected)
+
+
+class TestJSON(TestExportBase):
+
+    def test_array_of_races(self):
+        "JSON export should be a valid array with one object per race"
+        fh = StringIO()
+        write_json(self.summary, fh)
+        races = json.loads(fh.getvalue())
+        self.assertEqual([race['office'] for race in races], ['President', 'Senate'])
+        self.assertEqual(races[1]['candidates'][0]['last_name'], u'Nu\xf1ez')
+
+
+class TestGzipOutput(TestExportBase):
+
+    def test_gz_suffix_compresses(self):
+        "Paths ending in .gz should be written with gzip compression"
+        fd, path = tempfile.mkstemp(suffix='.ndjson.gz')
+        os.close(fd)
+        try:
+            fh = open_output(path)
+            write_ndjson(self.summary, fh)
+            fh.close()
+            lines = gzip.open(path).read().splitlines()
+            self.assertEqual(json.loads(lines[0])['last_name'], 'Doe')
+        finally:
+            os.remove(path)
@@ -0,0 +1,51 @@
+from datetime import datetime
+from unittest import TestCase
+
+from elex4.lib.history import ResultsHistory
+from elex4.lib.models import Race
+
+
+class TestResultsHistory(TestCase):
+
+    def setUp(self):
+        self.president = Race('2012-11-06', 'President', '')
+        self.senate = Race('2012-11-06', 'Senate', '')
+        for race in (self.president, self.senate):
+            race.add_result({'party': 'GOP', 'candidate': 'Smith, Joe', 'county': 'Some County', 'votes': 10})
+            race.add_result({'party': 'DEM', 'candidate': 'Doe, Jane', 'county': 'Some County', 'votes': 5})
+        self.results = {'President': self.president, 'Senate': self.senate}
+        self.history = ResultsHistory(num_buckets=4)
+        self.first = self.history.record(self.results, datetime(2012, 11, 6, 22, 0))
+
+    def test_unchanged_races_shared(self):
+        "Races that didn't change should be shared between snapshots"
+        self.president.add_result({'party': 'DEM', 'candidate': 'Doe, Jane', 'county': 'Another County', 'votes': 20})
+        second = self.history.record(self.results, datetime(2012, 11, 6, 22, 30))
+        self.assertTrue(second.race('Senate') is self.first.race('Senate'))
+        self.assertFalse(second.race('President') is self.first.race('President'))
+
+    def test_past_snapshot_unaffected_by_changes(self):
+        "Earlier snapshots should keep the vote counts from their own poll"
+        self.president.add_result({'party': 'DEM', 'candidate': 'Doe, Jane', 'county': 'Another County', 'votes': 20})
+        self.history.record(self.results, datetime(2012, 11, 6, 22, 30))
+        self.assertEqual(self.first.race('President').total_votes, 15)
+
+    def test_at_finds_latest_snapshot_before_time(self):
+        "History.at should return the snapshot in effect at the given time"
+        second = self.history.record(self.results, datetime(2012, 11, 6, 22, 30))
+        self.assertTrue(self.history.at(datetime(2012, 11, 6, 22, 15)) is self.first)
+        self.assertTrue(self.history.at(datetime(2012, 11, 6, 23, 0)) is second)
+        self.assertRaises(KeyError, self.history.at, datetime(2012, 11, 6, 21, 0))
+
+    def test_snapshot_summary(self):
+        "Snapshot summaries should match the live summary at that time"
+        self.president.add_result({'party': 'DEM', 'candidate': 'Doe, Jane', 'county': 'Another County', 'votes': 20})
+        self.history.record(self.results, datetime(2012, 11, 6, 22, 30))
+        race = self.history.at(datetime(2012, 11, 6, 22, 15)).summarize()['President']
+        smith = [cand for cand in race['candidates'] if cand['last_name'] == 'Smith'][0]
+        self.assertEqual(race['all_votes'], 15)
+        self.assertEqual(smith['winner'], 'X')
+
+    def test_out_of_order_record_rejected(self):
+        "Snapshots recorded out of time order should be rejected"
+        self.assertRaises(ValueError, self.history.record, self.results, datetime(2012, 11, 6, 21, 0))
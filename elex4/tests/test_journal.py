@@ -0,0 +1,193 @@
+from os.path import dirname, join
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+
+from elex4.lib.journal import JOURNAL, ResultsJournal, freeze_race
+from elex4.lib.parser import add_row, make_race_key, parse_and_clean
+
+
+def fake_rows(count):
+    rows = []
+    for i in range(count):
+        row = {
+            'date': '2012-11-06',
+            'office': 'Senate',
+            'district': str(i % 3),
+            'county': 'County %s' % (i // 6),
+            'candidate': ['Smith, Joe', 'Doe, Jane'][i % 2],
+            'party': ['GOP', 'DEM'][i % 2],
+            'votes': i + 1,
+        }
+        rows.append((make_race_key(row['office'], row['district']), row))
+    return rows
+
+
+def frozen(results):
+    return dict((race_key, freeze_race(race)) for race_key, race in results.items())
+
+
+def expected_state(rows):
+    results = {}
+    for race_key, row in rows:
+        add_row(results, race_key, dict(row))
+    return frozen(results)
+
+
+class _CrashingJournal(ResultsJournal):
+    """Journal whose process dies just before writing entry number crash_at"""
+
+    def __init__(self, directory, crash_at, **kwargs):
+        ResultsJournal.__init__(self, directory, **kwargs)
+        self.crash_at = crash_at
+
+    def _write(self, line):
+        if self.seq == self.crash_at:
+            # Skip flushing buffers and cleanup, like a killed process
+            os._exit(1)
+        ResultsJournal._write(self, line)
+
+
+def run_until_crash(directory, rows, crash_at, sync_every, checkpoint_every=None):
+    """Crash-injection harness: apply rows in a child process that dies mid-run"""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            journal = _CrashingJournal(directory, crash_at, sync_every=sync_every)
+            journal.recover()
+            for race_key, row in rows[journal.seq:]:
+                journal.apply(race_key, row)
+                if checkpoint_every and journal.seq % checkpoint_every == 0:
+                    journal.checkpoint()
+            journal.close()
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+
+
+class TestResultsJournal(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.rows = fake_rows(30)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_recover_from_journal(self):
+        "Results applied through the journal should be recovered after a restart"
+        journal = ResultsJournal(self.directory)
+        for race_key, row in self.rows:
+            journal.apply(race_key, row)
+        journal.close()
+        recovered = ResultsJournal(self.directory).recover()
+        self.assertEqual(frozen(recovered), expected_state(self.rows))
+
+    def test_recover_from_checkpoint_and_tail(self):
+        "Recovery should load the checkpoint and replay only later entries"
+        journal = ResultsJournal(self.directory)
+        for race_key, row in self.rows[:20]:
+            journal.apply(race_key, row)
+        journal.checkpoint()
+        for race_key, row in self.rows[20:]:
+            journal.apply(race_key, row)
+        journal.close()
+        lines = open(os.path.join(self.directory, JOURNAL)).readlines()
+        self.assertEqual(len(lines), 10)
+        recovered = ResultsJournal(self.directory)
+        self.assertEqual(frozen(recovered.recover()), expected_state(self.rows))
+        self.assertEqual(recovered.seq, 30)
+
+    def test_torn_write_discarded(self):
+        "A partially written last entry should be ignored and truncated"
+        journal = ResultsJournal(self.directory)
+        for race_key, row in self.rows[:5]:
+            journal.apply(race_key, row)
+        journal.close()
+        with open(os.path.join(self.directory, JOURNAL), 'ab') as fh:
+            fh.write('{"seq": 6, "race_key": "Sen')
+        recovered = ResultsJournal(self.directory)
+        self.assertEqual(frozen(recovered.recover()), expected_state(self.rows[:5]))
+        recovered.apply(*self.rows[5])
+        recovered.close()
+        self.assertEqual(frozen(ResultsJournal(self.directory).recover()), expected_state(self.rows[:6]))
+
+    def test_unterminated_entry_discarded(self):
+        "A complete-looking last entry without a newline should be discarded, not appended to"
+        journal = ResultsJournal(self.directory)
+        for race_key, row in self.rows[:5]:
+            journal.apply(race_key, row)
+        journal.close()
+        line = open(os.path.join(self.directory, JOURNAL), 'rb').readlines()[-1]
+        with open(os.path.join(self.directory, JOURNAL), 'ab') as fh:
+            fh.write(line.replace('"seq": 5', '"seq": 6').rstrip('\n'))
+        recovered = ResultsJournal(self.directory)
+        recovered.recover()
+        self.assertEqual(recovered.seq, 5)
+        for race_key, row in self.rows[5:8]:
+            recovered.apply(race_key, row)
+        recovered.close()
+        self.assertEqual(frozen(ResultsJournal(self.directory).recover()), expected_state(self.rows[:8]))
+
+    def test_crash_recovery(self):
+        "After a crash at any point, recovery should yield a consistent prefix of the applied results"
+        for crash_at in (1, 7, 12, 19, 25):
+            shutil.rmtree(self.directory)
+            run_until_crash(self.directory, self.rows, crash_at, sync_every=4, checkpoint_every=10)
+            journal = ResultsJournal(self.directory)
+            recovered = journal.recover()
+            # Everything up to the last checkpoint must survive; nothing at or after the crash may appear
+            self.assertTrue((crash_at - 1) // 10 * 10 <= journal.seq < crash_at)
+            self.assertEqual(frozen(recovered), expected_state(self.rows[:journal.seq]))
+
+    def test_restart_after_crash_completes(self):
+        "A restarted process should pick up where the crashed one left off"
+        run_until_crash(self.directory, self.rows, 17, sync_every=5, checkpoint_every=10)
+        run_until_crash(self.directory, self.rows, 1000, sync_every=5, checkpoint_every=10)
+        self.assertEqual(frozen(ResultsJournal(self.directory).recover()), expected_state(self.rows))
+
+    def test_repolled_feed_not_double_counted(self):
+        "Journaling the same full feed on every poll should replace county totals, not add to them"
+        path = join(dirname(__file__), 'sample_results.csv')
+        journal = ResultsJournal(self.directory)
+        self.assertEqual(journal.update(parse_and_clean(path)), 4)
+        self.assertEqual(journal.update(parse_and_clean(path)), 0)
+        results = parse_and_clean(path)
+        results['President'].add_result({'party': 'GOP', 'candidate': 'Smith, Joe', 'county': 'New County', 'votes': 2})
+        self.assertEqual(journal.update(results), 1)
+        self.assertEqual(journal.results['President'].total_votes, 33)
+
+    def test_restart_recovers_latest_poll(self):
+        "After a restart, the journal should hold the latest poll's county totals"
+        path = join(dirname(__file__), 'sample_results.csv')
+        journal = ResultsJournal(self.directory)
+        journal.update(parse_and_clean(path))
+        journal.checkpoint()
+        results = parse_and_clean(path)
+        smith = results['President'].candidates[('GOP', 'Smith, Joe')]
+        smith.county_results['Some County'] = 25
+        journal.update(results)
+        # No close(): update() syncs, so a crash here loses nothing
+        recovered = ResultsJournal(self.directory).recover()
+        votes = dict((cand.last_name, cand.votes) for cand in recovered['President'].candidates.values())
+        self.assertEqual(votes, {'Smith': 30, 'Doe': 16})
+        self.assertEqual(recovered['President'].total_votes, 46)
+
+    def test_restart_with_non_ascii_names(self):
+        "Recovered accented names should match a freshly parsed poll, from the checkpoint or the journal"
+        path = join(dirname(__file__), 'sample_results_accents.csv')
+        journal = ResultsJournal(self.directory)
+        journal.update(parse_and_clean(path))
+        journal.checkpoint()
+        results = parse_and_clean(path)
+        results['President'].add_result({'party': 'DEM', 'candidate': 'Pe\xc3\xb1a, Jos\xc3\xa9',
+                                         'county': 'Luna', 'votes': 4})
+        journal.update(results)
+        journal.close()
+        recovered = ResultsJournal(self.directory)
+        recovered.recover()
+        self.assertEqual(recovered.update(results), 0)
+        race = recovered.results['President']
+        self.assertEqual(race.total_votes, 9)
+        self.assertEqual(race.candidates[('DEM', 'Pe\xc3\xb1a, Jos\xc3\xa9')].votes, 7)
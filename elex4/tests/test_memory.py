@@ -0,0 +1,54 @@
+from os.path import dirname, join
+from unittest import TestCase
+import sys
+
+from elex4.lib.memory import MemoryCensus, deep_size, diff_reports, model_sizes
+from elex4.lib.parser import parse_and_clean
+
+
+class TestDeepSize(TestCase):
+
+    def test_shared_objects_counted_once(self):
+        "Objects reachable twice should only be counted once"
+        shared = 'x' * 1000
+        single = deep_size([shared])
+        double = deep_size([shared, shared])
+        self.assertEqual(double - single, sys.getsizeof([shared, shared]) - sys.getsizeof([shared]))
+
+    def test_nested_containers(self):
+        "Deep size should include the contents of nested containers"
+        self.assertTrue(deep_size({'a': ['x' * 1000]}) > 1000)
+
+
+class TestModelSizes(TestCase):
+
+    def setUp(self):
+        self.results = parse_and_clean(join(dirname(__file__), 'sample_results.csv'))
+        self.sizes = model_sizes(self.results)
+
+    def test_owner_counts(self):
+        "Model report should count races, candidates and county results"
+        self.assertEqual(self.sizes['races']['count'], 1)
+        self.assertEqual(self.sizes['candidates']['count'], 2)
+        self.assertEqual(self.sizes['county_results']['count'], 4)
+
+    def test_per_race_bytes_add_up(self):
+        "Per-race bytes should add up to the total"
+        self.assertEqual(sum(self.sizes['per_race'].values()), self.sizes['total_bytes'])
+        owners = sum(self.sizes[owner]['bytes'] for owner in ('races', 'candidates', 'county_results'))
+        self.assertTrue(owners <= self.sizes['total_bytes'])
+
+
+class TestMemoryCensus(TestCase):
+
+    def test_stage_reports_and_diff(self):
+        "Census should report each stage, and diffs should show what changed"
+        results = parse_and_clean(join(dirname(__file__), 'sample_results.csv'))
+        before = MemoryCensus()
+        before.snapshot('parse', results)
+        results['President'].add_result({'party': 'IND', 'candidate': 'Roe, Rick', 'county': 'Some County', 'votes': 1})
+        after = MemoryCensus()
+        after.snapshot('parse', results)
+        self.assertTrue(after.stages[0]['types'])
+        changes = dict(((stage, metric), change) for stage, metric, old, new, change in diff_reports(before.stages, after.stages))
+        self.assertEqual(changes[('parse', 'model.candidates.count')], 1)
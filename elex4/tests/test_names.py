@@ -0,0 +1,75 @@
+from unittest import TestCase
+
+from elex4.lib.models import Race
+from elex4.lib.names import CandidateMatcher, resolve_candidates, soundex, split_name
+
+
+def race_with(rows):
+    race = Race('2012-11-06', 'President', '')
+    for candidate, party, county, votes in rows:
+        race.add_result({'candidate': candidate, 'party': party, 'county': county, 'votes': votes})
+    return race
+
+
+class TestNames(TestCase):
+
+    def test_split_name(self):
+        "Names should be upper-cased, stripped of punctuation and suffixes, and nicknames expanded"
+        self.assertEqual(split_name('Smith, Joe'), ('SMITH', 'JOSEPH'))
+        self.assertEqual(split_name("O'Brien, Bob Jr."), ('OBRIEN', 'ROBERT'))
+        self.assertEqual(split_name('Cher'), ('CHER', ''))
+
+    def test_soundex(self):
+        "Soundex should match the standard codes"
+        self.assertEqual(soundex('ROBERT'), 'R163')
+        self.assertEqual(soundex('RUPERT'), 'R163')
+        self.assertEqual(soundex('ASHCRAFT'), 'A261')
+        self.assertEqual(soundex('TYMCZAK'), 'T522')
+
+    def test_spelling_variants_matched(self):
+        "Nicknames, case and small misspellings should match"
+        race = race_with([
+            ('Smith, Joe', 'GOP', 'A', 10),
+            ('SMITH, JOSEPH', 'GOP', 'B', 5),
+            ('Smyth, Joseph', 'GOP', 'C', 1),
+            ('Doe, Jane', 'DEM', 'A', 12),
+        ])
+        matches = CandidateMatcher().find_matches(race)
+        matched = set(frozenset((a[1], b[1])) for score, a, b in matches)
+        self.assertTrue(frozenset(['Smith, Joe', 'SMITH, JOSEPH']) in matched)
+        self.assertTrue(frozenset(['SMITH, JOSEPH', 'Smyth, Joseph']) in matched)
+        self.assertFalse(any('Doe, Jane' in pair for pair in matched))
+
+    def test_different_people_not_matched(self):
+        "Different first names, or different parties, should not match"
+        race = race_with([
+            ('Smith, John', 'GOP', 'A', 10),
+            ('Smith, Joan', 'GOP', 'A', 8),
+            ('Smith, Joe', 'DEM', 'A', 3),
+        ])
+        self.assertEqual(CandidateMatcher().find_matches(race), [])
+
+    def test_merge_under_canonical_key(self):
+        "Variants should merge into the candidate with the most votes"
+        race = race_with([
+            ('Smith, Joe', 'GOP', 'A', 10),
+            ('SMITH, JOSEPH', 'GOP', 'B', 5),
+            ('SMITH, JOSEPH', 'GOP', 'A', 4),
+            ('Doe, Jane', 'DEM', 'A', 12),
+        ])
+        report = resolve_candidates({'President': race})
+        self.assertEqual(sorted(race.candidates), [('DEM', 'Doe, Jane'), ('GOP', 'Smith, Joe')])
+        smith = race.candidates[('GOP', 'Smith, Joe')]
+        self.assertEqual(smith.county_results, {'A': 10, 'B': 5})
+        self.assertEqual(smith.votes, 15)
+        self.assertEqual(race.total_votes, 27)
+        self.assertEqual(len(report), 1)
+        self.assertEqual(report[0]['race'], 'President')
+        self.assertEqual(report[0]['merged_name'], 'SMITH, JOSEPH')
+        self.assertEqual(report[0]['votes_merged'], 5)
+        self.assertEqual(report[0]['conflicting_counties'], 'A')
+
+    def test_large_blocks_skipped(self):
+        "Blocks bigger than max_block should not be compared"
+        race = race_with([('Smith, Joe', 'GOP', 'A', 1), ('SMITH, JOSEPH', 'GOP', 'B', 1)])
+        self.assertEqual(CandidateMatcher(max_block=1).find_matches(race), [])
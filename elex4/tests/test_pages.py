@@ -0,0 +1,87 @@
+from os.path import exists, join
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+
+from elex4.lib.pages import PageGenerator, slugify
+
+
+class TestSlugify(TestCase):
+
+    def test_slugify_race_key(self):
+        "Race keys should be converted to lowercase, hyphenated file names"
+        self.assertEqual(slugify('State Senate-12'), 'state-senate-12')
+
+
+class TestPageGenerator(TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.summary = {}
+        for office in ('President', 'Senate'):
+            self.summary[office] = {
+                'date': '2012-11-06',
+                'office': office,
+                'district': '',
+                'all_votes': 31,
+                'candidates': [
+                    {'last_name': 'Doe', 'first_name': 'Jane', 'party': 'DEM', 'votes': 16, 'winner': 'X'},
+                    {'last_name': 'Smith', 'first_name': 'Joe', 'party': 'GOP', 'votes': 15, 'winner': ''},
+                ],
+            }
+        self.generator = PageGenerator(self.output_dir)
+        self.generator.render(self.summary)
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def test_pages_rendered(self):
+        "First run should render every race page and the index"
+        for fname in ('president.html', 'senate.html', 'index.html'):
+            self.assertTrue(exists(join(self.output_dir, fname)))
+        page = open(join(self.output_dir, 'president.html')).read()
+        self.assertTrue('Jane Doe' in page)
+
+    def test_unchanged_races_skipped(self):
+        "Re-rendering unchanged results should not rewrite any files"
+        generator = PageGenerator(self.output_dir)
+        self.assertEqual(generator.render(self.summary), [])
+
+    def test_only_changed_race_rewritten(self):
+        "Only the changed race page and the index should be rewritten"
+        self.summary['Senate']['candidates'][1]['votes'] = 20
+        generator = PageGenerator(self.output_dir)
+        changed = sorted(os.path.basename(path) for path in generator.render(self.summary))
+        self.assertEqual(changed, ['index.html', 'senate.html'])
+
+    def test_removed_race_page_deleted(self):
+        "Pages for races no longer in the results should be removed"
+        del self.summary['Senate']
+        self.generator.render(self.summary)
+        self.assertFalse(exists(join(self.output_dir, 'senate.html')))
+
+    def test_compiled_templates_cached(self):
+        "Compiled templates should be cached on disk for later runs"
+        self.assertTrue(os.listdir(join(self.output_dir, '.template_cache')))
+
+    def test_colliding_slugs_get_separate_pages(self):
+        "Race keys with the same slug should get their own pages"
+        race = self.summary['Senate']
+        self.summary = {'State Senate-12': race, 'State-Senate 12': dict(race, all_votes=40)}
+        self.generator.render(self.summary)
+        files = [entry['file'] for entry in self.generator.manifest.values()]
+        self.assertEqual(len(set(files)), 2)
+        for fname in files:
+            self.assertTrue(exists(join(self.output_dir, fname)))
+
+    def test_removing_colliding_race_keeps_other_page(self):
+        "Removing one of two races with the same slug should keep the other's page"
+        race = self.summary['Senate']
+        self.generator.render({'State Senate-12': race, 'State-Senate 12': race})
+        fname = self.generator.manifest['State-Senate 12']['file']
+        self.generator.render({'State-Senate 12': race})
+        self.assertEqual(self.generator.manifest['State-Senate 12']['file'], fname)
+        self.assertTrue(exists(join(self.output_dir, fname)))
+        self.generator.render({'State Senate-12': race})
+        self.assertTrue(exists(join(self.output_dir, self.generator.manifest['State Senate-12']['file'])))
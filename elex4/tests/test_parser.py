@@ -1,7 +1,9 @@
 from os.path import dirname, join
 from unittest import TestCase
+import os
+import tempfile
 
-from elex4.lib.parser import parse_and_clean
+from elex4.lib.parser import clean_lines, clean_rows, compile_row_parser, parse_and_clean
 
 
 class TestParser(TestCase):
@@ -14,3 +16,54 @@ class TestParser(TestCase):
         smith = [cand for cand in race.candidates.values() if cand.last_name == 'Smith'][0]
         self.assertEqual(smith.first_name, 'Joe')
         self.assertEqual(smith.last_name, 'Smith')
+
+
+class TestCompiledRowParser(TestCase):
+
+    def test_positional_parsing(self):
+        "Compiled parser should pick columns by position and convert votes"
+        header = ['votes', 'party', 'candidate', 'county', 'district', 'office', 'date', 'precinct']
+        parse_row = compile_row_parser(header)
+        race_key, row = parse_row(['10', 'GOP', 'Smith, Joe', 'Some County', '2', 'Senate', '2012-11-06', 'P1'])
+        self.assertEqual(race_key, 'Senate-2')
+        self.assertEqual(row['votes'], 10)
+        self.assertEqual(row['candidate'], 'Smith, Joe')
+
+    def test_cached_by_header(self):
+        "Parsers should only be compiled once per header"
+        header = ['date', 'office', 'district', 'county', 'candidate', 'party', 'votes']
+        self.assertTrue(compile_row_parser(header) is compile_row_parser(list(header)))
+
+    def test_race_keys_shared(self):
+        "Rows in the same race should share one race key string"
+        parse_row = compile_row_parser(['date', 'office', 'district', 'county', 'candidate', 'party', 'votes'])
+        first, row = parse_row(['2012-11-06', 'President', '', 'Some County', 'Smith, Joe', 'GOP', '1'])
+        second, row = parse_row(['2012-11-06', 'President', '', 'Another County', 'Smith, Joe', 'GOP', '1'])
+        self.assertTrue(first is second)
+
+    def test_unknown_layout_not_compiled(self):
+        "Headers missing required columns should fall back to the generic parser"
+        self.assertEqual(compile_row_parser(['date', 'office', 'votes']), None)
+
+    def test_ragged_rows_use_generic_path(self):
+        "Rows with missing trailing columns should still be parsed"
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        os.write(fd, 'date,office,district,county,candidate,party,votes,notes\n'
+                     '2012-11-06,President,,Some County,"Smith, Joe",GOP,10\n')
+        os.close(fd)
+        try:
+            rows = list(clean_rows(path))
+        finally:
+            os.remove(path)
+        self.assertEqual(rows[0][1], 'President')
+        self.assertEqual(rows[0][2]['votes'], 10)
+
+    def test_blank_lines_skipped(self):
+        "Blank lines in a results CSV should be skipped"
+        lines = ['date,office,district,county,candidate,party,votes\n',
+                 '\n',
+                 '2012-11-06,President,,Some County,"Smith, Joe",GOP,10\n',
+                 '\n']
+        rows = list(clean_lines(lines))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0][2]['votes'], 10)
@@ -0,0 +1,71 @@
+from os.path import dirname, join
+from unittest import TestCase
+
+from elex4.lib.parser import parse_and_clean
+from elex4.lib.pipeline import run_pipeline
+from elex4.lib.scraper import iter_lines
+from elex4.lib.summary import flatten, summarize
+
+
+class TestIterLines(TestCase):
+
+    def test_lines_split_across_chunks(self):
+        "Lines split across download chunks should be re-assembled"
+        chunks = ['date,off', 'ice\n2012', '-11-06,President\n', 'last']
+        self.assertEqual(list(iter_lines(chunks)), ['date,office\n', '2012-11-06,President\n', 'last'])
+
+
+class TestPipeline(TestCase):
+
+    def setUp(self):
+        self.path = join(dirname(__file__), 'sample_results.csv')
+        self.lines = open(self.path, 'rb').readlines()
+
+    def sorted_rows(self, rows):
+        return sorted(rows, key=lambda row: (row['office'], row['last_name']))
+
+    def test_matches_sequential_summary(self):
+        "Pipelined rows should match the sequential parse and summarize"
+        expected = []
+        for race in summarize(parse_and_clean(self.path)).values():
+            expected.extend(flatten(race))
+        rows = []
+        written = run_pipeline(self.lines, rows.append, maxsize=1)
+        self.assertEqual(written, 2)
+        self.assertEqual(self.sorted_rows(rows), self.sorted_rows(expected))
+
+    def test_grouped_feed_hands_off_races_early(self):
+        "Grouped feeds should summarize each race as soon as the next race starts"
+        lines = self.lines + [
+            '2012-11-06,Senate,,Some County,"Roe, Rick",GOP,3\n',
+            '2012-11-06,Senate,,Some County,"Poe, Pat",DEM,4\n',
+        ]
+        rows = []
+        run_pipeline(lines, rows.append, maxsize=1, grouped_by_race=True)
+        self.assertEqual([row['office'] for row in rows], ['President', 'President', 'Senate', 'Senate'])
+
+    def test_ungrouped_feed_rejected_in_grouped_mode(self):
+        "A race that reappears after being handed off should raise an error"
+        lines = self.lines + [
+            '2012-11-06,Senate,,Some County,"Roe, Rick",GOP,3\n',
+            '2012-11-06,President,,Third County,"Doe, Jane",DEM,1\n',
+        ]
+        self.assertRaises(ValueError, run_pipeline, lines, lambda row: None, 1, True)
+
+    def test_writer_error_propagates(self):
+        "An error in any stage should stop the pipeline and be re-raised"
+        def write_row(row):
+            raise IOError("disk full")
+        self.assertRaises(IOError, run_pipeline, self.lines + self.lines[1:] * 50, write_row, 1)
+
+    def test_column_order_matches_parser(self):
+        "Feeds with reordered columns should be parsed the same way as parse_and_clean"
+        lines = [
+            'votes,party,candidate,county,district,office,date\n',
+            '10,GOP,"Smith, Joe",Some County,,President,2012-11-06\n',
+            '11,DEM,"Doe, Jane",Some County,,President,2012-11-06\n',
+        ]
+        rows = []
+        run_pipeline(lines, rows.append)
+        self.assertEqual([(row['last_name'], row['votes']) for row in self.sorted_rows(rows)],
+                         [('Doe', 11), ('Smith', 10)])
@@ -0,0 +1,195 @@
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from httplib import BadStatusLine
+from os.path import join
+from threading import Thread
+from unittest import TestCase
+import random
+import shutil
+import tempfile
+
+from elex4.lib.polling import Feed, PollScheduler, max_age, retry_after
+
+
+class FakeClock(object):
+    """Clock whose sleep advances time instantly"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.now += seconds
+
+
+class _FeedHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        feed = self.server.feed
+        self.server.requests += 1
+        if feed['status'] != 200:
+            self.send_response(feed['status'])
+            self.send_header('Retry-After', '120')
+            self.end_headers()
+            return
+        etag = '"%s"' % feed['version']
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = 'date,office,votes\n2012-11-06,President,%s\n' % feed['version']
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'max-age=%s' % feed['max_age'])
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHeaders(TestCase):
+
+    def test_max_age(self):
+        "max-age should be read from Cache-Control"
+        self.assertEqual(max_age('public, max-age=30'), 30)
+        self.assertEqual(max_age('no-cache'), 0)
+        self.assertEqual(max_age(None), 0)
+
+    def test_retry_after(self):
+        "Retry-After should accept seconds or an HTTP date"
+        self.assertEqual(retry_after('120', 0), 120)
+        self.assertEqual(retry_after('Thu, 01 Jan 1970 00:01:00 GMT', 20), 40)
+        self.assertEqual(retry_after('garbage', 0), 0)
+
+
+class TestPollScheduler(TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), _FeedHandler)
+        self.server.feed = {'status': 200, 'version': 1, 'max_age': 0}
+        self.server.requests = 0
+        self.thread = Thread(target=self.server.serve_forever, args=(0.01,))
+        self.thread.daemon = True
+        self.thread.start()
+        self.tmp = tempfile.mkdtemp()
+        self.clock = FakeClock()
+        self.changes = []
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp)
+
+    def feed(self, name='results', **kwargs):
+        url = 'http://%s:%s/results.csv' % self.server.server_address
+        return Feed(name, url, join(self.tmp, name + '.csv'), **kwargs)
+
+    def scheduler(self, feeds, **kwargs):
+        kwargs.setdefault('jitter', 0)
+        return PollScheduler(feeds, on_change=self.changes.append, clock=self.clock, **kwargs)
+
+    def test_unchanged_feed_backs_off(self):
+        "Polls that find nothing new should stretch the interval up to max_interval"
+        feed = self.feed(initial_interval=10, max_interval=40, backoff=2)
+        scheduler = self.scheduler([feed])
+        scheduler.run(max_polls=5)
+        self.assertEqual(feed.changes, 1)
+        self.assertEqual(feed.interval, 40)
+        self.assertEqual(len(self.changes), 1)
+
+    def test_changes_tighten_interval(self):
+        "A burst of changes should halve the interval down to min_interval"
+        feed = self.feed(initial_interval=60, min_interval=10)
+        scheduler = self.scheduler([feed])
+        for version in range(1, 5):
+            self.server.feed['version'] = version
+            scheduler.run(max_polls=1)
+        self.assertEqual(feed.changes, 4)
+        self.assertEqual(feed.interval, 10)
+
+    def test_conditional_requests(self):
+        "Unchanged polls should send the ETag and get a 304"
+        feed = self.feed()
+        scheduler = self.scheduler([feed])
+        scheduler.run(max_polls=2)
+        self.assertEqual(feed.etag, '"1"')
+        self.assertEqual(feed.polls, 2)
+        self.assertEqual(feed.changes, 1)
+
+    def test_cache_control_sets_floor(self):
+        "The next poll should wait at least max-age seconds"
+        self.server.feed['max_age'] = 90
+        feed = self.feed(initial_interval=20)
+        scheduler = self.scheduler([feed])
+        start = self.clock.time()
+        scheduler.run(max_polls=1)
+        self.assertEqual(feed.next_poll - start, 90)
+
+    def test_retry_after_honored(self):
+        "A 503 with Retry-After should delay the next poll"
+        self.server.feed['status'] = 503
+        feed = self.feed(initial_interval=20)
+        scheduler = self.scheduler([feed])
+        start = self.clock.time()
+        scheduler.run(max_polls=1)
+        self.assertEqual(feed.errors, 1)
+        self.assertEqual(feed.next_poll - start, 120)
+        self.assertEqual(self.changes, [])
+
+    def test_global_budget(self):
+        "Requests across all feeds should not exceed the budget"
+        feeds = [self.feed('feed%s' % i, initial_interval=1, min_interval=1, max_interval=1) for i in range(5)]
+        scheduler = self.scheduler(feeds, budget=10, budget_window=60.0)
+        start = self.clock.time()
+        scheduler.run(until=start + 120)
+        # A full bucket to start, then 10 more per minute
+        self.assertTrue(scheduler.requests <= 30)
+        self.assertTrue(scheduler.requests >= 25)
+        self.assertEqual(self.server.requests, scheduler.requests)
+
+    def test_jitter_spreads_polls(self):
+        "Jittered waits should stay within the jitter range"
+        feed = self.feed(initial_interval=100, min_interval=100, backoff=1)
+        scheduler = self.scheduler([feed], jitter=0.2, rng=random.Random(1))
+        waits = []
+        for i in range(5):
+            scheduler.run(max_polls=1)
+            waits.append(feed.next_poll - self.clock.time())
+        self.assertTrue(all(80 <= wait <= 120 for wait in waits))
+        self.assertTrue(len(set(waits)) > 1)
+
+    def test_jitter_never_undercuts_retry_after(self):
+        "Jitter should never bring the next poll before Retry-After expires"
+        self.server.feed['status'] = 503
+        feed = self.feed(initial_interval=100, max_interval=100, backoff=1)
+        scheduler = self.scheduler([feed], jitter=0.2, rng=random.Random(1))
+        for i in range(10):
+            scheduler.run(max_polls=1)
+            self.assertTrue(feed.next_poll - self.clock.time() >= 120)
+
+    def test_errors_reported_and_polling_continues(self):
+        "Failures in fetch or on_change should be reported without stopping the scheduler"
+        errors = []
+        fetches = []
+
+        def fetch(feed):
+            fetches.append(feed)
+            if len(fetches) == 1:
+                raise BadStatusLine('')
+            return 200, {}
+
+        def publish(feed):
+            raise ValueError('disk full')
+
+        with open(join(self.tmp, 'results.csv'), 'wb') as fh:
+            fh.write('date,office,votes\n')
+        feed = self.feed()
+        scheduler = PollScheduler([feed], on_change=publish, clock=self.clock, fetch=fetch, jitter=0,
+                                  on_error=lambda feed, exc: errors.append(exc.__class__.__name__))
+        self.assertEqual(scheduler.run(max_polls=3), 3)
+        self.assertEqual(errors, ['BadStatusLine', 'ValueError'])
+        self.assertEqual(feed.changes, 1)
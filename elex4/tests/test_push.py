@@ -0,0 +1,155 @@
+from threading import Thread
+from unittest import TestCase
+import json
+import socket
+import time
+
+from elex4.lib.push import PushServer, _SSEClient
+
+
+def race_summary(votes):
+    return {
+        'date': '2012-11-06',
+        'office': 'President',
+        'district': '',
+        'all_votes': votes,
+        'candidates': [],
+    }
+
+
+class TestPushServer(TestCase):
+
+    def setUp(self):
+        self.server = PushServer(('127.0.0.1', 0), max_pending=2)
+        self.thread = Thread(target=self.server.serve_forever, args=(0.01,))
+        self.thread.daemon = True
+        self.thread.start()
+        self.sockets = []
+
+    def tearDown(self):
+        for sock in self.sockets:
+            sock.close()
+        self.server.shutdown()
+        self.thread.join()
+
+    def connect(self, path='/events'):
+        sock = socket.create_connection(self.server.socket.getsockname())
+        sock.settimeout(2)
+        sock.sendall("GET %s HTTP/1.1\r\nHost: localhost\r\n\r\n" % path)
+        self.sockets.append(sock)
+        fh = sock.makefile('rb')
+        while fh.readline() != '\r\n':
+            pass
+        self.wait_for(lambda: len(self.server.clients) == len(self.sockets))
+        return fh
+
+    def read_event(self, fh):
+        lines = []
+        while True:
+            line = fh.readline()
+            if line == '\n':
+                break
+            lines.append(line)
+        data = [line[len('data: '):] for line in lines if line.startswith('data: ')][0]
+        return json.loads(data)
+
+    def wait_for(self, condition):
+        for i in range(200):
+            if condition():
+                return
+            time.sleep(0.01)
+        self.fail("Timed out waiting for server")
+
+    def test_changed_races_pushed(self):
+        "Subscribers should receive an event for each changed race"
+        fh = self.connect()
+        self.server.publish({'President': race_summary(10)})
+        event = self.read_event(fh)
+        self.assertEqual(event['race'], 'President')
+        self.assertEqual(event['summary']['all_votes'], 10)
+
+    def test_unchanged_races_not_republished(self):
+        "Publishing the same summary twice should only push changed races"
+        self.assertEqual(self.server.publish({'President': race_summary(10)}), ['President'])
+        self.assertEqual(self.server.publish({'President': race_summary(10)}), [])
+
+    def test_subscription_filters_races(self):
+        "Clients subscribed to a subset of races should only receive those races"
+        fh = self.connect('/events?races=Senate-1')
+        self.server.publish({'President': race_summary(10), 'Senate-1': race_summary(5)})
+        self.assertEqual(self.read_event(fh)['race'], 'Senate-1')
+
+    def test_new_clients_receive_latest(self):
+        "Clients connecting after a publish should get the latest event per race"
+        self.server.publish({'President': race_summary(10)})
+        self.server.publish({'President': race_summary(20)})
+        fh = self.connect()
+        self.assertEqual(self.read_event(fh)['summary']['all_votes'], 20)
+
+
+class TestSlowClients(TestCase):
+
+    def setUp(self):
+        # No event loop runs here, so queued events are never delivered
+        self.server = PushServer(('127.0.0.1', 0), max_pending=2)
+        self.sockets = []
+
+    def tearDown(self):
+        self.server.shutdown()
+        for sock in self.sockets:
+            sock.close()
+
+    def subscriber(self):
+        sock, other = socket.socketpair()
+        self.sockets.append(other)
+        client = _SSEClient(sock, self.server)
+        self.server.subscribe(client)
+        return client
+
+    def test_message_encoded_once(self):
+        "Every subscriber should share the same encoded message"
+        client = self.subscriber()
+        other = self.subscriber()
+        self.server.publish({'President': race_summary(10)})
+        self.assertTrue(client.pending['President'] is other.pending['President'])
+
+    def test_pending_events_coalesced(self):
+        "A newer event should replace an undelivered event for the same race"
+        client = self.subscriber()
+        self.server.publish({'President': race_summary(10)})
+        self.server.publish({'President': race_summary(20)})
+        self.assertEqual(len(client.pending), 1)
+        self.assertTrue('"all_votes": 20' in client.pending['President'])
+
+    def test_client_too_far_behind_dropped(self):
+        "Clients with more than max_pending undelivered updates replaced should be dropped"
+        client = self.subscriber()
+        races = ['President', 'Senate-1', 'Senate-2']
+        self.server.publish(dict((race_key, race_summary(1)) for race_key in races))
+        self.assertFalse(client.overflowed)
+        self.server.publish(dict((race_key, race_summary(2)) for race_key in races))
+        self.assertTrue(client.overflowed)
+        client.handle_write()
+        self.assertFalse(client in self.server.clients)
+
+    def test_many_races_not_dropped(self):
+        "Following more races than max_pending shouldn't get a client dropped on connect or publish"
+        races = ['Senate-%s' % district for district in range(10)]
+        self.server.publish(dict((race_key, race_summary(1)) for race_key in races))
+        client = self.subscriber()
+        self.assertEqual(len(client.pending), 10)
+        self.server.publish(dict((race_key, race_summary(2)) for race_key in races))
+        self.assertFalse(client.overflowed)
+        self.assertTrue('"all_votes": 2' in client.pending['Senate-9'])
+
+    def test_caught_up_client_starts_over(self):
+        "Delivering every pending event should reset a client's count of replaced updates"
+        client = self.subscriber()
+        for votes in (1, 2, 3):
+            self.server.publish({'President': race_summary(votes)})
+        self.assertEqual(client.superseded, 2)
+        client.handle_write()
+        self.assertEqual(client.superseded, 0)
+        self.server.publish({'President': race_summary(4)})
+        self.server.publish({'President': race_summary(5)})
+        self.assertFalse(client.overflowed)
@@ -0,0 +1,56 @@
+from os.path import dirname, join
+from unittest import TestCase
+
+from elex4.lib.rcv import RankedChoiceRace, parse_ballots
+
+
+class TestParseBallots(TestCase):
+
+    def setUp(self):
+        path = join(dirname(__file__), 'sample_ballots.csv')
+        self.races = parse_ballots(path)
+
+    def test_races_keyed_by_office_and_district(self):
+        "Ballots should be grouped into races by office and district"
+        self.assertEqual(sorted(self.races.keys()), ['Council-1', 'Mayor'])
+
+    def test_ballot_count(self):
+        "Every ballot row should be counted once"
+        self.assertEqual(self.races['Mayor'].total_ballots, 11)
+
+
+class TestRankedChoiceRace(TestCase):
+
+    def setUp(self):
+        path = join(dirname(__file__), 'sample_ballots.csv')
+        self.race = parse_ballots(path)['Mayor']
+        self.rounds = self.race.tabulate()
+
+    def test_first_round_counts_top_choices(self):
+        "First round should tally each ballot's first choice"
+        expected = {'Smith, Joe': 4, 'Doe, Jane': 4, 'Roe, Rick': 3}
+        self.assertEqual(self.rounds[0]['tallies'], expected)
+
+    def test_last_place_eliminated(self):
+        "Candidate with fewest votes should be eliminated when no one has a majority"
+        self.assertEqual(self.rounds[0]['eliminated'], 'Roe, Rick')
+
+    def test_eliminated_ballots_redistributed(self):
+        "Ballots for an eliminated candidate should move to their next choice or exhaust"
+        expected = {'Smith, Joe': 4, 'Doe, Jane': 6}
+        self.assertEqual(self.rounds[1]['tallies'], expected)
+        self.assertEqual(self.rounds[1]['exhausted'], 1)
+
+    def test_majority_winner(self):
+        "Tabulation should stop once a candidate has a majority of continuing votes"
+        self.assertEqual(len(self.rounds), 2)
+        self.assertEqual(self.race.winner, 'Doe, Jane')
+
+    def test_duplicate_rankings_ignored(self):
+        "Ranking the same candidate twice should only count the first ranking"
+        race = RankedChoiceRace('2012-11-06', 'Mayor', '')
+        race.add_ballot(['Doe, Jane', 'Doe, Jane', 'Smith, Joe'])
+        race.add_ballot(['Smith, Joe', 'Doe, Jane'])
+        race.add_ballot(['Roe, Rick', 'Doe, Jane'])
+        rounds = race.tabulate()
+        self.assertEqual(rounds[1]['tallies'], {'Doe, Jane': 2, 'Smith, Joe': 1})
@@ -0,0 +1,50 @@
+from os.path import dirname, join
+from unittest import TestCase
+
+from elex4.lib.parser import parse_and_clean
+from elex4.lib.regions import Crosswalk, load_crosswalk, reaggregate
+from elex4.lib.summary import summarize
+
+
+class TestRegions(TestCase):
+
+    def setUp(self):
+        self.results = parse_and_clean(join(dirname(__file__), 'sample_results.json'))
+        self.crosswalk = load_crosswalk(join(dirname(__file__), 'sample_crosswalk.csv'))
+
+    def test_weighted_allocation(self):
+        "Split counties should contribute votes to each region by weight"
+        totals = self.crosswalk.apply(self.results['President'])
+        north, south = totals[('GOP', 'Smith, Joe')]
+        self.assertEqual(self.crosswalk.regions, ['North', 'South'])
+        self.assertAlmostEqual(north, 12.0)
+        self.assertAlmostEqual(south, 3.0)
+
+    def test_regional_races_and_winners(self):
+        "Regional races should be summarized with winners like statewide races"
+        by_region = reaggregate(self.results, self.crosswalk)
+        summary = summarize(by_region['North'])
+        votes = dict((cand['last_name'], (cand['votes'], cand['winner'])) for cand in summary['President']['candidates'])
+        self.assertEqual(votes, {'Doe': (13, 'X'), 'Smith': (12, '')})
+        self.assertEqual(sorted(by_region['South'].keys()), ['President'])
+
+    def test_unmapped_counties_reported(self):
+        "Counties missing from the crosswalk should be reported"
+        crosswalk = Crosswalk([('Some County', 'North', 1)])
+        reaggregate(self.results, crosswalk)
+        self.assertEqual(crosswalk.unmapped, set(['Another County']))
+
+    def test_zero_vote_candidates_kept(self):
+        "Candidates with no votes in a region should still be in its race"
+        crosswalk = Crosswalk([('Some County', 'North', 1), ('Another County', 'North', 0.001),
+                               ('Another County', 'South', 0.001)])
+        by_region = reaggregate(self.results, crosswalk)
+        south = by_region['South']['President']
+        self.assertEqual(sorted(cand.votes for cand in south.candidates.values()), [0, 0])
+        # Summarizing needs at least two candidates per race
+        self.assertEqual(len(summarize(by_region['South'])['President']['candidates']), 2)
+
+    def test_races_skipped_in_unmapped_regions(self):
+        "Races should only appear in regions their counties map to"
+        crosswalk = Crosswalk([('Some County', 'North', 1), ('Elsewhere County', 'West', 1)])
+        self.assertEqual(sorted(reaggregate(self.results, crosswalk)), ['North'])
@@ -0,0 +1,56 @@
+from os.path import dirname, join
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+
+from elex4.lib.replay import ReplayHarness, ReplayServer, load_snapshots, percentile
+
+
+class TestReplay(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.snapshot_dir = join(self.tmp, 'snapshots')
+        self.work_dir = join(self.tmp, 'work')
+        os.makedirs(self.snapshot_dir)
+        os.makedirs(self.work_dir)
+        with open(join(dirname(__file__), 'sample_results.csv'), 'rb') as fh:
+            lines = fh.readlines()
+        # Each snapshot adds votes to the last row
+        header, rows = lines[0], lines[1:]
+        for i, offset in enumerate([0, 60, 120]):
+            last = rows[-1].rstrip('\r\n').rsplit(',', 1)
+            rows[-1] = '%s,%s\n' % (last[0], int(last[1]) + i)
+            with open(join(self.snapshot_dir, '%04d_poll.csv' % offset), 'wb') as fh:
+                fh.write(header + ''.join(rows))
+        open(join(self.snapshot_dir, 'README'), 'wb').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_load_snapshots(self):
+        "Snapshots should be ordered by offset and other files ignored"
+        snapshots = load_snapshots(self.snapshot_dir)
+        self.assertEqual([offset for offset, path in snapshots], [0, 60, 120])
+
+    def test_percentile(self):
+        "Percentiles should use the nearest rank"
+        values = range(1, 101)
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 50), None)
+
+    def test_replay_reports_latency(self):
+        "Every snapshot should be published and reported"
+        server = ReplayServer(load_snapshots(self.snapshot_dir), speedup=600)
+        server.start()
+        try:
+            report = ReplayHarness(server, self.work_dir, poll_interval=5).run()
+        finally:
+            server.stop()
+        self.assertEqual(report['snapshots_published'] + report['snapshots_missed'], 3)
+        self.assertTrue(report['polls'] >= report['snapshots_published'])
+        self.assertTrue(report['latency']['p50'] >= 0)
+        self.assertTrue(report['latency']['max'] < 1)
+        self.assertTrue(report['stages']['parse'] is not None)
@@ -0,0 +1,143 @@
+from StringIO import StringIO
+from os.path import dirname, join
+from unittest import TestCase
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+from elex4.lib.shadow import ENGINES, ShadowRunner, compare_summaries, load_log, normalize, run_engine
+
+
+def inflated_summarize(results):
+    # A "faster" engine with a bug: one extra vote for every candidate
+    from elex4.lib.summary import summarize
+    summary = summarize(results)
+    for race in summary.values():
+        for cand in race['candidates']:
+            cand['votes'] += 1
+    return summary
+
+
+def failing_summarize(results):
+    raise RuntimeError("engine crashed")
+
+
+def dying_summarize(results):
+    # The worker process dies without reporting back, like a segfault
+    os._exit(1)
+
+
+TEST_ENGINES = {
+    'inflated': ('elex4.lib.parser:parse_and_clean', 'elex4.tests.test_shadow:inflated_summarize'),
+    'failing': ('elex4.lib.parser:parse_and_clean', 'elex4.tests.test_shadow:failing_summarize'),
+    'dying': ('elex4.lib.parser:parse_and_clean', 'elex4.tests.test_shadow:dying_summarize'),
+}
+
+
+class TestShadow(TestCase):
+
+    def setUp(self):
+        # Registered before any runner starts, so its worker process sees them too
+        ENGINES.update(TEST_ENGINES)
+        self.tmp = tempfile.mkdtemp()
+        self.path = join(dirname(__file__), 'sample_results.csv')
+        self.log_path = join(self.tmp, 'shadow.jsonl')
+        self.runners = []
+
+    def tearDown(self):
+        for runner in self.runners:
+            runner.close()
+        for engine in TEST_ENGINES:
+            del ENGINES[engine]
+        shutil.rmtree(self.tmp)
+
+    def runner(self, candidate, sample_rate=1.0, **kwargs):
+        kwargs.setdefault('log_path', self.log_path)
+        runner = ShadowRunner(candidate, sample_rate=sample_rate, rng=random.Random(0), **kwargs)
+        self.runners.append(runner)
+        return runner
+
+    def test_engines_agree(self):
+        "elex2, elex3 and elex4 should produce the same normalized summary"
+        expected, elapsed = run_engine('elex4', self.path)
+        for engine in ('elex2', 'elex3'):
+            summary, elapsed = run_engine(engine, self.path)
+            self.assertEqual(compare_summaries(expected, summary), [])
+
+    def test_divergence_reported(self):
+        "Differences should be reported race by race and candidate by candidate"
+        primary, elapsed = run_engine('elex4', self.path)
+        candidate = dict(primary)
+        candidate['President'] = dict(primary['President'], all_votes=0)
+        candidate['Mayor'] = primary['President']
+        differences = compare_summaries(primary, candidate)
+        self.assertEqual([(diff['race'], diff['field']) for diff in differences],
+                         [('Mayor', 'race'), ('President', 'all_votes')])
+
+    def test_shadow_run_logged(self):
+        "A sampled poll should log latency and no differences for an identical engine"
+        runner = self.runner('elex3')
+        summary = runner.run(self.path)
+        self.assertTrue('President' in summary)
+        self.assertTrue(runner.wait(10))
+        records = load_log(self.log_path)
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['differences'], [])
+        self.assertEqual(records[0]['error'], None)
+        self.assertTrue(records[0]['candidate_seconds'] >= 0)
+
+    def test_shadow_divergence_logged(self):
+        "Divergent candidate output should be logged without changing the published summary"
+        runner = self.runner('inflated')
+        summary = runner.run(self.path)
+        runner.wait(10)
+        record = load_log(self.log_path)[0]
+        self.assertTrue(len(record['differences']) > 0)
+        self.assertEqual(normalize(summary), run_engine('elex4', self.path)[0])
+
+    def test_shadow_errors_logged(self):
+        "A crashing candidate should be logged, not raised"
+        runner = self.runner('failing')
+        runner.run(self.path)
+        runner.wait(10)
+        self.assertEqual(load_log(self.log_path)[0]['error'], 'RuntimeError: engine crashed')
+
+    def test_sampling(self):
+        "Only the sampled fraction of polls should be shadowed"
+        runner = self.runner('elex3', sample_rate=0.0)
+        runner.run(self.path)
+        self.assertEqual(runner.submitted, 0)
+
+    def test_busy_shadow_skipped(self):
+        "Polls arriving while a shadow is running should be skipped, not queued"
+        runner = self.runner('elex3')
+        runner.run(self.path)
+        runner.run(self.path)
+        runner.wait(10)
+        self.assertEqual(runner.submitted + runner.skipped_busy, 2)
+
+    def test_lost_worker_logged_and_replaced(self):
+        "A shadow whose worker dies should be logged as lost, and later polls shadowed again"
+        runner = self.runner('dying', timeout=0.5)
+        runner.run(self.path)
+        self.assertTrue(runner.wait(10))
+        self.assertTrue(load_log(self.log_path)[0]['error'].startswith('Lost'))
+        runner.run(self.path)
+        self.assertEqual(runner.submitted, 2)
+        self.assertTrue(runner.wait(10))
+
+    def test_failed_logging_clears_busy(self):
+        "A shadow whose record can't be logged shouldn't block later polls"
+        runner = self.runner('elex3', log_path=join(self.tmp, 'missing', 'shadow.jsonl'))
+        stderr, sys.stderr = sys.stderr, StringIO()
+        try:
+            runner.run(self.path)
+            self.assertTrue(runner.wait(10))
+            runner.run(self.path)
+            self.assertTrue(runner.wait(10))
+        finally:
+            sys.stderr = stderr
+        self.assertEqual(runner.submitted, 2)
+        self.assertEqual(runner.skipped_busy, 0)
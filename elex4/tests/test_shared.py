@@ -0,0 +1,69 @@
+from os.path import dirname, join
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+
+from elex4.lib.parser import parse_and_clean
+from elex4.lib.shared import SharedResults, publish
+from elex4.lib.summary import summarize
+
+
+class TestSharedResults(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = join(self.directory, 'results')
+        self.results = parse_and_clean(join(dirname(__file__), 'sample_results.json'))
+        publish(self.results, 1, self.path)
+        self.shared = SharedResults(self.path)
+
+    def tearDown(self):
+        self.shared.close()
+        shutil.rmtree(self.directory)
+
+    def test_race_lookup(self):
+        "Readers should see the published race and candidate totals"
+        race = self.shared.race('Senate-1')
+        self.assertEqual(race.total_votes, 7)
+        self.assertEqual(race.district, '1')
+        self.assertRaises(KeyError, self.shared.race, 'Governor')
+
+    def test_county_results(self):
+        "County results should be readable from the shared file"
+        race = self.shared.race('President')
+        smith = race.candidates[('GOP', 'Smith, Joe')]
+        self.assertEqual(dict(smith.county_results.items()), {'Some County': 10, 'Another County': 5})
+        self.assertEqual(smith.county_results['Another County'], 5)
+
+    def test_summary_matches(self):
+        "Summaries from shared results should match summaries from parsed results"
+        self.assertEqual(summarize(self.shared.results()), summarize(self.results))
+
+    def test_refresh_picks_up_new_version(self):
+        "Readers should switch to a newly published version on refresh"
+        old_race = self.shared.race('President')
+        self.results['President'].add_result({'party': 'GOP', 'candidate': 'Smith, Joe', 'county': 'Third County', 'votes': 9})
+        publish(self.results, 2, self.path)
+        self.assertEqual(self.shared.version, 1)
+        self.assertTrue(self.shared.refresh())
+        self.assertFalse(self.shared.refresh())
+        self.assertEqual(self.shared.version, 2)
+        self.assertEqual(self.shared.race('President').total_votes, 40)
+        # Races read before the swap keep their consistent old view
+        self.assertEqual(len(old_race.candidates[('GOP', 'Smith, Joe')].county_results), 2)
+
+    def test_readable_from_other_process(self):
+        "A separate process should be able to map and read the published results"
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.close(read_fd)
+                os.write(write_fd, str(SharedResults(self.path).race('President').total_votes))
+            finally:
+                os._exit(0)
+        os.close(write_fd)
+        os.waitpid(pid, 0)
+        self.assertEqual(os.read(read_fd, 100), '31')
+        os.close(read_fd)
@@ -0,0 +1,86 @@
+from os.path import dirname, join
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+
+from elex4.lib.parser import add_row, make_race_key, parse_and_clean
+from elex4.lib.spill import ExternalAggregator, row_size, summarize_file
+from elex4.lib.summary import summarize
+
+
+def fake_rows(num_races, num_counties):
+    for county in range(num_counties):
+        for race in range(num_races):
+            for cand, party in [('Smith, Joe', 'GOP'), ('Doe, Jane', 'DEM')]:
+                row = {
+                    'date': '2012-11-06',
+                    'office': 'Office %s' % race,
+                    'district': '',
+                    'county': 'County %s' % county,
+                    'candidate': cand,
+                    'party': party,
+                    'votes': race + county + len(party),
+                }
+                yield make_race_key(row['office'], row['district']), row
+
+
+def by_key(items):
+    return dict((race_key, summary) for race_key, summary in items)
+
+
+class TestExternalAggregator(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def expected(self, rows):
+        results = {}
+        for race_key, row in rows:
+            add_row(results, race_key, dict(row))
+        return summarize(results)
+
+    def test_small_input_stays_in_memory(self):
+        "Input within the budget should be summarized without spilling"
+        aggregator = ExternalAggregator(memory_budget=10 * 1024 * 1024, tmp_dir=self.tmp)
+        summary = by_key(aggregator.summarize(fake_rows(5, 3)))
+        self.assertEqual(aggregator.spills, 0)
+        self.assertEqual(summary, self.expected(fake_rows(5, 3)))
+
+    def test_spilled_summary_matches(self):
+        "Spilling to partitions should produce the same summary as in-memory aggregation"
+        budget = row_size(*next(fake_rows(1, 1))) * 50
+        aggregator = ExternalAggregator(memory_budget=budget, partitions=8, tmp_dir=self.tmp)
+        summary = by_key(aggregator.summarize(fake_rows(20, 30)))
+        self.assertTrue(aggregator.spills > 1)
+        self.assertEqual(summary, self.expected(fake_rows(20, 30)))
+
+    def test_budget_honored(self):
+        "Buffered rows should never exceed the budget by more than one row"
+        row_bytes = row_size(*next(fake_rows(1, 1)))
+        budget = row_bytes * 50
+        aggregator = ExternalAggregator(memory_budget=budget, partitions=4, tmp_dir=self.tmp)
+        list(aggregator.summarize(fake_rows(10, 30)))
+        self.assertTrue(aggregator.peak_bytes <= budget + row_bytes * 2)
+
+    def test_oversized_partitions_resplit(self):
+        "Partitions still over the budget should be split again and still summarize correctly"
+        budget = row_size(*next(fake_rows(1, 1))) * 40
+        aggregator = ExternalAggregator(memory_budget=budget, partitions=2, tmp_dir=self.tmp)
+        summary = by_key(aggregator.summarize(fake_rows(16, 10)))
+        self.assertEqual(summary, self.expected(fake_rows(16, 10)))
+
+    def test_spill_files_removed(self):
+        "Spill files should be cleaned up once the summary is consumed"
+        budget = row_size(*next(fake_rows(1, 1))) * 10
+        list(ExternalAggregator(memory_budget=budget, tmp_dir=self.tmp).summarize(fake_rows(5, 10)))
+        self.assertEqual(os.listdir(self.tmp), [])
+
+    def test_summarize_file(self):
+        "Summarizing a file should match parse_and_clean and summarize"
+        path = join(dirname(__file__), 'sample_results.csv')
+        summary = by_key(summarize_file(path, memory_budget=1, partitions=3, tmp_dir=self.tmp))
+        self.assertEqual(summary, summarize(parse_and_clean(path)))
@@ -0,0 +1,201 @@
+from os.path import join
+from unittest import TestCase
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+from elex4.lib.stages import Stage, StageRunner, module_closure
+
+# Stage name -> number of times it ran, shared by the module-level stage functions
+calls = {}
+lock = threading.Lock()
+
+
+def record(name):
+    with lock:
+        calls[name] = calls.get(name, 0) + 1
+
+
+def copy_upper(inputs, outputs):
+    record('upper')
+    with open(inputs[0], 'rb') as fh:
+        data = fh.read()
+    with open(outputs[0], 'wb') as fh:
+        fh.write(data.upper())
+
+
+def write_length(inputs, outputs):
+    record('length')
+    with open(inputs[0], 'rb') as fh:
+        data = fh.read()
+    with open(outputs[0], 'wb') as fh:
+        fh.write(str(len(data)))
+
+
+def write_reversed(inputs, outputs):
+    record('reversed')
+    with open(inputs[0], 'rb') as fh:
+        data = fh.read()
+    with open(outputs[0], 'wb') as fh:
+        fh.write(data[::-1])
+
+
+def wait_for_partner(inputs, outputs):
+    # Deadlocks unless both writers run at the same time
+    barrier.wait()
+    write_length(inputs, outputs)
+
+
+def wait_for_partner_reversed(inputs, outputs):
+    barrier.wait()
+    write_reversed(inputs, outputs)
+
+
+class _Barrier(object):
+
+    def __init__(self, parties):
+        self.parties = parties
+        self.count = 0
+        self.cond = threading.Condition()
+
+    def wait(self):
+        with self.cond:
+            self.count += 1
+            self.cond.notify_all()
+            while self.count < self.parties:
+                if not self.cond.wait(2) and self.count < self.parties:
+                    raise RuntimeError("Stages did not run in parallel")
+
+
+barrier = None
+
+
+class TestStageRunner(TestCase):
+
+    def setUp(self):
+        calls.clear()
+        self.tmp = tempfile.mkdtemp()
+        self.source = self.path('source.txt')
+        with open(self.source, 'wb') as fh:
+            fh.write('results')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def path(self, name):
+        return join(self.tmp, name)
+
+    def runner(self, length_func=write_length, reversed_func=write_reversed):
+        stages = [
+            Stage('length', length_func, inputs=[self.path('upper.txt')], outputs=[self.path('length.txt')]),
+            Stage('reversed', reversed_func, inputs=[self.path('upper.txt')], outputs=[self.path('reversed.txt')]),
+            Stage('upper', copy_upper, inputs=[self.source], outputs=[self.path('upper.txt')]),
+        ]
+        return StageRunner(stages, self.path('stages.json'))
+
+    def test_dependency_order(self):
+        "Stages should run after the stages producing their inputs"
+        runner = self.runner()
+        self.assertEqual([[stage.name for stage in level] for level in runner.levels],
+                         [['upper'], ['length', 'reversed']])
+        runner.run()
+        with open(self.path('reversed.txt'), 'rb') as fh:
+            self.assertEqual(fh.read(), 'STLUSER')
+
+    def test_unchanged_inputs_are_skipped(self):
+        "A second run with the same inputs should skip every stage"
+        self.runner().run()
+        status = self.runner().run()
+        self.assertEqual(set(status.values()), set(['skipped']))
+        self.assertEqual(calls, {'upper': 1, 'length': 1, 'reversed': 1})
+
+    def test_changed_input_reruns_dependents(self):
+        "Changing the source should re-run stages downstream of it"
+        self.runner().run()
+        with open(self.source, 'wb') as fh:
+            fh.write('new results')
+        status = self.runner().run()
+        self.assertEqual(status, {'upper': 'ran', 'length': 'ran', 'reversed': 'ran'})
+
+    def test_same_content_skips_dependents(self):
+        "A stage whose output is byte-for-byte unchanged should not re-run later stages"
+        self.runner().run()
+        with open(self.source, 'wb') as fh:
+            fh.write('RESULTS')
+        status = self.runner().run()
+        self.assertEqual(status, {'upper': 'ran', 'length': 'skipped', 'reversed': 'skipped'})
+
+    def test_changed_code_reruns_stage(self):
+        "Swapping one stage's code should only re-run that stage"
+        self.runner().run()
+        status = self.runner(length_func=write_reversed).run()
+        self.assertEqual(status, {'upper': 'skipped', 'length': 'ran', 'reversed': 'skipped'})
+
+    def test_missing_output_reruns_stage(self):
+        "A stage whose output was deleted should re-run"
+        self.runner().run()
+        os.remove(self.path('length.txt'))
+        status = self.runner().run()
+        self.assertEqual(status['length'], 'ran')
+        self.assertEqual(status['reversed'], 'skipped')
+
+    def test_independent_stages_run_in_parallel(self):
+        "Stages in the same level should run concurrently"
+        global barrier
+        barrier = _Barrier(2)
+        self.runner(wait_for_partner, wait_for_partner_reversed).run()
+        self.assertEqual(calls['length'], 1)
+        self.assertEqual(calls['reversed'], 1)
+
+    def test_cycle_is_rejected(self):
+        "Stages that depend on each other should raise ValueError"
+        stages = [
+            Stage('a', copy_upper, inputs=[self.path('b.txt')], outputs=[self.path('a.txt')]),
+            Stage('b', copy_upper, inputs=[self.path('a.txt')], outputs=[self.path('b.txt')]),
+        ]
+        self.assertRaises(ValueError, StageRunner, stages, self.path('stages.json'))
+
+
+class TestStageModules(TestCase):
+
+    def setUp(self):
+        calls.clear()
+        self.tmp = tempfile.mkdtemp()
+        # A throwaway package: core uses helpers
+        package = join(self.tmp, 'stagedeps')
+        os.mkdir(package)
+        self.write(join(package, '__init__.py'), '')
+        self.write(join(package, 'helpers.py'), 'def shout(text):\n    return text.upper()\n')
+        self.write(join(package, 'core.py'), 'import json\nfrom stagedeps.helpers import shout\n')
+        sys.path.insert(0, self.tmp)
+        self.source = join(self.tmp, 'source.txt')
+        self.write(self.source, 'results')
+
+    def tearDown(self):
+        sys.path.remove(self.tmp)
+        for name in ('stagedeps', 'stagedeps.helpers', 'stagedeps.core'):
+            sys.modules.pop(name, None)
+        shutil.rmtree(self.tmp)
+
+    def write(self, path, data):
+        with open(path, 'wb') as fh:
+            fh.write(data)
+
+    def runner(self):
+        stages = [Stage('upper', copy_upper, inputs=[self.source], outputs=[join(self.tmp, 'upper.txt')],
+                        modules=['stagedeps.core'])]
+        return StageRunner(stages, join(self.tmp, 'stages.json'))
+
+    def test_module_closure(self):
+        "Modules used from the same package should be included, other packages left out"
+        names = [module.__name__ for module in module_closure(['stagedeps.core'])]
+        self.assertEqual(names, ['stagedeps.core', 'stagedeps.helpers'])
+
+    def test_changed_module_reruns_stage(self):
+        "Editing a module a stage depends on, even indirectly, should re-run the stage"
+        self.runner().run()
+        self.assertEqual(self.runner().run(), {'upper': 'skipped'})
+        self.write(join(self.tmp, 'stagedeps', 'helpers.py'), 'def shout(text):\n    return text.upper() + "!"\n')
+        self.assertEqual(self.runner().run(), {'upper': 'ran'})
@@ -1,9 +1,11 @@
 from os.path import dirname, join
 from unittest import TestCase
 import json
+import os
+import tempfile
 
 from elex4.lib.models import Race
-from elex4.lib.summary import summarize
+from elex4.lib.summary import summarize, write_summary
 
 
 class TestSummaryBase(TestCase):
@@ -41,6 +43,19 @@ class TestSummaryResults(TestSummaryBase):
         smith = [cand for cand in self.race['candidates'] if cand['last_name'] == 'Smith'][0]
         self.assertEqual(smith['winner'], '')
 
+    def test_write_summary_from_pairs(self):
+        "A summary given as (race key, race summary) pairs should be written like a dictionary"
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            write_summary({'President': self.race}, path)
+            expected = open(path, 'rb').read()
+            write_summary(iter([('President', self.race)]), path)
+            self.assertEqual(open(path, 'rb').read(), expected)
+            self.assertEqual(len(expected.splitlines()), 3)
+        finally:
+            os.remove(path)
+
 
 class TestTieRace(TestSummaryBase):
 
@@ -0,0 +1,47 @@
+from os.path import dirname, join
+from unittest import TestCase
+
+from elex4.lib.parser import parse_and_clean
+from elex4.lib.turnout import count_registered, county_votes, join_turnout
+
+
+class TestTurnout(TestCase):
+
+    def setUp(self):
+        self.results = parse_and_clean(join(dirname(__file__), 'sample_results.json'))
+
+    def test_county_votes_index(self):
+        "Build side should total each race's votes by county"
+        index = county_votes(self.results)
+        self.assertEqual(index['Some County']['President'], 21)
+        self.assertEqual(index['Another County']['President'], 10)
+        self.assertEqual(index['Some County']['Senate-1'], 7)
+
+    def test_counts_only_matching_counties(self):
+        "Registration rows for counties without results should not be stored"
+        rows = [{'county': 'Some County'}, {'county': 'Nowhere'}, {'county': 'Some County'}]
+        registered, unmatched = count_registered(rows, ['Some County'])
+        self.assertEqual(registered, {'Some County': 2})
+        self.assertEqual(unmatched, 1)
+
+    def test_counts_every_county_without_results(self):
+        "Without a list of counties, every county in the registration rows should be counted"
+        rows = [{'county': 'Some County'}, {'county': 'Nowhere'}, {'county': 'Some County'}]
+        registered, unmatched = count_registered(rows, None)
+        self.assertEqual(registered, {'Some County': 2, 'Nowhere': 1})
+        self.assertEqual(unmatched, 0)
+
+    def test_aggregated_registration_counts(self):
+        "Pre-aggregated registration rows should be summed from the count column"
+        rows = [{'county': 'Some County', 'registered': '100'}, {'county': 'Some County', 'registered': '50'}]
+        registered, unmatched = count_registered(rows, ['Some County'], 'registered')
+        self.assertEqual(registered['Some County'], 150)
+
+    def test_join_turnout(self):
+        "Turnout should be votes cast divided by registered voters per county and race"
+        rows = join_turnout(self.results, join(dirname(__file__), 'sample_registration.csv'), 'registered')
+        president = dict((row['county'], row) for row in rows if row['office'] == 'President')
+        self.assertEqual(president['Some County']['registered'], 42)
+        self.assertEqual(president['Some County']['turnout'], 50.0)
+        self.assertEqual(president['Another County']['turnout'], 25.0)
+        self.assertEqual(len(rows), 3)